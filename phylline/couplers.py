@@ -0,0 +1,185 @@
+"""Classes for coupling pipelines which run in different processes."""
+
+# Builtins
+
+import collections
+import copy
+import pickle
+import struct
+
+# Packages
+
+from phylline.links.clocked import LinkClockRequest
+from phylline.links.events import LinkEvent
+from phylline.pipelines import ManualPipeline
+from phylline.processors import proceed, wait
+
+
+# Each record in a ring is a header followed by the payload: either stream bytes or
+# a pickled event.
+_RECORD_HEADER = struct.Struct('=BI')
+_RECORD_BYTES = 0
+_RECORD_EVENT = 1
+
+
+class SharedMemoryBottomCoupler(object):
+    """A coupler which connects the bottom of a pipeline to a pipeline in another process.
+
+    Each side of the connection has its own coupler around its own pipeline, and the
+    two couplers exchange data over a pair of SharedMemoryRings: what one side
+    writes into send_ring, the other side reads from its receive_ring. Stream
+    buffers are passed as bytes, and events are pickled without their previous
+    events.
+
+    If the rings are full, outgoing data is kept by the coupler and retried on the
+    next call of flush, poll or update_clock. If wakeups are provided, the coupler
+    notifies peer_wakeup whenever it writes to send_ring, and wakeup (which the
+    peer notifies) can be registered with a selector to wait for incoming data.
+    """
+
+    def __init__(self, pipeline, send_ring, receive_ring, wakeup=None, peer_wakeup=None):
+        """Initialize members."""
+        self.pipeline = pipeline
+        self.send_ring = send_ring
+        self.receive_ring = receive_ring
+        self.wakeup = wakeup
+        self.peer_wakeup = peer_wakeup
+        self.is_manual = isinstance(self.pipeline, ManualPipeline)
+        self._to_send = collections.deque()
+        if hasattr(self.pipeline, 'after_write'):
+            self.pipeline.after_write = self._after_write
+        if hasattr(self.pipeline, 'after_send'):
+            self.pipeline.after_send = self._after_send
+        if hasattr(self.pipeline, 'directly_to_send'):
+            self.pipeline.directly_to_send = self._directly_to_send
+
+    def __repr__(self):
+        """Represent the coupler as a string."""
+        return '╔{}\n╚{}'.format(self.pipeline, self.send_ring)
+
+    def fileno(self):
+        """Return the file descriptor of the wakeup for incoming data.
+
+        Raises ValueError if the coupler was made without a wakeup.
+        """
+        if self.wakeup is None:
+            raise ValueError('Coupler has no wakeup to wait on for incoming data!')
+        return self.wakeup.fileno()
+
+    # Outgoing data
+
+    def _after_write(self, buffer):
+        """Write the buffer to the connection.
+
+        This is used to overwrite the after_write of the bottom of the pipeline
+        if it's an automatic pipeline.
+        """
+        self.write(buffer)
+        yield from wait()
+
+    def _directly_to_send(self, event):
+        """Send the event to the connection.
+
+        This is used to overwrite the directly_to_send of the bottom of the pipeline,
+        for events which the bottom emits out-of-band, e.g. on clock updates. Clock
+        requests from the bottom of the pipeline are not passed to the connection.
+        """
+        if isinstance(event, LinkClockRequest):
+            return
+        self.send(event)
+
+    def _after_send(self, event):
+        """Send the event to the connection.
+
+        This is used to overwrite the after_send of the bottom of the pipeline
+        if it's an automatic pipeline.
+        """
+        self._directly_to_send(event)
+        yield from proceed()
+
+    def write(self, buffer):
+        """Write a stream buffer to the other pipeline."""
+        if not buffer:
+            return
+        self._to_send.append((_RECORD_BYTES, bytes(buffer)))
+        self.flush()
+
+    def send(self, event):
+        """Send an event to the other pipeline."""
+        if isinstance(event, LinkEvent) and event.previous is not None:
+            event = copy.copy(event)
+            event.previous = None
+        self._to_send.append(
+            (_RECORD_EVENT, pickle.dumps(event, protocol=pickle.HIGHEST_PROTOCOL))
+        )
+        self.flush()
+
+    def flush(self):
+        """Move as many outgoing records into the send ring as it has space for.
+
+        Returns the number of records which are still waiting for space.
+        """
+        written = False
+        while self._to_send:
+            (kind, payload) = self._to_send[0]
+            if len(payload) + _RECORD_HEADER.size > self.send_ring.capacity:
+                raise ValueError(
+                    'Record of {} bytes does not fit in ring of {} bytes!'
+                    .format(len(payload), self.send_ring.capacity)
+                )
+            if not self.send_ring.put(_RECORD_HEADER.pack(kind, len(payload)), payload):
+                break
+            self._to_send.popleft()
+            written = True
+        if written and self.peer_wakeup is not None:
+            self.peer_wakeup.notify()
+        return len(self._to_send)
+
+    # Incoming data
+
+    def poll(self, max_records=None):
+        """Pass any data from the receive ring into the bottom of the pipeline.
+
+        Also retries any outgoing data which is waiting for space in the send ring.
+        Stops early while the pipeline is paused by flow control, leaving the rest
+        in the receive ring. Returns the number of records received.
+        """
+        if self.wakeup is not None:
+            self.wakeup.clear()
+        if self._to_send:
+            self.flush()
+        received = 0
+        while self.receive_ring.readable and (max_records is None or received < max_records):
+            if getattr(self.pipeline, 'paused', False):
+                break
+            (kind, length) = _RECORD_HEADER.unpack(
+                self.receive_ring.read(_RECORD_HEADER.size)
+            )
+            payload = self.receive_ring.read(length)
+            if kind == _RECORD_BYTES:
+                self.pipeline.to_read(payload)
+            else:
+                self.pipeline.to_receive(pickle.loads(payload))
+            received += 1
+        return received
+
+    # Clocks
+
+    def update_clock(self, clock_time):
+        """Update the pipeline's clock and exchange data with the other pipeline.
+
+        If the pipeline is a manual pipeline, it will also sync the pipeline and write
+        any data at the bottom to the connection.
+        """
+        self.pipeline.update_clock(clock_time)
+        self.poll()
+        if self.is_manual:
+            self.pipeline.sync()
+        return self.pipeline.next_clock_request
+
+    # Cleanup
+
+    def close(self):
+        """Detach from the rings."""
+        self.send_ring.close()
+        self.receive_ring.close()
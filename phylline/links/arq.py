@@ -0,0 +1,329 @@
+"""Links which provide reliable delivery over lossy lower layers.
+
+Provides a selective-repeat automatic repeat request (ARQ) link, which keeps a
+sliding window of frames in flight, acknowledges frames with cumulative and
+selective acknowledgements, and retransmits only the frames which were not
+acknowledged before a timeout.
+"""
+
+# Builtins
+
+import collections
+import math
+import struct
+
+# Packages
+
+from phylline.links.clocked import ClockedLink, LinkClockRequest, LinkClockTime
+from phylline.links.events import EventLink, LinkException
+from phylline.processors import event_processor, receive
+
+
+SEQUENCE_MODULUS = 1 << 32
+SACK_BITS = 32
+
+FRAME_DATA = 0
+FRAME_ACK = 1
+DATA_HEADER = struct.Struct('!BI')  # type, sequence number
+ACK_HEADER = struct.Struct('!BII')  # type, cumulative ack, selective ack bitmap
+
+
+class SelectiveRepeatLink(ClockedLink, EventLink):
+    """An EventLink which reliably delivers data in order with selective repeat ARQ.
+
+    Each payload sent from above goes down as a data frame with a 32-bit sequence
+    number. Up to window frames may be in flight at once; further payloads wait
+    until acknowledgements open the window. The receiver passes payloads up in
+    order, buffering any frames which arrive ahead of a missing frame, and answers
+    every data frame with an ack frame holding the next expected sequence number
+    (so all earlier frames are acknowledged) and a bitmap of which of the 32 frames
+    after it have been received. A frame which is not acknowledged within
+    retransmit_timeout of being sent is sent again; frames which were selectively
+    acknowledged are never retransmitted.
+
+    Bookkeeping is O(1) per sequence number: in-flight frames and out-of-order
+    received payloads are kept in fixed arrays of window slots, and all
+    retransmission deadlines share one clock request, driven by a deque of
+    (deadline, sequence number) in send order from which acknowledged or
+    superseded entries are lazily discarded.
+
+    Both ends of the connection must use the same window and initial_sequence.
+    The link issues a clock request for the next retransmission deadline.
+
+    Interface:
+    Above: sends and receives data events of payloads.
+    Below: sends and receives data events of bytestring frames.
+    """
+
+    def __init__(
+        self, clock_start=None, window=16, retransmit_timeout=1.0, initial_sequence=0,
+        name=None, clock_resolution=None
+    ):
+        """Initialize members."""
+        if not 0 < window < SEQUENCE_MODULUS // 2:
+            raise ValueError('Invalid window size: {}'.format(window))
+        super().__init__(
+            clock_start=clock_start, clock_resolution=clock_resolution, name=name
+        )
+        self.window = window
+        self.retransmit_timeout = retransmit_timeout
+        self.initial_sequence = initial_sequence % SEQUENCE_MODULUS
+        # Sender
+        self._send_base = self.initial_sequence
+        self._send_base_slot = 0
+        self._next_sequence = self._send_base
+        self._send_frames = [None] * window
+        self._send_previous = [None] * window
+        self._send_deadlines = [None] * window
+        self._retransmit_queue = collections.deque()
+        self._pending = collections.deque()
+        # Receiver
+        self._receive_base = self._send_base
+        self._receive_base_slot = 0
+        self._receive_payloads = [None] * window
+        self.stats = {
+            'sent': 0, 'retransmitted': 0, 'received': 0, 'duplicates': 0,
+            'malformed': 0
+        }
+
+    def reset(self):
+        """Return the link to its initial state, reusing its window arrays."""
+        super().reset()
+        self._send_base = self.initial_sequence
+        self._send_base_slot = 0
+        self._next_sequence = self._send_base
+        for slots in (self._send_frames, self._send_previous, self._send_deadlines):
+            slots[:] = [None] * self.window
+        self._retransmit_queue.clear()
+        self._pending.clear()
+        self._receive_base = self._send_base
+        self._receive_base_slot = 0
+        self._receive_payloads[:] = [None] * self.window
+        for key in self.stats:
+            self.stats[key] = 0
+
+    @property
+    def in_flight(self):
+        """Return the number of frames which have been sent but not acknowledged."""
+        return (self._next_sequence - self._send_base) % SEQUENCE_MODULUS
+
+    @property
+    def pending(self):
+        """Return the number of payloads waiting for space in the window."""
+        return len(self._pending)
+
+    # Sender
+
+    def _send_slot(self, sequence):
+        """Return the window slot of an in-flight sequence number, or None."""
+        offset = (sequence - self._send_base) % SEQUENCE_MODULUS
+        if offset >= self.in_flight:
+            return None
+        return (self._send_base_slot + offset) % self.window
+
+    def _fill_window(self):
+        """Send frames for pending payloads while there is space in the window."""
+        while self._pending and self.in_flight < self.window:
+            (payload, previous) = self._pending.popleft()
+            sequence = self._next_sequence
+            slot = (self._send_base_slot + self.in_flight) % self.window
+            frame = DATA_HEADER.pack(FRAME_DATA, sequence) + payload
+            deadline = self.clock.time + self.retransmit_timeout
+            self._send_frames[slot] = frame
+            self._send_previous[slot] = previous
+            self._send_deadlines[slot] = deadline
+            self._retransmit_queue.append((deadline, sequence))
+            self._next_sequence = (sequence + 1) % SEQUENCE_MODULUS
+            self.stats['sent'] += 1
+            yield self.make_link_data(frame, 'down', previous)
+
+    def _acknowledge(self, slot):
+        self._send_frames[slot] = None
+        self._send_previous[slot] = None
+        self._send_deadlines[slot] = None
+
+    def _receive_ack(self, frame):
+        """Clear acknowledged frames from the window."""
+        (_, ack, bitmap) = ACK_HEADER.unpack_from(frame)
+        in_flight = self.in_flight
+        acked = (ack - self._send_base) % SEQUENCE_MODULUS
+        if acked > in_flight:  # stale or invalid cumulative ack
+            return
+        for offset in range(acked):
+            self._acknowledge((self._send_base_slot + offset) % self.window)
+        for i in range(SACK_BITS):
+            if not bitmap:
+                break
+            if bitmap & 1:
+                offset = acked + 1 + i
+                if offset < in_flight:
+                    self._acknowledge((self._send_base_slot + offset) % self.window)
+            bitmap >>= 1
+        while (
+            self._send_base != self._next_sequence
+            and self._send_frames[self._send_base_slot] is None
+        ):
+            self._send_base = (self._send_base + 1) % SEQUENCE_MODULUS
+            self._send_base_slot = (self._send_base_slot + 1) % self.window
+
+    def _prune_retransmit_queue(self):
+        """Discard retransmission entries for acknowledged or superseded frames."""
+        while self._retransmit_queue:
+            (deadline, sequence) = self._retransmit_queue[0]
+            slot = self._send_slot(sequence)
+            if slot is not None and self._send_deadlines[slot] == deadline:
+                return
+            self._retransmit_queue.popleft()
+
+    def _deadline_due(self, deadline):
+        now = self.clock.time
+        return now >= deadline or (
+            not self.clock.integer and math.isclose(now, deadline)
+        )
+
+    def _retransmit_due(self):
+        """Resend frames whose retransmission deadlines have passed."""
+        self._prune_retransmit_queue()
+        while self._retransmit_queue and self._deadline_due(self._retransmit_queue[0][0]):
+            (_, sequence) = self._retransmit_queue.popleft()
+            slot = self._send_slot(sequence)
+            deadline = self.clock.time + self.retransmit_timeout
+            self._send_deadlines[slot] = deadline
+            self._retransmit_queue.append((deadline, sequence))
+            self.stats['retransmitted'] += 1
+            yield self.make_link_data(
+                self._send_frames[slot], 'down', self._send_previous[slot]
+            )
+            self._prune_retransmit_queue()
+
+    def _make_retransmit_clock_request(self):
+        self._prune_retransmit_queue()
+        if not self._retransmit_queue:
+            return None
+        (deadline, sequence) = self._retransmit_queue[0]
+        return self.make_clock_request(
+            deadline, previous=self._send_previous[self._send_slot(sequence)]
+        )
+
+    # Receiver
+
+    def _receive_data(self, frame, previous):
+        """Buffer the payload of a data frame, and pass up any in-order payloads."""
+        (_, sequence) = DATA_HEADER.unpack_from(frame)
+        payload = bytes(frame[DATA_HEADER.size:])
+        offset = (sequence - self._receive_base) % SEQUENCE_MODULUS
+        if offset < self.window:
+            slot = (self._receive_base_slot + offset) % self.window
+            if self._receive_payloads[slot] is None:
+                self._receive_payloads[slot] = (payload, previous)
+                self.stats['received'] += 1
+            else:
+                self.stats['duplicates'] += 1
+        elif offset >= SEQUENCE_MODULUS - self.window:  # already passed up
+            self.stats['duplicates'] += 1
+        while self._receive_payloads[self._receive_base_slot] is not None:
+            (payload, previous) = self._receive_payloads[self._receive_base_slot]
+            self._receive_payloads[self._receive_base_slot] = None
+            self._receive_base = (self._receive_base + 1) % SEQUENCE_MODULUS
+            self._receive_base_slot = (self._receive_base_slot + 1) % self.window
+            yield self.make_link_data(payload, 'up', previous)
+
+    def _make_ack(self, previous):
+        bitmap = 0
+        for i in range(min(SACK_BITS, self.window - 1)):
+            slot = (self._receive_base_slot + 1 + i) % self.window
+            if self._receive_payloads[slot] is not None:
+                bitmap |= 1 << i
+        return self.make_link_data(
+            ACK_HEADER.pack(FRAME_ACK, self._receive_base, bitmap), 'down', previous
+        )
+
+    # Override ClockedLink
+
+    @property
+    def next_clock_request(self):
+        """Determine the next requested clock update, for the next retransmission."""
+        self._prune_retransmit_queue()
+        if not self._retransmit_queue:
+            return None
+        return LinkClockRequest(
+            self._retransmit_queue[0][0], context={'time': self.clock.time},
+            instance=self
+        )
+
+    def on_clock_receive(self):
+        """Do nothing, because received frames are never delayed."""
+        pass
+
+    def on_clock_send(self):
+        """Retransmit any frames which are due, bypassing the sender."""
+        if not self._retransmit_queue:
+            return
+
+        for frame_event in self._retransmit_due():
+            self.directly_to_send(frame_event)
+        clock_request = self._make_retransmit_clock_request()
+        if clock_request is not None:
+            self.directly_to_send(clock_request)
+
+    # Receive and send processors
+
+    @event_processor
+    def receiver_processor(self):
+        """Event receiver processor.
+
+        Make sure to yield from after_receive() at the end of the loop to expose
+        any generated events for consumption by the layer above.
+        """
+        while True:
+            event = yield from receive()
+            self.update_clock_time(event)
+            if isinstance(event, LinkClockTime):
+                continue
+            if isinstance(event, LinkException):
+                yield from self.after_receive(event)
+                continue
+            data_event = self.get_link_data(event, 'up')
+            if data_event is None:
+                continue
+
+            frame = data_event.data
+            if len(frame) >= DATA_HEADER.size and frame[0] == FRAME_DATA:
+                for payload_event in self._receive_data(frame, event):
+                    yield from self.after_receive(payload_event)
+                self.directly_to_send(self._make_ack(event))
+            elif len(frame) >= ACK_HEADER.size and frame[0] == FRAME_ACK:
+                self._receive_ack(frame)
+                for frame_event in self._fill_window():
+                    self.directly_to_send(frame_event)
+                clock_request = self._make_retransmit_clock_request()
+                if clock_request is not None:
+                    self.directly_to_send(clock_request)
+            else:
+                self.stats['malformed'] += 1
+
+    @event_processor
+    def sender_processor(self):
+        """Event sender processor.
+
+        Make sure to yield from after_send() at the end of the loop to expose
+        any generated events for consumption by the layer below.
+        """
+        while True:
+            event = yield from receive()
+            self.update_clock_time(event)
+            if isinstance(event, LinkClockTime):
+                continue
+            if isinstance(event, LinkException):
+                yield from self.after_send(event)
+                continue
+            data_event = self.get_link_data(event, 'down')
+            if data_event is None:
+                continue
+
+            self._pending.append((data_event.data, event))
+            for frame_event in self._fill_window():
+                yield from self.after_send(frame_event)
+            clock_request = self._make_retransmit_clock_request()
+            if clock_request is not None:
+                yield from self.after_send(clock_request)
@@ -0,0 +1,272 @@
+"""Links which aggregate data events into batches, and split them back apart.
+
+Provides a batch event, a clocked link which gathers consecutive data events
+into batches by count, byte size or maximum waiting time, and a link which
+splits batches back into individual data events, so that the layers between
+them handle one event per batch instead of one event per item.
+"""
+
+# Builtins
+
+# Packages
+
+from phylline.links.clocked import ClockedLink, LinkClockRequest, LinkClockTime
+from phylline.links.events import EventLink, LinkData, LinkException
+from phylline.processors import event_processor, receive
+
+
+# Events
+
+
+class Batch(list):
+    """A list of units of data which were batched together.
+
+    Batches are a distinct type, so that a batch can still be recognized after an
+    EventLink has rewrapped its LinkBatch as a plain LinkData event.
+    """
+
+    pass
+
+
+class LinkBatch(LinkData):
+    """Event indicating a batch of units of data which was passed up or down a layer.
+
+    data is the Batch of the data in the batch, in order, and previous should be
+    the list of the events which caused each unit of data.
+    """
+
+    def __init__(
+        self, data, direction='up', context=None, instance=None, previous=None
+    ):
+        """Initialize members."""
+        if not isinstance(data, Batch):
+            data = Batch(data)
+        super().__init__(
+            data, direction=direction, context=context, instance=instance,
+            previous=previous
+        )
+
+
+def is_batch(event):
+    """Return whether the event is a LinkBatch, or a LinkData rewrapping of one."""
+    return isinstance(event, LinkData) and isinstance(event.data, Batch)
+
+
+def _split_batch(link, data_event, event, direction):
+    """Generate data events from the link for the data in a possible batch."""
+    if not is_batch(data_event):
+        yield link.make_link_data(data_event.data, direction, event)
+        return
+
+    previous = event.previous if isinstance(event, LinkBatch) else None
+    for (i, data) in enumerate(data_event.data):
+        yield link.make_link_data(
+            data, direction, previous[i] if previous is not None else event
+        )
+
+
+# Batching Links
+
+
+class BatchingLink(ClockedLink, EventLink):
+    """An EventLink which gathers received data events into LinkBatch events.
+
+    Received data events are added to the pending batch, which is passed up as
+    one LinkBatch once it holds max_events events, or once it holds at least
+    max_bytes bytes if max_bytes is not None, or once max_wait has elapsed on the
+    link clock since its first event was added if max_wait is not None. The
+    max-wait deadline is issued as a clock request. A received LinkException
+    passes up the pending batch before itself. LinkBatch events sent from above
+    are split back into individual data events, and other events are sent
+    through without any transformation.
+
+    Interface:
+    Above: receives LinkBatch events, and sends data events and LinkBatch events.
+    Below: sends and receives data events, plus LinkClockTime events to
+    advance the link's clock.
+    """
+
+    def __init__(
+        self, clock_start=None, max_events=64, max_bytes=None, max_wait=None,
+        name=None, clock_resolution=None
+    ):
+        """Initialize members."""
+        super().__init__(
+            clock_start=clock_start, clock_resolution=clock_resolution, name=name
+        )
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.max_wait = max_wait
+        self._batch = Batch()
+        self._batch_events = []
+        self._batch_bytes = 0
+        self._flush_timer = self.make_timer(max_wait) if max_wait is not None else None
+
+    def reset(self):
+        """Return the link to its initial state, discarding the pending batch."""
+        self._batch = Batch()
+        self._batch_events = []
+        self._batch_bytes = 0
+        if self._flush_timer is not None:
+            self._flush_timer.reset_and_stop()
+        super().reset()
+
+    # Public interface
+
+    @property
+    def pending(self):
+        """Return the number of data events in the pending batch."""
+        return len(self._batch)
+
+    def flush(self):
+        """Pass up the pending batch immediately, regardless of the thresholds."""
+        batch = self._take_batch()
+        if batch is not None:
+            self.directly_receive(batch)
+
+    # Batches
+
+    def _take_batch(self):
+        if not self._batch:
+            return None
+
+        batch = LinkBatch(
+            self._batch, direction='up', instance=self, previous=self._batch_events
+        )
+        self._batch = Batch()
+        self._batch_events = []
+        self._batch_bytes = 0
+        if self._flush_timer is not None:
+            self._flush_timer.reset_and_stop()
+            self.next_clock_request_timer.reset_and_stop()
+        return batch
+
+    def _add_to_batch(self, data_event, event):
+        """Add a data event to the pending batch, and return whether the batch is full."""
+        self._batch.append(data_event.data)
+        self._batch_events.append(event)
+        if len(self._batch) >= self.max_events:
+            return True
+        if self.max_bytes is None:
+            return False
+        try:
+            self._batch_bytes += len(data_event.data)
+        except TypeError:
+            pass
+        return self._batch_bytes >= self.max_bytes
+
+    def _batch_due(self):
+        return (
+            bool(self._batch) and self._flush_timer is not None
+            and self._flush_timer.timed_out
+        )
+
+    # Override ClockedLink
+
+    @property
+    def next_clock_request(self):
+        """Determine the next requested clock update, for the max-wait deadline."""
+        if not self._batch or self._flush_timer is None or not self._flush_timer.enabled:
+            return None
+        return LinkClockRequest(
+            self._flush_timer.timeout_time, context={'time': self.clock.time},
+            instance=self
+        )
+
+    def on_clock_receive(self):
+        """Pass up the pending batch only if its max-wait deadline has passed."""
+        if self._batch_due():
+            self.directly_receive(self._take_batch())
+
+    def on_clock_send(self):
+        """Do nothing, because sends are not batched."""
+        pass
+
+    # Receive and send processors
+
+    @event_processor
+    def receiver_processor(self):
+        """Event receiver processor.
+
+        Make sure to yield from after_receive() at the end of the loop to expose
+        any generated events for consumption by the layer above.
+        """
+        while True:
+            event = yield from receive()
+            self.update_clock_time(event)
+            if isinstance(event, LinkClockTime):
+                if self._batch_due():
+                    yield from self.after_receive(self._take_batch())
+                continue
+            if isinstance(event, LinkException):
+                batch = self._take_batch()
+                if batch is not None:
+                    yield from self.after_receive(batch)
+                yield from self.after_receive(event)
+                continue
+            data_event = self.get_link_data(event, 'up')
+            if data_event is None:
+                continue
+
+            if self._add_to_batch(data_event, event):
+                yield from self.after_receive(self._take_batch())
+            elif self._flush_timer is not None and not self._flush_timer.enabled:
+                self._flush_timer.start()
+                clock_request = self.make_clock_request(self._flush_timer.timeout_time)
+                if clock_request is not None:
+                    yield from self.after_receive(clock_request)
+
+    @event_processor
+    def sender_processor(self):
+        """Event sender processor.
+
+        Make sure to yield from after_send() at the end of the loop to expose
+        any generated events for consumption by the layer below.
+        """
+        while True:
+            event = yield from receive()
+            self.update_clock_time(event)
+            if isinstance(event, LinkClockTime):
+                continue
+            if isinstance(event, LinkException):
+                yield from self.after_send(event)
+                continue
+            data_event = self.get_link_data(event, 'down')
+            if data_event is None:
+                continue
+
+            for split_event in _split_batch(self, data_event, event, 'down'):
+                yield from self.after_send(split_event)
+
+
+class UnbatchingLink(EventLink):
+    """An EventLink which splits received LinkBatch events into individual data events.
+
+    Received LinkBatch events, including LinkData events which rewrap a LinkBatch,
+    are split into one data event per unit of data, in order; other received
+    events are passed through. Sent events are passed through without any
+    transformation.
+
+    Interface:
+    Above: sends and receives data events.
+    Below: receives LinkBatch events, and sends data events.
+    """
+
+    @event_processor
+    def receiver_processor(self):
+        """Event receiver processor.
+
+        Make sure to yield from after_receive() with any generated event to expose
+        it for consumption by the layer above.
+        """
+        while True:
+            event = yield from receive()
+            if isinstance(event, LinkException):
+                yield from self.after_receive(event)
+                continue
+            data_event = self.get_link_data(event, 'up')
+            if data_event is None:
+                continue
+
+            for split_event in _split_batch(self, data_event, event, 'up'):
+                yield from self.after_receive(split_event)
@@ -12,13 +12,24 @@ discrete event links.
 
 # Builtins
 
+import array
+import bisect
 import collections
+import heapq
+import itertools
 import math
+import random
 
 # Packages
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from phylline.links.events import EventLink, LinkEvent, LinkException
-from phylline.processors import event_processor, receive
+from phylline.links.streams import StreamLink
+from phylline.processors import event_processor, read, receive, stream_processor, wait
 from phylline.util.timing import Clock, TimeoutTimer
 
 
@@ -75,6 +86,16 @@ class LinkClockRequest(LinkEvent):
             self.__class__.__qualname__, self.requested_time, self.context, self.link, self.previous
         )
 
+    def due(self, time):
+        """Return whether the requested time has been reached by the given time.
+
+        Float times within floating-point error of the requested time count as
+        having reached it, as with TimeoutTimer.
+        """
+        if time >= self.requested_time:
+            return True
+        return isinstance(time, float) and math.isclose(time, self.requested_time)
+
     # Comparison operators
 
     def __eq__(self, other):
@@ -130,21 +151,71 @@ class LinkClockRequest(LinkEvent):
 
 
 class ClockedLink(object):
-    """Support for implementing an EventLink which runs on an internal clock."""
+    """Support for implementing an EventLink which runs on an internal clock.
 
-    def __init__(self, *args, clock_start=0.0, **kwargs):
+    If clock_resolution is not None, the clock runs in integer mode (see Clock):
+    clock times, delays and requested clock times are integer numbers of ticks,
+    and are compared exactly. clock_start defaults to 0 ticks in integer mode, and
+    to 0.0 otherwise.
+    """
+
+    def __init__(self, *args, clock_start=None, clock_resolution=None, **kwargs):
         """Initialize members."""
         super().__init__(*args, **kwargs)
-        self.clock = Clock(time=clock_start)
+        if clock_start is None:
+            clock_start = 0.0 if clock_resolution is None else 0
+        self.clock_start = clock_start
+        self.clock = Clock(time=clock_start, resolution=clock_resolution)
         self.next_clock_request_timer = TimeoutTimer(clock=self.clock)
 
     # Public interface
 
+    def reset(self):
+        """Return the link to its initial state, with its clock at clock_start."""
+        self.clock.reset(self.clock_start)
+        self.next_clock_request_timer.reset_and_stop()
+        super().reset()
+
     def update_clock(self, time):
         """Update the clock of the link and do any necessary processing."""
         # print('{}: updating clock to {}!'.format(self, time))
-        self.to_receive(LinkClockTime(time, instance=self))
-        self.send(LinkClockTime(time, instance=self))
+        self.advance_clock(time)
+        self.on_clock_receive()
+        self.on_clock_send()
+
+    def update_clock_receive(self, time):
+        """Update the clock of the link and do any necessary processing, for receive."""
+        self.advance_clock(time)
+        self.on_clock_receive()
+
+    def update_clock_send(self, time):
+        """Update the clock of the link and do any necessary processing, for send."""
+        self.advance_clock(time)
+        self.on_clock_send()
+
+    def advance_clock(self, time):
+        """Advance the clock and timers of the link, without processing anything."""
+        self.clock.update(time)
+        if self.next_clock_request_timer.timed_out:
+            self.next_clock_request_timer.reset_and_stop()
+
+    def clock_update_due(self, time):
+        """Return whether updating the clock to the given time needs any processing.
+
+        Links which keep either default clock hook, which passes the clock time
+        in-band to processors that may expect every clock update, or which do not
+        derive next_clock_request from their pending work, are always due. Other
+        links are due only once their next clock request has been reached.
+        """
+        link_class = self.__class__
+        if (
+            link_class.on_clock_receive is ClockedLink.on_clock_receive
+            or link_class.on_clock_send is ClockedLink.on_clock_send
+            or link_class.next_clock_request is ClockedLink.next_clock_request
+        ):
+            return True
+        clock_request = self.next_clock_request
+        return clock_request is not None and clock_request.due(time)
 
     @property
     def next_clock_request(self):
@@ -158,6 +229,28 @@ class ClockedLink(object):
 
     # Internal methods for implementers
 
+    def on_clock_receive(self):
+        """Resume the receive side of the link after its clock has advanced.
+
+        By default, passes a LinkClockTime event through the receiver processor,
+        for processors which expect clock updates in-band. Links which can check
+        their timers for due work directly should override this to do nothing
+        unless work is due, and to emit any resulting events out-of-band with
+        directly_receive, so that idle links cost nothing per clock update.
+        """
+        self.to_receive(LinkClockTime(self.clock.time, instance=self))
+
+    def on_clock_send(self):
+        """Resume the send side of the link after its clock has advanced.
+
+        By default, passes a LinkClockTime event through the sender processor,
+        for processors which expect clock updates in-band. Links which can check
+        their timers for due work directly should override this to do nothing
+        unless work is due, and to emit any resulting events out-of-band with
+        directly_to_send, so that idle links cost nothing per clock update.
+        """
+        self.send(LinkClockTime(self.clock.time, instance=self))
+
     def make_timer(self, delay):
         """Make a timer on the processor clock."""
         return TimeoutTimer(timeout=delay, clock=self.clock)
@@ -180,11 +273,12 @@ class ClockedLink(object):
 
     def make_clock_request(self, time, context={}, previous=None):
         """Return a LinkClockRequest if time is different from the last request."""
-        if (
-            self.next_clock_request_timer.running
-            and math.isclose(self.next_clock_request_timer.timeout_time, time)
-        ):
-            return None
+        if self.next_clock_request_timer.running:
+            timeout_time = self.next_clock_request_timer.timeout_time
+            if timeout_time == time or (
+                not self.clock.integer and math.isclose(timeout_time, time)
+            ):
+                return None
         self.next_clock_request_timer.start(timeout=time - self.clock.time)
         return LinkClockRequest(
             time, context={'time': self.clock.time, **context}, instance=self,
@@ -217,6 +311,10 @@ class EventDelayer(object):
         # ))
         self.in_flight.append({'event': event, 'timer': timer})
 
+    def clear(self):
+        """Discard all in-flight events."""
+        self.in_flight.clear()
+
     def flush_events(self):
         """Dequeue and yield all events which have satisfied their delays."""
         # print(
@@ -236,11 +334,247 @@ class EventDelayer(object):
         #     .format(self.clock.time, self.in_flight)
         # )
 
+    def __len__(self):
+        """Return the number of in-flight events."""
+        return len(self.in_flight)
+
     @property
     def next_in_flight_event(self):
         """Return the next in-flight event to send after the appropriate delay."""
         return self.in_flight[0]
 
+    @property
+    def next_timeout_time(self):
+        """Return the clock time when the next in-flight event will be due."""
+        return self.in_flight[0]['timer'].timeout_time
+
+
+class BatchEventDelayer(EventDelayer):
+    """An EventDelayer which keeps deadlines in a contiguous array for bulk flushing.
+
+    Instead of a TimeoutTimer per in-flight event, the deadlines of in-flight events
+    are stored in order in an array of doubles, or in a NumPy array if backend is
+    'numpy'. Every event has the same delay, so the deadlines are sorted as long as
+    the clock does not go backwards while events are in flight; then flush_events
+    finds all due events with one binary search against the current clock time and
+    pops them in bulk. As with TimeoutTimer, a deadline within floating-point error
+    of the current clock time is considered to have passed, unless the clock is in
+    integer mode, in which case the deadlines are stored as 64-bit integers and
+    compared exactly.
+    """
+
+    def __init__(self, processor, clock, delay, backend='array', compact_threshold=1024):
+        """Initialize members."""
+        if backend == 'numpy' and numpy is None:
+            raise ValueError('The numpy backend for BatchEventDelayer requires NumPy!')
+        elif backend not in ('array', 'numpy'):
+            raise ValueError('Unknown BatchEventDelayer backend: {}'.format(backend))
+        if compact_threshold < 1:
+            raise ValueError('Compact threshold must be positive: {}'.format(compact_threshold))
+        self.processor = processor
+        self.clock = clock
+        self.delay = delay
+        self.backend = backend
+        self.compact_threshold = compact_threshold
+        # matches the rel_tol of math.isclose
+        self._tolerance = 0 if clock.integer else 1e-9 * abs(delay)
+        self._to_key = 'to_{}_time'.format(processor)
+        self._intended_key = 'intended_{}_time'.format(processor)
+        self._actual_key = 'actual_{}_time'.format(processor)
+        self._events = []
+        self._start = 0
+        if backend == 'numpy':
+            self._deadlines = numpy.empty(
+                compact_threshold, dtype=numpy.int64 if clock.integer else numpy.float64
+            )
+        else:
+            self._deadlines = array.array('q' if clock.integer else 'd')
+
+    def __len__(self):
+        """Return the number of in-flight events."""
+        return len(self._events) - self._start
+
+    def clear(self):
+        """Discard all in-flight events, keeping the allocated arrays."""
+        self._events.clear()
+        self._start = 0
+        if self.backend == 'array':
+            del self._deadlines[:]
+
+    def enqueue_event(self, event):
+        """Add event to the in-flight queue of delayed events."""
+        now = self.clock.time
+        deadline = now + self.delay
+        event.context[self._to_key] = now
+        event.context[self._intended_key] = deadline
+        if self.backend == 'numpy':
+            if len(self._events) == len(self._deadlines):
+                self._deadlines = numpy.resize(self._deadlines, 2 * len(self._deadlines))
+            self._deadlines[len(self._events)] = deadline
+        else:
+            self._deadlines.append(deadline)
+        self._events.append(event)
+
+    def _find_due(self, time):
+        """Return the index after the last in-flight event due by the given time."""
+        if self.backend == 'numpy':
+            return self._start + int(numpy.searchsorted(
+                self._deadlines[self._start:len(self._events)], time, side='right'
+            ))
+        return bisect.bisect_right(self._deadlines, time, self._start)
+
+    def _compact(self):
+        """Drop flushed events and deadlines from the front of the arrays."""
+        if self._start == len(self._events):
+            self._events.clear()
+            if self.backend == 'array':
+                del self._deadlines[:]
+        elif self._start >= self.compact_threshold and 2 * self._start >= len(self._events):
+            remaining = len(self._events) - self._start
+            if self.backend == 'numpy':
+                self._deadlines[:remaining] = self._deadlines[self._start:len(self._events)]
+            else:
+                del self._deadlines[:self._start]
+            del self._events[:self._start]
+        else:
+            return
+        self._start = 0
+
+    def flush_events(self):
+        """Dequeue and yield all events which have satisfied their delays."""
+        if self._start == len(self._events):
+            return
+        now = self.clock.time
+        stop = self._find_due(now + self._tolerance)
+        if stop == self._start:
+            return
+        due = self._events[self._start:stop]
+        self._start = stop
+        self._compact()
+        for event in due:
+            event.context[self._actual_key] = now
+            yield event
+
+    @property
+    def next_in_flight_event(self):
+        """Return the next in-flight event to send after the appropriate delay."""
+        return {'event': self._events[self._start], 'timeout_time': self.next_timeout_time}
+
+    @property
+    def next_timeout_time(self):
+        """Return the clock time when the next in-flight event will be due."""
+        if self.clock.integer:
+            return int(self._deadlines[self._start])
+        return float(self._deadlines[self._start])
+
+
+class HeapEventDelayer(EventDelayer):
+    """An EventDelayer which can give each event its own delay.
+
+    delay may be a number or a callable which takes each event and returns its
+    delay, e.g. one made by jittered_delay or serialization_delay. In-flight events
+    are kept in a heap ordered by deadline, so flushing k due events out of n
+    in-flight events costs O(k log n). If reorder is false, an event is never
+    released before an event which was enqueued earlier, as on a FIFO link: its
+    deadline is pushed back to the latest deadline of the events ahead of it. If
+    reorder is true, events are released strictly in order of their deadlines.
+
+    A deadline within tolerance of the current clock time is considered to have
+    passed, to absorb floating-point error in the clock times. If the clock is in
+    integer mode, deadlines are compared exactly.
+    """
+
+    def __init__(self, processor, clock, delay, reorder=False, tolerance=1e-9):
+        """Initialize members."""
+        self.processor = processor
+        self.clock = clock
+        self.delay = delay
+        self.reorder = reorder
+        self.tolerance = 0 if clock.integer else tolerance
+        self._to_key = 'to_{}_time'.format(processor)
+        self._intended_key = 'intended_{}_time'.format(processor)
+        self._actual_key = 'actual_{}_time'.format(processor)
+        self._heap = []
+        self._counter = itertools.count()  # breaks ties between equal deadlines
+        self._latest_deadline = None
+
+    def __len__(self):
+        """Return the number of in-flight events."""
+        return len(self._heap)
+
+    def clear(self):
+        """Discard all in-flight events."""
+        self._heap.clear()
+        self._counter = itertools.count()
+        self._latest_deadline = None
+
+    def enqueue_event(self, event, delay=None):
+        """Add event to the in-flight queue of delayed events.
+
+        If delay is None, the delayer's delay is used.
+        """
+        if delay is None:
+            delay = self.delay(event) if callable(self.delay) else self.delay
+        now = self.clock.time
+        deadline = now + delay
+        if not self.reorder:
+            if self._heap and deadline < self._latest_deadline:
+                deadline = self._latest_deadline
+            self._latest_deadline = deadline
+        event.context[self._to_key] = now
+        event.context[self._intended_key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), event))
+
+    def flush_events(self):
+        """Dequeue and yield all events which have satisfied their delays."""
+        if not self._heap:
+            return
+        now = self.clock.time
+        threshold = now + self.tolerance
+        while self._heap and self._heap[0][0] <= threshold:
+            event = heapq.heappop(self._heap)[2]
+            event.context[self._actual_key] = now
+            yield event
+
+    @property
+    def next_in_flight_event(self):
+        """Return the next in-flight event to send after the appropriate delay."""
+        (timeout_time, _, event) = self._heap[0]
+        return {'event': event, 'timeout_time': timeout_time}
+
+    @property
+    def next_timeout_time(self):
+        """Return the clock time when the next in-flight event will be due."""
+        return self._heap[0][0]
+
+
+def jittered_delay(delay, jitter, seed=None):
+    """Return a delay function which adds uniformly random jitter to a fixed delay.
+
+    Each event's delay is drawn uniformly from [delay, delay + jitter].
+    """
+    random_source = random.Random(seed)
+
+    def delay_function(event):
+        return delay + random_source.uniform(0, jitter)
+
+    return delay_function
+
+
+def serialization_delay(bytes_per_second, delay=0.0):
+    """Return a delay function which adds the time to serialize each event's data.
+
+    Events whose data has no length are only given the fixed delay.
+    """
+    def delay_function(event):
+        try:
+            length = len(event.data)
+        except (AttributeError, TypeError):
+            length = 0
+        return delay + length / bytes_per_second
+
+    return delay_function
+
 
 class DelayedEventLink(ClockedLink, EventLink):
     """An EventLink which passes events through only after a time delay.
@@ -248,16 +582,44 @@ class DelayedEventLink(ClockedLink, EventLink):
     The time delay for the receive depends on regularly receiving timing events
     from to_receive. The time delay for the send depends on regularly receiving
     timing events from send.
+
+    Each delay may be a fixed number, or a callable which takes each event and
+    returns its delay (see jittered_delay and serialization_delay). Per-event
+    delays, or enabling reorder, use a HeapEventDelayer; otherwise the events
+    pass through a FIFO EventDelayer.
     """
 
-    def __init__(self, clock_start=0.0, receive_delay=1.0, send_delay=1.0):
-        """Initialize members."""
-        super().__init__(clock_start=clock_start)
+    def __init__(
+        self, clock_start=None, receive_delay=1.0, send_delay=1.0,
+        delayer_factory=None, reorder=False, clock_resolution=None
+    ):
+        """Initialize members.
+
+        If delayer_factory is not None, it is called with the processor name,
+        clock, and delay to make the delayer for each direction; for example, pass
+        BatchEventDelayer (or a functools.partial of it with backend='numpy') to
+        flush large numbers of in-flight events in bulk. If clock_resolution is not
+        None, the delays are integer numbers of clock ticks.
+        """
+        super().__init__(clock_start=clock_start, clock_resolution=clock_resolution)
         self._delayers = {
-            'up': EventDelayer('receive', self.clock, receive_delay),
-            'down': EventDelayer('send', self.clock, send_delay)
+            'up': self._make_delayer('receive', receive_delay, delayer_factory, reorder),
+            'down': self._make_delayer('send', send_delay, delayer_factory, reorder)
         }
 
+    def _make_delayer(self, processor, delay, delayer_factory, reorder):
+        if delayer_factory is not None:
+            return delayer_factory(processor, self.clock, delay)
+        if callable(delay) or reorder:
+            return HeapEventDelayer(processor, self.clock, delay, reorder=reorder)
+        return EventDelayer(processor, self.clock, delay)
+
+    def reset(self):
+        """Return the link to its initial state, discarding any in-flight events."""
+        for delayer in self._delayers.values():
+            delayer.clear()
+        super().reset()
+
     # Receive and send processors
 
     def _enqueue_data_event(self, event, direction):
@@ -278,18 +640,53 @@ class DelayedEventLink(ClockedLink, EventLink):
             # print('Finished yielding from after_{}!'.format(processor))
         # print('Done flushing {}!'.format(processor))
 
-    def _issue_clock_request(self, direction):
+    def _make_delayer_clock_request(self, direction):
         delayer = self._delayers[direction]
-        if not delayer.in_flight:
-            return
+        if not delayer:
+            return None
 
-        next_in_flight = delayer.next_in_flight_event
-        clock_request = self.make_clock_request(
-            next_in_flight['timer'].timeout_time,
-            previous=next_in_flight['event'].previous
+        return self.make_clock_request(
+            delayer.next_timeout_time,
+            previous=delayer.next_in_flight_event['event'].previous
         )
+
+    def _issue_clock_request(self, direction):
+        clock_request = self._make_delayer_clock_request(direction)
         if clock_request is not None:
-            yield from getattr(self, 'after_{}'.format(delayer.processor))(clock_request)
+            processor = self._delayers[direction].processor
+            yield from getattr(self, 'after_{}'.format(processor))(clock_request)
+
+    def _flush_directly(self, direction, emit):
+        if not self._delayers[direction]:
+            return
+
+        for data_event in self._delayers[direction].flush_events():
+            emit(data_event)
+        clock_request = self._make_delayer_clock_request(direction)
+        if clock_request is not None:
+            emit(clock_request)
+
+    # Override ClockedLink
+
+    @property
+    def next_clock_request(self):
+        """Determine the next requested clock update, for the earliest in-flight event."""
+        timeout_times = [
+            delayer.next_timeout_time for delayer in self._delayers.values() if delayer
+        ]
+        if not timeout_times:
+            return None
+        return LinkClockRequest(
+            min(timeout_times), context={'time': self.clock.time}, instance=self
+        )
+
+    def on_clock_receive(self):
+        """Pass up any received events which are now due, bypassing the receiver."""
+        self._flush_directly('up', self.directly_receive)
+
+    def on_clock_send(self):
+        """Pass down any sent events which are now due, bypassing the sender."""
+        self._flush_directly('down', self.directly_to_send)
 
     @event_processor
     def receiver_processor(self):
@@ -318,3 +715,107 @@ class DelayedEventLink(ClockedLink, EventLink):
             self._enqueue_data_event(event, 'down')
             yield from self._flush_event_queue('down')
             yield from self._issue_clock_request('down')
+
+
+class CoalescingStreamLink(ClockedLink, StreamLink):
+    """A StreamLink which coalesces small writes into larger writes.
+
+    Bytes written from above are buffered until at least flush_size bytes are
+    pending, or until max_delay has elapsed on the link clock since the oldest
+    pending byte was written, whichever comes first. The max-delay deadline is
+    requested with make_clock_request, so it is exposed by next_clock_request for
+    the pipeline to schedule the flush. If clock_resolution is not None, max_delay
+    is an integer number of clock ticks rather than seconds. Bytes read from below
+    are passed through without any transformation.
+
+    Interface:
+    Above: sends and receives bytestrings.
+    Below: to_send and to_receive bytestrings, with small writes coalesced.
+    """
+
+    def __init__(
+        self, name=None, clock_start=None, flush_size=4096, max_delay=0.01,
+        clock_resolution=None
+    ):
+        """Initialize members."""
+        super().__init__(
+            clock_start=clock_start, clock_resolution=clock_resolution, name=name
+        )
+        self.flush_size = flush_size
+        self.max_delay = max_delay
+        self._pending = bytearray()
+        self._flush_requested = False
+        self._flush_timer = self.make_timer(max_delay)
+
+    def reset(self):
+        """Return the link to its initial state, discarding any pending bytes."""
+        self._pending.clear()
+        self._flush_requested = False
+        self._flush_timer.reset_and_stop()
+        super().reset()
+
+    # Public interface
+
+    def flush(self):
+        """Flush all pending bytes immediately, regardless of the thresholds."""
+        if not self._pending:
+            return
+        self._flush_requested = True
+        self._writer.send(b'')
+
+    @property
+    def pending(self):
+        """Return the number of bytes buffered for coalescing."""
+        return len(self._pending)
+
+    # Override ClockedLink
+
+    @property
+    def next_clock_request(self):
+        """Determine the next requested clock update, for flushing pending bytes."""
+        if not self._pending or not self._flush_timer.enabled:
+            return None
+        return LinkClockRequest(
+            self._flush_timer.timeout_time, context={'time': self.clock.time},
+            instance=self
+        )
+
+    def on_clock_receive(self):
+        """Do nothing, because reads are not delayed."""
+        pass
+
+    def on_clock_send(self):
+        """Wake the writer processor only if pending bytes are due to be flushed."""
+        if self._pending and self._flush_timer.timed_out:
+            self._writer.send(b'')
+
+    # Read and write processors
+
+    def _flush_pending(self):
+        buffer = bytes(self._pending)
+        self._pending.clear()
+        self._flush_requested = False
+        self._flush_timer.reset_and_stop()
+        self.next_clock_request_timer.reset_and_stop()
+        yield from self.after_write(buffer)
+
+    @stream_processor
+    def writer_processor(self):
+        """Stream writer processor.
+
+        Wakes up on every write and every clock update which makes pending bytes
+        due, so it must not block on reading new bytes.
+        """
+        while True:
+            buffer = yield from read(min_bytes=0)
+            self._pending.extend(buffer)
+            if self._pending and (
+                self._flush_requested
+                or len(self._pending) >= self.flush_size
+                or self._flush_timer.timed_out
+            ):
+                yield from self._flush_pending()
+            elif self._pending and not self._flush_timer.enabled:
+                self._flush_timer.start()
+                self.make_clock_request(self._flush_timer.timeout_time)
+            yield from wait()
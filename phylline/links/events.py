@@ -12,12 +12,16 @@ discrete event links.
 
 # Builtins
 
+import time
 from abc import abstractmethod
 
 # Packages
 
-from phylline.processors import event_processor, receive, send
+from phylline.processors import LatencyQueue, PriorityLanes, event_processor, receive, send
+from phylline.util.histograms import LATENCY_HISTOGRAMS, LogHistogram, timed
+from phylline.util.instrumentation import wrap_methods
 from phylline.util.logging import hex_bytes
+from phylline.util.timing import Clock
 
 
 # Events
@@ -122,6 +126,17 @@ class LinkException(LinkEvent):
         )
 
 
+def control_first(event):
+    """Classify events into two priority lanes: other LinkEvents first, then LinkData.
+
+    Intended as a priority classifier for EventLink, so that events such as
+    LinkExceptions and clock requests are not queued behind bulk data.
+    """
+    if isinstance(event, LinkEvent) and not isinstance(event, LinkData):
+        return 0
+    return 1
+
+
 # Link interfaces
 
 
@@ -137,9 +152,19 @@ class EventLinkAbove(object):
         """Return the next received event, while consuming them."""
         pass
 
-    def receive_all(self):
-        """Generate all received events, while consuming them."""
-        while self.has_receive():
+    def receive_all(self, max_events=None):
+        """Generate all received events, while consuming them.
+
+        If max_events is not None, at most max_events events are consumed and any
+        remaining events stay queued.
+        """
+        if max_events is None:
+            while self.has_receive():
+                yield self.receive()
+            return
+        for _ in range(max_events):
+            if not self.has_receive():
+                return
             yield self.receive()
 
     @abstractmethod
@@ -170,9 +195,19 @@ class EventLinkBelow(object):
         """Return the next event to send, while consuming it."""
         pass
 
-    def to_send_all(self):
-        """Generate all events to send, while consuming them."""
-        while self.has_to_send():
+    def to_send_all(self, max_events=None):
+        """Generate all events to send, while consuming them.
+
+        If max_events is not None, at most max_events events are consumed and any
+        remaining events stay queued.
+        """
+        if max_events is None:
+            while self.has_to_send():
+                yield self.to_send()
+            return
+        for _ in range(max_events):
+            if not self.has_to_send():
+                return
             yield self.to_send()
 
     @abstractmethod
@@ -246,13 +281,20 @@ class EventLink(EventLinkBelow, EventLinkAbove, DataEventLink):
     sender_event_passthrough flags.  To change this behavior further, either
     override the class with a custom sender and receiver processor, or provide a
     custom processor upon construction.
+
+    By default, each processor queues its output in a single FIFO queue. If
+    priority_classifier is not None, each processor instead queues its output in
+    PriorityLanes with priority_lanes lanes and priority_weights weights, so that
+    urgent events (e.g. acks, or other LinkEvents with control_first) are
+    received and sent ahead of bulk data.
     """
 
     def __init__(
         self, name=None, receiver_processor=None, sender_processor=None,
         receiver_processor_args=(), receiver_processor_kwargs={},
         sender_processor_args=(), sender_processor_kwargs={},
-        receiver_event_passthrough=False, sender_event_passthrough=False
+        receiver_event_passthrough=False, sender_event_passthrough=False,
+        priority_classifier=None, priority_lanes=2, priority_weights=None
     ):
         """Initialize reader and writer processors."""
         super().__init__()
@@ -269,6 +311,14 @@ class EventLink(EventLinkBelow, EventLinkAbove, DataEventLink):
         )
         self.receiver_event_passthrough = receiver_event_passthrough
         self.sender_event_passthrough = sender_event_passthrough
+        if priority_classifier is not None:
+            # The processors only get their output queues when they have output,
+            # so the queues can still be replaced
+            for processor in (self._receiver, self._sender):
+                processor.output = PriorityLanes(
+                    priority_classifier, priority_lanes, priority_weights
+                )
+        self.latency = None
 
     @property
     def _using_own_receiver_processor(self):
@@ -291,6 +341,60 @@ class EventLink(EventLinkBelow, EventLinkAbove, DataEventLink):
         else:
             return '⇌□ {} □⇌'.format(self.__class__.__qualname__)
 
+    def reset(self):
+        """Return the link to its initial state, discarding any queued events.
+
+        The processors are restarted in place, so any handlers patched onto the
+        link (e.g. by AutomaticPipe) are kept.
+        """
+        self._receiver.reset()
+        self._sender.reset()
+
+    def record_latency(self, clock=None, histogram_factory=LogHistogram):
+        """Start recording event latencies in the latency dict of histograms.
+
+        Queueing latency is the time from when an event is queued for the layer
+        above or below until that layer consumes it with receive or to_send, and
+        processing latency is the time each call of to_receive or send takes,
+        excluding the time taken by any layers which record latencies and which
+        the event is passed on to within the call, as in an AutomaticPipeline.
+        Latencies are timed by clock, which defaults to a real-time Clock on
+        time.perf_counter. Links cost nothing extra until recording is started.
+        """
+        if self.latency is not None:
+            return
+        if clock is None:
+            clock = Clock(source=time.perf_counter)
+        self.latency = {name: histogram_factory() for name in LATENCY_HISTOGRAMS}
+        self._receiver.output = LatencyQueue(
+            self.latency['receive_queueing'], clock, self._receiver.output
+        )
+        self._sender.output = LatencyQueue(
+            self.latency['send_queueing'], clock, self._sender.output
+        )
+        wrap_methods(self, {
+            'to_receive': lambda method: timed(method, self.latency['receive_processing'], clock),
+            'send': lambda method: timed(method, self.latency['send_processing'], clock)
+        })
+
+    def latency_report(self, percentiles=(50, 99, 99.9)):
+        """Return reports of the latency histograms, or None if latencies aren't recorded."""
+        if self.latency is None:
+            return None
+        return {
+            name: histogram.report(percentiles) for (name, histogram) in self.latency.items()
+        }
+
+    @property
+    def receive_queue_depth(self):
+        """Return the number of received events waiting for the layer above."""
+        return len(self._receiver.output)
+
+    @property
+    def send_queue_depth(self):
+        """Return the number of events waiting to be sent by the layer below."""
+        return len(self._sender.output)
+
     # Implement EventLinkAbove
 
     def receive(self):
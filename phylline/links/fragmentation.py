@@ -0,0 +1,273 @@
+"""Links which fragment large payloads to fit within a maximum transmission unit.
+
+Provides a clocked link which splits each payload sent from above into
+fragments which fit within an MTU, and reassembles received fragments into
+preallocated buffers, so that reassembly costs one copy per byte no matter how
+many fragments a payload was split into.
+"""
+
+# Builtins
+
+import collections
+import math
+import struct
+
+# Packages
+
+from phylline.links.clocked import ClockedLink, LinkClockRequest, LinkClockTime
+from phylline.links.events import EventLink, LinkException
+from phylline.processors import event_processor, receive
+from phylline.util.buffers import BufferPool
+
+
+MESSAGE_ID_MODULUS = 1 << 32
+
+FRAGMENT_HEADER = struct.Struct('!III')  # message id, message length, offset
+
+
+class FragmentationLink(ClockedLink, EventLink):
+    """An EventLink which fragments sent payloads and reassembles received fragments.
+
+    Each payload sent from above is sent down as one or more fragments of at
+    most mtu bytes, each with a header holding a 32-bit message id, the length of
+    the whole payload, and the offset of the fragment in the payload; so
+    fragments may arrive in any order, and duplicate fragments are ignored. A
+    payload which fits in one fragment is passed up as soon as it arrives.
+
+    Received fragments of each payload are written in place into a buffer of
+    max_message_size bytes from buffer_pool, which by default preallocates one
+    buffer for each of the max_reassemblies payloads which may be reassembled
+    at once. When a fragment of another payload arrives while the maximum number
+    of payloads are being reassembled, the oldest reassembly is evicted. A
+    reassembly which is not completed within reassembly_timeout of its first
+    fragment is discarded; the link issues a clock request for the earliest such
+    deadline. The ids of the last completed_history payloads which were
+    reassembled from several fragments are remembered, so that late duplicate
+    fragments of them are discarded instead of starting new reassemblies. Sending
+    a payload larger than max_message_size passes a LinkException up instead.
+    Discarded fragments and reassemblies are counted in the stats dict.
+
+    Interface:
+    Above: sends and receives data events of bytestring payloads.
+    Below: sends and receives data events of bytestring fragments, plus
+    LinkClockTime events to advance the link's clock.
+    """
+
+    def __init__(
+        self, clock_start=None, mtu=1024, max_message_size=65536, max_reassemblies=16,
+        reassembly_timeout=1.0, buffer_pool=None, name=None, clock_resolution=None,
+        completed_history=64
+    ):
+        """Initialize members."""
+        if mtu <= FRAGMENT_HEADER.size:
+            raise ValueError('MTU must be larger than the fragment header: {}'.format(mtu))
+        if buffer_pool is not None and buffer_pool.buffer_size < max_message_size:
+            raise ValueError(
+                'Buffer pool buffers of {} bytes are smaller than the maximum message size: {}'
+                .format(buffer_pool.buffer_size, max_message_size)
+            )
+        super().__init__(
+            clock_start=clock_start, clock_resolution=clock_resolution, name=name
+        )
+        self.mtu = mtu
+        self.max_message_size = max_message_size
+        self.max_reassemblies = max_reassemblies
+        self.reassembly_timeout = reassembly_timeout
+        if buffer_pool is None:
+            buffer_pool = BufferPool(buffer_size=max_message_size, size=max_reassemblies)
+        self.buffer_pool = buffer_pool
+        self._next_message_id = 0
+        self._reassemblies = collections.OrderedDict()  # in order of first fragment
+        self.completed_history = completed_history
+        self._completed = collections.OrderedDict()  # message ids, in order of completion
+        self.stats = {
+            'fragmented': 0, 'reassembled': 0, 'duplicates': 0, 'malformed': 0,
+            'evicted': 0, 'timed_out': 0
+        }
+
+    def reset(self):
+        """Return the link to its initial state, returning reassembly buffers to the pool."""
+        for reassembly in self._reassemblies.values():
+            self.buffer_pool.release(reassembly['buffer'])
+        self._reassemblies.clear()
+        self._completed.clear()
+        self._next_message_id = 0
+        for key in self.stats:
+            self.stats[key] = 0
+        super().reset()
+
+    @property
+    def reassembling(self):
+        """Return the number of payloads being reassembled."""
+        return len(self._reassemblies)
+
+    # Fragmentation
+
+    def _fragment(self, payload, previous):
+        """Generate the fragment data events for a payload."""
+        message_id = self._next_message_id
+        self._next_message_id = (message_id + 1) % MESSAGE_ID_MODULUS
+        payload = memoryview(payload)
+        length = len(payload)
+        fragment_size = self.mtu - FRAGMENT_HEADER.size
+        for offset in range(0, max(length, 1), fragment_size):
+            fragment = b''.join((
+                FRAGMENT_HEADER.pack(message_id, length, offset),
+                payload[offset:offset + fragment_size]
+            ))
+            self.stats['fragmented'] += 1
+            yield self.make_link_data(fragment, 'down', previous)
+
+    # Reassembly
+
+    def _deadline_due(self, deadline):
+        now = self.clock.time
+        return now >= deadline or (
+            not self.clock.integer and math.isclose(now, deadline)
+        )
+
+    def _discard(self, message_id, stat):
+        reassembly = self._reassemblies.pop(message_id)
+        self.buffer_pool.release(reassembly['buffer'])
+        self.stats[stat] += 1
+
+    def _expire_reassemblies(self):
+        """Discard reassemblies whose deadlines have passed."""
+        while self._reassemblies:
+            (message_id, reassembly) = next(iter(self._reassemblies.items()))
+            if not self._deadline_due(reassembly['deadline']):
+                return
+            self._discard(message_id, 'timed_out')
+
+    def _reassemble(self, frame):
+        """Add a fragment to its reassembly, and return the payload if it's complete."""
+        if len(frame) < FRAGMENT_HEADER.size:
+            self.stats['malformed'] += 1
+            return None
+        (message_id, length, offset) = FRAGMENT_HEADER.unpack_from(frame)
+        chunk = memoryview(frame)[FRAGMENT_HEADER.size:]
+        if length > self.max_message_size or offset + len(chunk) > length:
+            self.stats['malformed'] += 1
+            return None
+        if offset == 0 and len(chunk) == length:
+            self.stats['reassembled'] += 1
+            return bytes(chunk)
+
+        reassembly = self._reassemblies.get(message_id)
+        if reassembly is None and message_id in self._completed:
+            self.stats['duplicates'] += 1
+            return None
+        if reassembly is None:
+            if len(self._reassemblies) >= self.max_reassemblies:
+                self._discard(next(iter(self._reassemblies)), 'evicted')
+            reassembly = {
+                'buffer': self.buffer_pool.acquire(), 'offsets': set(), 'received': 0,
+                'deadline': self.clock.time + self.reassembly_timeout
+            }
+            self._reassemblies[message_id] = reassembly
+        if offset in reassembly['offsets']:
+            self.stats['duplicates'] += 1
+            return None
+        reassembly['buffer'][offset:offset + len(chunk)] = chunk
+        reassembly['offsets'].add(offset)
+        reassembly['received'] += len(chunk)
+        if reassembly['received'] < length:
+            return None
+
+        del self._reassemblies[message_id]
+        self._completed[message_id] = None
+        if len(self._completed) > self.completed_history:
+            self._completed.popitem(last=False)
+        payload = bytes(memoryview(reassembly['buffer'])[:length])
+        self.buffer_pool.release(reassembly['buffer'])
+        self.stats['reassembled'] += 1
+        return payload
+
+    def _make_reassembly_clock_request(self):
+        if not self._reassemblies:
+            return None
+        return self.make_clock_request(next(iter(self._reassemblies.values()))['deadline'])
+
+    # Override ClockedLink
+
+    @property
+    def next_clock_request(self):
+        """Determine the next requested clock update, for the oldest reassembly."""
+        if not self._reassemblies:
+            return None
+        return LinkClockRequest(
+            next(iter(self._reassemblies.values()))['deadline'],
+            context={'time': self.clock.time}, instance=self
+        )
+
+    def on_clock_receive(self):
+        """Discard any reassemblies which have timed out, bypassing the receiver."""
+        if not self._reassemblies:
+            return
+
+        self._expire_reassemblies()
+        clock_request = self._make_reassembly_clock_request()
+        if clock_request is not None:
+            self.directly_receive(clock_request)
+
+    def on_clock_send(self):
+        """Do nothing, because sends are not delayed."""
+        pass
+
+    # Receive and send processors
+
+    @event_processor
+    def receiver_processor(self):
+        """Event receiver processor.
+
+        Make sure to yield from after_receive() at the end of the loop to expose
+        any generated events for consumption by the layer above.
+        """
+        while True:
+            event = yield from receive()
+            self.update_clock_time(event)
+            self._expire_reassemblies()
+            if isinstance(event, LinkClockTime):
+                continue
+            if isinstance(event, LinkException):
+                yield from self.after_receive(event)
+                continue
+            data_event = self.get_link_data(event, 'up')
+            if data_event is None:
+                continue
+
+            payload = self._reassemble(data_event.data)
+            if payload is not None:
+                yield from self.after_receive(self.make_link_data(payload, 'up', event))
+            clock_request = self._make_reassembly_clock_request()
+            if clock_request is not None:
+                yield from self.after_receive(clock_request)
+
+    @event_processor
+    def sender_processor(self):
+        """Event sender processor.
+
+        Make sure to yield from after_send() at the end of the loop to expose
+        any generated events for consumption by the layer below.
+        """
+        while True:
+            event = yield from receive()
+            self.update_clock_time(event)
+            if isinstance(event, LinkClockTime):
+                continue
+            if isinstance(event, LinkException):
+                yield from self.after_send(event)
+                continue
+            data_event = self.get_link_data(event, 'down')
+            if data_event is None:
+                continue
+
+            if len(data_event.data) > self.max_message_size:
+                self.directly_receive(self.make_link_exception(
+                    ValueError('Payload of {} bytes exceeds the maximum of {} bytes!'.format(
+                        len(data_event.data), self.max_message_size
+                    )), 'up', event
+                ))
+                continue
+            for fragment_event in self._fragment(data_event.data, event):
+                yield from self.after_send(fragment_event)
@@ -0,0 +1,155 @@
+"""Links which emulate an impaired network, for testing protocols in-process.
+
+Provides a link which applies random loss, duplication, reordering, delay and
+bandwidth limits to data events passing through it, in the manner of netem, but
+driven by the link's external clock so that tests are fast and reproducible.
+"""
+
+# Builtins
+
+import random
+
+# Packages
+
+from phylline.links.clocked import DelayedEventLink, HeapEventDelayer
+from phylline.links.events import LinkException
+from phylline.util.timing import TokenBucket
+
+
+class Impairment(object):
+    """Parameters for the impairments applied in one direction of an ImpairmentLink.
+
+    loss, duplication and reordering are probabilities applied independently to
+    each data event. A reordered event is held back by an extra reorder_delay, so
+    that events sent after it may overtake it. Every event is delayed by delay
+    plus a uniformly random jitter, which may also reorder events. If bandwidth
+    is not None, events are also queued behind a token bucket which passes
+    bandwidth bytes per unit of clock time with bursts of up to burst bytes.
+    seed seeds the random number generator for reproducible impairments.
+    """
+
+    def __init__(
+        self, loss=0.0, duplication=0.0, reordering=0.0, reorder_delay=0.0,
+        delay=0.0, jitter=0.0, bandwidth=None, burst=0, seed=None
+    ):
+        """Initialize members."""
+        self.loss = loss
+        self.duplication = duplication
+        self.reordering = reordering
+        self.reorder_delay = reorder_delay
+        self.delay = delay
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.burst = burst
+        self.seed = seed
+
+    def __repr__(self):
+        """Return a string representation of the impairment."""
+        return (
+            '{}(loss={}, duplication={}, reordering={}, reorder_delay={}, '
+            'delay={}, jitter={}, bandwidth={}, burst={}, seed={})'.format(
+                self.__class__.__qualname__, self.loss, self.duplication,
+                self.reordering, self.reorder_delay, self.delay, self.jitter,
+                self.bandwidth, self.burst, self.seed
+            )
+        )
+
+
+class ImpairmentLink(DelayedEventLink):
+    """An EventLink which passes events through an emulated impaired network.
+
+    Each direction has its own Impairment and its own random number generator.
+    Events are held in a HeapEventDelayer with reordering enabled, and the link
+    only issues a clock request for when the next held event will be due. The
+    numbers of events which were dropped, duplicated and reordered in each
+    direction are counted in the stats dict.
+
+    Interface:
+    Above: sends and receives data events.
+    Below: sends and receives data events, plus LinkClockTime events to
+    advance the link's clock.
+    """
+
+    def __init__(self, clock_start=0.0, receive_impairment=None, send_impairment=None):
+        """Initialize members.
+
+        An impairment of None passes events in that direction through unimpaired.
+        """
+        super().__init__(
+            clock_start=clock_start, receive_delay=0.0, send_delay=0.0,
+            delayer_factory=self._make_impairment_delayer
+        )
+        self.impairments = {
+            'up': receive_impairment if receive_impairment is not None else Impairment(),
+            'down': send_impairment if send_impairment is not None else Impairment()
+        }
+        self._randoms = {
+            direction: random.Random(impairment.seed)
+            for (direction, impairment) in self.impairments.items()
+        }
+        self._token_buckets = {
+            direction: (
+                TokenBucket(impairment.bandwidth, impairment.burst, clock=self.clock)
+                if impairment.bandwidth is not None else None
+            )
+            for (direction, impairment) in self.impairments.items()
+        }
+        self.stats = {
+            direction: {'dropped': 0, 'duplicated': 0, 'reordered': 0}
+            for direction in self.impairments
+        }
+
+    def reset(self):
+        """Return the link to its initial state, reseeding its random number generators."""
+        super().reset()
+        for (direction, impairment) in self.impairments.items():
+            self._randoms[direction].seed(impairment.seed)
+            if self._token_buckets[direction] is not None:
+                self._token_buckets[direction].reset()
+            for key in self.stats[direction]:
+                self.stats[direction][key] = 0
+
+    def _make_impairment_delayer(self, processor, clock, delay):
+        return HeapEventDelayer(processor, clock, delay, reorder=True)
+
+    def _impaired_delay(self, data_event, direction):
+        impairment = self.impairments[direction]
+        random_source = self._randoms[direction]
+        delay = impairment.delay
+        if impairment.jitter:
+            delay += random_source.uniform(0, impairment.jitter)
+        if impairment.reordering and random_source.random() < impairment.reordering:
+            delay += impairment.reorder_delay
+            self.stats[direction]['reordered'] += 1
+        token_bucket = self._token_buckets[direction]
+        if token_bucket is not None:
+            try:
+                length = len(data_event.data)
+            except TypeError:
+                length = 0
+            delay += token_bucket.reserve(length)
+        return delay
+
+    # Override DelayedEventLink
+
+    def _enqueue_data_event(self, event, direction):
+        if isinstance(event, LinkException):
+            return
+        data_event = self.get_link_data(event, direction)
+        if data_event is None:
+            return
+
+        impairment = self.impairments[direction]
+        random_source = self._randoms[direction]
+        if impairment.loss and random_source.random() < impairment.loss:
+            self.stats[direction]['dropped'] += 1
+            return
+        copies = 1
+        if impairment.duplication and random_source.random() < impairment.duplication:
+            copies = 2
+            self.stats[direction]['duplicated'] += 1
+        for _ in range(copies):
+            copy_event = self.make_link_data(data_event.data, direction, event)
+            self._delayers[direction].enqueue_event(
+                copy_event, delay=self._impaired_delay(copy_event, direction)
+            )
@@ -73,6 +73,11 @@ class ChunkedStreamLink(StreamLinkBelow, EventLinkAbove, DataEventLink):
         else:
             return '⇌~ {} □⇌'.format(self.__class__.__qualname__)
 
+    def reset(self):
+        """Return the link to its initial state, discarding any queued data."""
+        self._event_link.reset()
+        self._stream_link.reset()
+
     # Implement EventLinkAbove
 
     def receive(self):
@@ -93,9 +98,9 @@ class ChunkedStreamLink(StreamLinkBelow, EventLinkAbove, DataEventLink):
         """Implement StreamLinkBelow.to_read."""
         self._stream_link.to_read(bytes_data)
 
-    def to_write(self):
+    def to_write(self, max_bytes=None):
         """Implement StreamLinkBelow.to_write."""
-        return self._stream_link.to_write()
+        return self._stream_link.to_write(max_bytes)
 
     # Utilities for writing receive and send processors
 
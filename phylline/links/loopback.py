@@ -42,6 +42,11 @@ class TopLoopbackLink(GenericLinkBelow, DataEventLink):
         else:
             return '⇌* {}'.format(self.__class__.__qualname__)
 
+    def reset(self):
+        """Return the link to its initial state, discarding any queued data."""
+        self._event_link.reset()
+        self._stream_link.reset()
+
     # Implement EventLinkBelow
 
     def to_receive(self, event):
@@ -62,9 +67,9 @@ class TopLoopbackLink(GenericLinkBelow, DataEventLink):
         """Implement StreamLinkBelow."""
         self._stream_link.to_read(bytes_data)
 
-    def to_write(self):
+    def to_write(self, max_bytes=None):
         """Implement StreamLinkBelow."""
-        return self._stream_link.to_write()
+        return self._stream_link.to_write(max_bytes)
 
     # Read and write processors
 
@@ -120,6 +125,11 @@ class BottomLoopbackLink(GenericLinkAbove, DataEventLink):
         else:
             return '{} *⇌'.format(self.__class__.__qualname__)
 
+    def reset(self):
+        """Return the link to its initial state, discarding any queued data."""
+        self._event_link.reset()
+        self._stream_link.reset()
+
     # Implement EventLinkAbove
 
     def receive(self):
@@ -136,9 +146,9 @@ class BottomLoopbackLink(GenericLinkAbove, DataEventLink):
 
     # Implement StreamLinkAbove
 
-    def read(self):
+    def read(self, max_bytes=None):
         """Implement StreamLinkAbove.read."""
-        return self._stream_link.read()
+        return self._stream_link.read(max_bytes)
 
     def write(self, bytes_data):
         """Implement StreamLinkAbove.write."""
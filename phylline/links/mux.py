@@ -0,0 +1,149 @@
+"""Links which multiplex many logical channels over one lower link.
+
+Provides a demultiplexer link which routes each received event to exactly one
+channel by a key looked up in a dict, rather than broadcasting every event to
+every link above it, and a multiplexer link for each channel which tags the
+events sent on that channel before merging them into the demultiplexer.
+"""
+
+# Builtins
+
+# Packages
+
+from phylline.links.events import EventLink, LinkException
+from phylline.processors import event_processor, receive
+
+
+def context_channel(data_event):
+    """Return the channel stored in the context of a data event, or None."""
+    return data_event.context.get('channel')
+
+
+class DemuxLink(EventLink):
+    """An EventLink which routes received events to one channel each.
+
+    Each received data event is passed to the to_receive of the MuxLink
+    registered for the channel returned by key(data_event), so each event costs
+    one dict lookup no matter how many channels there are. If untag is not None,
+    the data is replaced by untag(data, channel) before it is routed, for example
+    to strip a channel header. The channel is also stored in the event's context.
+    Events with no registered channel are passed up from the DemuxLink itself and
+    counted in the stats dict, and LinkException events are passed to every
+    channel.
+
+    Events sent by MuxLinks are merged into the DemuxLink's send queue in the
+    order in which they were sent, after tagging by the MuxLink. If tag is not
+    None, the data of each sent event is replaced by tag(data, channel), for
+    example to prepend a channel header.
+
+    By default, channels are read from and written to the contexts of events.
+
+    Interface:
+    Above: receives data events with unroutable channels; channels are attached
+    by MuxLinks instead.
+    Below: sends and receives data events.
+    """
+
+    def __init__(self, key=context_channel, tag=None, untag=None, name=None):
+        """Initialize members."""
+        super().__init__(name=name, sender_event_passthrough=True)
+        self.key = key
+        self.tag = tag
+        self.untag = untag
+        self.channels = {}
+        self.stats = {'unroutable': 0}
+
+    def reset(self):
+        """Return the link to its initial state, keeping the registered channels."""
+        super().reset()
+        self.stats['unroutable'] = 0
+
+    def add_channel(self, channel, mux_link):
+        """Register a MuxLink to receive the events for the channel."""
+        if channel in self.channels:
+            raise ValueError('Channel {!r} is already registered!'.format(channel))
+        self.channels[channel] = mux_link
+
+    def remove_channel(self, channel):
+        """Unregister the MuxLink for the channel, and return it."""
+        return self.channels.pop(channel)
+
+    # Receive processor
+
+    @event_processor
+    def receiver_processor(self):
+        """Event receiver processor.
+
+        Make sure to yield from after_receive() with any unroutable event to expose
+        it for consumption by the layer above.
+        """
+        while True:
+            event = yield from receive()
+            if isinstance(event, LinkException):
+                for mux_link in list(self.channels.values()):
+                    mux_link.to_receive(event)
+                continue
+            data_event = self.get_link_data(event, 'up')
+            if data_event is None:
+                continue
+
+            channel = self.key(data_event)
+            mux_link = self.channels.get(channel)
+            if mux_link is None:
+                self.stats['unroutable'] += 1
+                yield from self.after_receive(data_event)
+                continue
+            if self.untag is not None:
+                data_event.data = self.untag(data_event.data, channel)
+            data_event.context['channel'] = channel
+            mux_link.to_receive(data_event)
+
+
+class MuxLink(EventLink):
+    """An EventLink for one channel of a DemuxLink.
+
+    The MuxLink registers itself with the DemuxLink for the channel on
+    construction. It passes up the events which the DemuxLink routes to it, and
+    tags every event sent to it with its channel before sending it directly into
+    the DemuxLink, so it never has anything to_send itself.
+
+    Interface:
+    Above: sends and receives data events.
+    Below: attached to a DemuxLink.
+    """
+
+    def __init__(self, demux, channel, name=None):
+        """Initialize members."""
+        super().__init__(name=name, receiver_event_passthrough=True)
+        self.demux = demux
+        self.channel = channel
+        demux.add_channel(channel, self)
+
+    def close(self):
+        """Unregister the MuxLink from its DemuxLink."""
+        self.demux.remove_channel(self.channel)
+
+    # Send processor
+
+    @event_processor
+    def sender_processor(self):
+        """Event sender processor.
+
+        Tagged events are sent directly to the DemuxLink rather than through
+        after_send().
+        """
+        while True:
+            event = yield from receive()
+            if isinstance(event, LinkException):
+                self.demux.send(event)
+                continue
+            data_event = self.get_link_data(event, 'down')
+            if data_event is None:
+                continue
+
+            data = data_event.data
+            if self.demux.tag is not None:
+                data = self.demux.tag(data, self.channel)
+            context = data_event.context
+            context['channel'] = self.channel
+            self.demux.send(self.make_link_data(data, 'down', event, context=context))
@@ -0,0 +1,261 @@
+"""Links which shape traffic to fit within rate budgets.
+
+Provides a clocked link which holds back events to keep the rate of events and
+bytes passing through it within token-bucket budgets, so that a fast host does
+not burst faster than a slow device or network can accept.
+"""
+
+# Builtins
+
+import collections
+
+# Packages
+
+from phylline.links.clocked import ClockedLink, LinkClockRequest, LinkClockTime
+from phylline.links.events import EventLink, LinkException
+from phylline.processors import event_processor, receive
+from phylline.util.timing import TokenBucket
+
+
+class RateLimit(object):
+    """Budgets for the traffic in one direction of a RateLimitedLink.
+
+    events_rate and bytes_rate are the numbers of events and bytes allowed per
+    unit of clock time, or None for no limit; event_burst and byte_burst are the
+    numbers of events and bytes which may pass at once after an idle period. By
+    default, byte_burst is one unit of time's worth of bytes. An event larger than
+    byte_burst waits until the byte budget is full, and then leaves it in debt.
+    At most queue_size events are held back; any more are dropped.
+    """
+
+    def __init__(
+        self, events_rate=None, event_burst=1, bytes_rate=None, byte_burst=None,
+        queue_size=1024
+    ):
+        """Initialize members."""
+        self.events_rate = events_rate
+        self.event_burst = event_burst
+        self.bytes_rate = bytes_rate
+        if byte_burst is None and bytes_rate is not None:
+            byte_burst = bytes_rate
+        self.byte_burst = byte_burst
+        self.queue_size = queue_size
+
+    def __repr__(self):
+        """Return a string representation of the rate limit."""
+        return (
+            '{}(events_rate={}, event_burst={}, bytes_rate={}, byte_burst={}, '
+            'queue_size={})'.format(
+                self.__class__.__qualname__, self.events_rate, self.event_burst,
+                self.bytes_rate, self.byte_burst, self.queue_size
+            )
+        )
+
+
+class RateLimitedLink(ClockedLink, EventLink):
+    """An EventLink which passes data events through within rate budgets.
+
+    Each direction has its own RateLimit. Events which would exceed the budget
+    are held in a FIFO queue, and the link issues a clock request for exactly the
+    time when the budget allows the next held event to pass, so it needs no clock
+    updates in between. When the queue is full, the event is dropped and a
+    LinkException is passed up to the layer above, and the drop is counted in the
+    stats dict. LinkException events pass through without limits. If
+    clock_resolution is not None, the rates are per clock tick, and held events
+    wait for whole numbers of ticks.
+
+    Interface:
+    Above: sends and receives data events.
+    Below: sends and receives data events, plus LinkClockTime events to
+    advance the link's clock.
+    """
+
+    # Budgets within tolerance of being available are treated as available, so that
+    # floating-point error doesn't cause a clock request for an instant later.
+    TOLERANCE = 1e-9
+
+    def __init__(
+        self, clock_start=None, receive_limit=None, send_limit=None, name=None,
+        clock_resolution=None
+    ):
+        """Initialize members.
+
+        A rate limit of None passes events in that direction through unlimited.
+        """
+        super().__init__(
+            clock_start=clock_start, clock_resolution=clock_resolution, name=name
+        )
+        self.limits = {
+            'up': receive_limit if receive_limit is not None else RateLimit(),
+            'down': send_limit if send_limit is not None else RateLimit()
+        }
+        self._processors = {'up': 'receive', 'down': 'send'}
+        self._token_buckets = {
+            direction: self._make_token_buckets(limit)
+            for (direction, limit) in self.limits.items()
+        }
+        self._queues = {direction: collections.deque() for direction in self.limits}
+        self.stats = {direction: {'dropped': 0} for direction in self.limits}
+
+    def _make_token_buckets(self, limit):
+        token_buckets = {}
+        if limit.events_rate is not None:
+            token_buckets['events'] = TokenBucket(
+                limit.events_rate, limit.event_burst, clock=self.clock
+            )
+        if limit.bytes_rate is not None:
+            token_buckets['bytes'] = TokenBucket(
+                limit.bytes_rate, limit.byte_burst, clock=self.clock
+            )
+        return token_buckets
+
+    def reset(self):
+        """Return the link to its initial state, discarding any held events."""
+        super().reset()
+        for direction in self.limits:
+            self._queues[direction].clear()
+            for token_bucket in self._token_buckets[direction].values():
+                token_bucket.reset()
+            self.stats[direction]['dropped'] = 0
+
+    def queued(self, direction):
+        """Return the number of events held back in the given direction."""
+        return len(self._queues[direction])
+
+    # Budgets
+
+    def _costs(self, data_event, direction):
+        token_buckets = self._token_buckets[direction]
+        if 'events' in token_buckets:
+            yield (token_buckets['events'], 1)
+        if 'bytes' in token_buckets:
+            try:
+                length = len(data_event.data)
+            except TypeError:
+                length = 0
+            yield (token_buckets['bytes'], length)
+
+    def _wait_time(self, data_event, direction):
+        """Return the clock time until the budget allows the event to pass."""
+        return max((
+            token_bucket.time_until(min(cost, token_bucket.capacity))
+            for (token_bucket, cost) in self._costs(data_event, direction)
+        ), default=0)
+
+    # Receive and send processors
+
+    def _enqueue_event(self, event, direction):
+        processor = self._processors[direction]
+        if isinstance(event, LinkClockTime):
+            return
+        if isinstance(event, LinkException):
+            yield from getattr(self, 'after_{}'.format(processor))(event)
+            return
+        data_event = self.get_link_data(event, direction)
+        if data_event is None:
+            return
+
+        queue = self._queues[direction]
+        if len(queue) >= self.limits[direction].queue_size:
+            self.stats[direction]['dropped'] += 1
+            exception = self.make_link_exception(
+                BufferError('Rate limit queue is full, so the event was dropped!'),
+                'up', event
+            )
+            if direction == 'up':
+                yield from self.after_receive(exception)
+            else:
+                self.directly_receive(exception)
+            return
+        queue.append(data_event)
+
+    def _dequeue_due_events(self, direction):
+        queue = self._queues[direction]
+        while queue and self._wait_time(queue[0], direction) <= self.TOLERANCE:
+            data_event = queue.popleft()
+            for (token_bucket, cost) in self._costs(data_event, direction):
+                token_bucket.reserve(cost)
+            yield data_event
+
+    def _make_queue_clock_request(self, direction):
+        queue = self._queues[direction]
+        if not queue:
+            return None
+
+        return self.make_clock_request(
+            self.clock.time + self._wait_time(queue[0], direction),
+            previous=queue[0].previous
+        )
+
+    def _flush_queue(self, direction):
+        processor = self._processors[direction]
+        for data_event in self._dequeue_due_events(direction):
+            yield from getattr(self, 'after_{}'.format(processor))(data_event)
+
+    def _issue_clock_request(self, direction):
+        clock_request = self._make_queue_clock_request(direction)
+        if clock_request is not None:
+            processor = self._processors[direction]
+            yield from getattr(self, 'after_{}'.format(processor))(clock_request)
+
+    def _flush_directly(self, direction, emit):
+        if not self._queues[direction]:
+            return
+
+        for data_event in self._dequeue_due_events(direction):
+            emit(data_event)
+        clock_request = self._make_queue_clock_request(direction)
+        if clock_request is not None:
+            emit(clock_request)
+
+    # Override ClockedLink
+
+    @property
+    def next_clock_request(self):
+        """Determine the next requested clock update, for the earliest held event."""
+        wait_times = [
+            self._wait_time(queue[0], direction)
+            for (direction, queue) in self._queues.items() if queue
+        ]
+        if not wait_times:
+            return None
+        return LinkClockRequest(
+            self.clock.time + min(wait_times), context={'time': self.clock.time},
+            instance=self
+        )
+
+    def on_clock_receive(self):
+        """Pass up any held received events which now fit the budget."""
+        self._flush_directly('up', self.directly_receive)
+
+    def on_clock_send(self):
+        """Pass down any held sent events which now fit the budget."""
+        self._flush_directly('down', self.directly_to_send)
+
+    @event_processor
+    def receiver_processor(self):
+        """Event receiver processor.
+
+        Make sure to yield from after_receive() at the end of the loop to expose
+        any generated events for consumption by the layer above.
+        """
+        while True:
+            event = yield from receive()
+            self.update_clock_time(event)
+            yield from self._enqueue_event(event, 'up')
+            yield from self._flush_queue('up')
+            yield from self._issue_clock_request('up')
+
+    @event_processor
+    def sender_processor(self):
+        """Event sender processor.
+
+        Make sure to yield from after_send() at the end of the loop to expose
+        any generated events for consumption by the layer below.
+        """
+        while True:
+            event = yield from receive()
+            self.update_clock_time(event)
+            yield from self._enqueue_event(event, 'down')
+            yield from self._flush_queue('down')
+            yield from self._issue_clock_request('down')
@@ -0,0 +1,321 @@
+"""Links which own a non-blocking socket at the bottom of a pipeline.
+
+Socket links are the only links in phylline which perform I/O: they are meant to
+be the bottom layer of a pipeline, and the application's event loop calls
+read_socket when the socket is readable and write_socket when the socket is
+writable (or whenever has_write_socket is true). Everything above a socket link
+stays sans-I/O.
+
+Provides a stream socket link for TCP and Unix-domain stream sockets, and a
+datagram socket link for UDP (or Unix-domain datagram) sockets.
+"""
+
+# Builtins
+
+import collections
+import itertools
+import os
+
+# Packages
+
+from phylline.links.events import DataEventLink, EventLink, EventLinkAbove
+from phylline.links.streams import StreamLink, StreamLinkAbove
+from phylline.processors import send, write
+from phylline.util.buffers import BufferPool
+
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+
+
+class SocketLink(object):
+    """Support for owning a non-blocking socket at the bottom of a pipeline.
+
+    Received data is read with recv_into into preallocated bytearrays taken from
+    a BufferPool, so receiving does not allocate a new buffer per system call.
+
+    While the link is paused, read_socket reads nothing, so that received data
+    stays in the socket's receive buffer and the kernel's flow control pushes back
+    on the peer. Because the socket stays readable, the event loop should also
+    stop waiting for it to become readable until the link is no longer paused.
+    """
+
+    def __init__(self, sock, name=None, buffer_pool=None, max_recvs=16, paused=False):
+        """Initialize members.
+
+        max_recvs is the maximum number of recv system calls made by each call
+        of read_socket, so that one busy socket can't monopolize the caller.
+        paused is either a flag or a callable which returns whether the link is
+        paused, e.g. lambda: pipeline.paused for an AutomaticPipeline with
+        receive_credits.
+        """
+        self.name = name
+        self.socket = sock
+        self.socket.setblocking(False)
+        if buffer_pool is None:
+            buffer_pool = BufferPool()
+        self.buffer_pool = buffer_pool
+        self.max_recvs = max_recvs
+        self.eof = False
+        self._paused = paused
+
+    @property
+    def paused(self):
+        """Return whether reading from the socket is paused."""
+        if callable(self._paused):
+            return bool(self._paused())
+        return bool(self._paused)
+
+    @paused.setter
+    def paused(self, paused):
+        """Set the flag or callable which determines whether reading is paused."""
+        self._paused = paused
+
+    def fileno(self):
+        """Return the file descriptor of the socket, e.g. for use with selectors."""
+        return self.socket.fileno()
+
+    def close(self):
+        """Close the socket."""
+        self.socket.close()
+
+
+class StreamSocketLink(SocketLink, StreamLinkAbove):
+    """A bottom link which reads and writes bytes on a stream socket.
+
+    Works with TCP and Unix-domain stream sockets. Bytes received by read_socket
+    into pooled receive buffers are passed to the reader processor as memoryviews,
+    which the reader copies into its own buffer as it processes them; each receive
+    buffer goes back into the pool right after it has been passed on. Bytes
+    written from above are queued until write_socket flushes them with a single
+    vectored sendmsg call; any bytes which the socket did not accept stay queued
+    for the next write_socket.
+
+    Interface:
+    Above: sends and receives bytestrings.
+    Below: a non-blocking stream socket.
+    """
+
+    def __init__(self, sock, name=None, buffer_pool=None, max_recvs=16, paused=False):
+        """Initialize members."""
+        super().__init__(
+            sock, name=name, buffer_pool=buffer_pool, max_recvs=max_recvs, paused=paused
+        )
+        self._stream_link = StreamLink()
+        self._stream_link.after_read = self.__after_read
+        self._to_write = collections.deque()
+        self.pending_write_bytes = 0
+
+    def __repr__(self):
+        """Return a string representation of the link."""
+        if self.name is not None:
+            return '{}({}) ~⇌'.format(self.__class__.__qualname__, self.name)
+        else:
+            return '{} ~⇌'.format(self.__class__.__qualname__)
+
+    # Implement StreamLinkAbove
+
+    def read(self, max_bytes=None):
+        """Implement StreamLinkAbove.read."""
+        return self._stream_link.read(max_bytes)
+
+    def write(self, bytes_data):
+        """Implement StreamLinkAbove.write."""
+        if not bytes_data:
+            return
+        self._to_write.append(bytes_data)
+        self.pending_write_bytes += len(bytes_data)
+
+    # Socket I/O
+
+    def read_socket(self):
+        """Receive available bytes from the socket and pass them up.
+
+        Returns the number of bytes received, which is 0 without reading anything
+        while the link is paused. Sets eof if the peer closed the connection.
+        """
+        if self.paused:
+            return 0
+        total_received = 0
+        for _ in range(self.max_recvs):
+            buffer = self.buffer_pool.acquire()
+            try:
+                received = self.socket.recv_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                self.buffer_pool.release(buffer)
+                break
+            if received == 0:
+                self.buffer_pool.release(buffer)
+                self.eof = True
+                break
+            total_received += received
+            self._stream_link.to_read(memoryview(buffer)[:received])
+            # Only safe because the inner StreamLink copies the bytes out of the
+            # memoryview (with b''.join) before to_read returns; a reader which
+            # kept a reference to the memoryview would see the buffer reused
+            self.buffer_pool.release(buffer)
+            if received < len(buffer):  # the socket has been drained
+                break
+        return total_received
+
+    def has_write_socket(self):
+        """Return whether any bytes are waiting to be written to the socket."""
+        return self.pending_write_bytes > 0
+
+    def write_socket(self):
+        """Write as many pending bytes as the socket will accept.
+
+        Returns the number of bytes sent.
+        """
+        total_sent = 0
+        while self._to_write:
+            buffers = list(itertools.islice(self._to_write, IOV_MAX))
+            try:
+                sent = self.socket.sendmsg(buffers)
+            except (BlockingIOError, InterruptedError):
+                break
+            total_sent += sent
+            self.pending_write_bytes -= sent
+            partial = sent < sum(len(buffer) for buffer in buffers)
+            while sent > 0:
+                buffer = self._to_write[0]
+                if len(buffer) <= sent:
+                    sent -= len(buffer)
+                    self._to_write.popleft()
+                else:
+                    self._to_write[0] = memoryview(buffer)[sent:]
+                    sent = 0
+            if partial:  # the socket's send buffer is full
+                break
+        return total_sent
+
+    # Utilities for writing read processors
+
+    def __after_read(self, buffer):
+        yield from self.after_read(buffer)
+
+    def after_read(self, buffer):
+        """Enqueue the buffer for the layer above for consumption by that layer.
+
+        This gets overridden to change the receiver's behavior to send the event.
+        Note that this gets monkey-patched by other links and link utilities
+        which combine links, such as AutomaticPipe!
+        """
+        yield from write(buffer)
+
+
+class DatagramSocketLink(SocketLink, EventLinkAbove, DataEventLink):
+    """A bottom link which receives and sends datagrams on a datagram socket.
+
+    Each datagram received by read_socket is passed up as a LinkData event whose
+    context holds the sender's address. Each event sent from above is queued as
+    one datagram until write_socket sends it with sendmsg; if the event has an
+    address in its context, the datagram is sent to that address, otherwise the
+    socket must be connected.
+
+    Interface:
+    Above: sends and receives LinkData events of datagram payloads.
+    Below: a non-blocking datagram socket.
+    """
+
+    def __init__(self, sock, name=None, buffer_pool=None, max_recvs=16, paused=False):
+        """Initialize members."""
+        super().__init__(
+            sock, name=name, buffer_pool=buffer_pool, max_recvs=max_recvs, paused=paused
+        )
+        self._event_link = EventLink(receiver_event_passthrough=True)
+        self._event_link.after_receive = self.__after_receive
+        self._to_send = collections.deque()
+
+    def __repr__(self):
+        """Return a string representation of the link."""
+        if self.name is not None:
+            return '{}({}) □⇌'.format(self.__class__.__qualname__, self.name)
+        else:
+            return '{} □⇌'.format(self.__class__.__qualname__)
+
+    # Implement EventLinkAbove
+
+    def receive(self):
+        """Implement EventLinkAbove.receive."""
+        return self._event_link.receive()
+
+    def has_receive(self):
+        """Implement EventLinkAbove.has_receive."""
+        return self._event_link.has_receive()
+
+    def send(self, event):
+        """Implement EventLinkAbove.send."""
+        data_event = self.get_link_data(event, 'down')
+        if data_event is None:  # not a datagram, e.g. a LinkException
+            return
+        self._to_send.append(data_event)
+
+    # Socket I/O
+
+    def read_socket(self):
+        """Receive available datagrams from the socket and pass them up.
+
+        Returns the number of datagrams received, which is 0 without reading
+        anything while the link is paused.
+        """
+        if self.paused:
+            return 0
+        total_received = 0
+        buffer = self.buffer_pool.acquire()
+        try:
+            for _ in range(self.max_recvs):
+                try:
+                    (received, address) = self.socket.recvfrom_into(buffer)
+                except (BlockingIOError, InterruptedError):
+                    break
+                total_received += 1
+                self._event_link.to_receive(self.make_link_data(
+                    bytes(memoryview(buffer)[:received]), 'up', None,
+                    context={'address': address}
+                ))
+        finally:
+            self.buffer_pool.release(buffer)
+        return total_received
+
+    def has_write_socket(self):
+        """Return whether any datagrams are waiting to be sent on the socket."""
+        return len(self._to_send) > 0
+
+    def write_socket(self):
+        """Send as many pending datagrams as the socket will accept.
+
+        Returns the number of datagrams sent.
+        """
+        total_sent = 0
+        while self._to_send:
+            data_event = self._to_send[0]
+            address = data_event.context.get('address')
+            try:
+                if address is None:
+                    self.socket.sendmsg([data_event.data])
+                else:
+                    self.socket.sendmsg([data_event.data], [], 0, address)
+            except (BlockingIOError, InterruptedError):
+                break
+            self._to_send.popleft()
+            total_sent += 1
+        return total_sent
+
+    # Utilities for writing receive processors
+
+    def __after_receive(self, event):
+        yield from self.after_receive(event)
+
+    def after_receive(self, event):
+        """Enqueue the event for the layer above for consumption by that layer.
+
+        This gets overridden to change the receiver's behavior to send the event.
+        Note that this gets monkey-patched by other links and link utilities
+        which combine links, such as AutomaticPipe!
+        """
+        yield from send(event)
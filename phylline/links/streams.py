@@ -12,11 +12,15 @@ discrete event links.
 
 # Builtins
 
+import time
 from abc import abstractmethod
 
 # Packages
 
-from phylline.processors import read, stream_processor, write
+from phylline.processors import LatencyBuffer, read, stream_processor, write
+from phylline.util.histograms import LATENCY_HISTOGRAMS, LogHistogram, timed
+from phylline.util.instrumentation import wrap_methods
+from phylline.util.timing import Clock
 
 
 class StreamLinkAbove(object):
@@ -27,8 +31,12 @@ class StreamLinkAbove(object):
     """
 
     @abstractmethod
-    def read(self):
-        """Return available received bytes, while consuming them."""
+    def read(self, max_bytes=None):
+        """Return available received bytes, while consuming them.
+
+        If max_bytes is not None, at most max_bytes bytes are returned and any
+        remaining bytes stay buffered.
+        """
         pass
 
     @abstractmethod
@@ -50,8 +58,12 @@ class StreamLinkBelow(object):
         pass
 
     @abstractmethod
-    def to_write(self):
-        """Return available bytes to write from the link, while consuming them."""
+    def to_write(self, max_bytes=None):
+        """Return available bytes to write from the link, while consuming them.
+
+        If max_bytes is not None, at most max_bytes bytes are returned and any
+        remaining bytes stay buffered.
+        """
         pass
 
 
@@ -92,16 +104,65 @@ class StreamLink(StreamLinkBelow, StreamLinkAbove):
         self._writer = writer_processor(
             *writer_processor_args, **writer_processor_kwargs
         )
+        self.latency = None
 
     def __repr__(self):
         """Return a string representation of the link."""
         return '⇌~ {} ~⇌'.format(self.__class__.__qualname__)
 
+    def reset(self):
+        """Return the link to its initial state, discarding any buffered bytes.
+
+        The processors are restarted in place, so any handlers patched onto the
+        link (e.g. by AutomaticPipe) are kept.
+        """
+        self._reader.reset()
+        self._writer.reset()
+
+    def record_latency(self, clock=None, histogram_factory=LogHistogram):
+        """Start recording buffer latencies in the latency dict of histograms.
+
+        Queueing latency is the time from when a buffer is written for the layer
+        above or below until its last byte is consumed by read or to_write, and
+        processing latency is the time each call of to_read or write takes,
+        excluding the time taken by any layers which record latencies and which
+        the buffer is passed on to within the call, as in an AutomaticPipeline.
+        Latencies are timed by clock, which defaults to a real-time Clock on
+        time.perf_counter.
+        """
+        if self.latency is not None:
+            return
+        if clock is None:
+            clock = Clock(source=time.perf_counter)
+        self.latency = {name: histogram_factory() for name in LATENCY_HISTOGRAMS}
+        self._reader.output = LatencyBuffer(
+            self.latency['receive_queueing'], clock, self._reader.output
+        )
+        self._writer.output = LatencyBuffer(
+            self.latency['send_queueing'], clock, self._writer.output
+        )
+        wrap_methods(self, {
+            'to_read': lambda method: timed(method, self.latency['receive_processing'], clock),
+            'write': lambda method: timed(method, self.latency['send_processing'], clock)
+        })
+
+    def latency_report(self, percentiles=(50, 99, 99.9)):
+        """Return reports of the latency histograms, or None if latencies aren't recorded."""
+        if self.latency is None:
+            return None
+        return {
+            name: histogram.report(percentiles) for (name, histogram) in self.latency.items()
+        }
+
     # Implement StreamLinkAbove
 
-    def read(self):
+    def read(self, max_bytes=None):
         """Implement StreamLinkAbove.read."""
-        return self._reader.read()
+        if max_bytes is None:
+            return self._reader.read()
+        if max_bytes <= 0:  # ohneio reads everything for 0 bytes
+            return b''
+        return self._reader.read(max_bytes)
 
     def write(self, bytes_data):
         """Implement StreamLinkAbove.write."""
@@ -114,9 +175,13 @@ class StreamLink(StreamLinkBelow, StreamLinkAbove):
         """Implement StreamLinkBelow.to_read."""
         self._reader.send(bytes_data)
 
-    def to_write(self):
+    def to_write(self, max_bytes=None):
         """Implement StreamLinkBelow.to_write."""
-        return self._writer.read()
+        if max_bytes is None:
+            return self._writer.read()
+        if max_bytes <= 0:  # ohneio reads everything for 0 bytes
+            return b''
+        return self._writer.read(max_bytes)
 
     # Utilities for writing read and write processors
 
@@ -0,0 +1,325 @@
+"""Counters of the events passing through the links of pipelines.
+
+A MetricsRegistry instruments links so that each event entering or leaving a
+link increments plain integer attributes of the LinkMetrics for that link's
+pipeline name and link name, so links with the same names share their counters.
+Queue depths and the stats dicts of links and pipes are only read when the
+metrics are collected. Metrics can be rendered as a dict or as Prometheus
+exposition text, which can be written to a file for a textfile collector or
+served from a local HTTP endpoint.
+
+Counters are updated without locking by the thread running the instrumented
+pipelines, so metrics should only be rendered on that thread; the HTTP endpoint
+serves the last snapshot rendered there rather than reading the counters itself.
+"""
+
+# Builtins
+
+import collections
+import http.server
+import os
+import socketserver
+import threading
+
+# Packages
+
+from phylline.links.clocked import LinkClockRequest
+from phylline.links.events import LinkData, LinkEvent, LinkException
+from phylline.util.instrumentation import link_name as get_link_name, wrap_methods
+
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+PROMETHEUS_HELP = {
+    'events_in': 'Events which entered the link.',
+    'events_out': 'Events which left the link.',
+    'bytes_in': 'Bytes of data which entered the link.',
+    'bytes_out': 'Bytes of data which left the link.',
+    'exceptions': 'LinkExceptions which left the link.',
+    'clock_requests': 'LinkClockRequests which left the link.',
+    'receive_queue_depth': 'Received events waiting for the layer above.',
+    'send_queue_depth': 'Events waiting to be sent by the layer below.'
+}
+
+
+def _data_length(event):
+    if isinstance(event, LinkData):
+        event = event.data
+    elif isinstance(event, LinkEvent):
+        return 0
+    try:
+        return len(event)
+    except TypeError:
+        return 0
+
+
+def _flatten_stats(stats, prefix=''):
+    """Generate (name, value) pairs for a possibly nested stats dict."""
+    for (key, value) in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten_stats(value, '{}{}_'.format(prefix, key))
+        else:
+            yield ('{}{}'.format(prefix, key), value)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class LinkMetrics(object):
+    """Counters for the events entering and leaving the links with one name.
+
+    Events enter a link from above or below, and leave it towards the layer above
+    or below; bytes are counted for data events and for raw data. LinkExceptions
+    and LinkClockRequests leaving the link are also counted separately.
+    """
+
+    COUNTERS = (
+        'events_in', 'events_out', 'bytes_in', 'bytes_out', 'exceptions',
+        'clock_requests'
+    )
+
+    def __init__(self):
+        """Initialize members."""
+        self.links = []
+        self.reset()
+
+    def reset(self):
+        """Zero all counters."""
+        self.events_in = 0
+        self.events_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.exceptions = 0
+        self.clock_requests = 0
+
+    def count_in(self, event):
+        """Count an event entering a link."""
+        self.events_in += 1
+        self.bytes_in += _data_length(event)
+
+    def count_out(self, event):
+        """Count an event leaving a link."""
+        self.events_out += 1
+        if isinstance(event, LinkClockRequest):
+            self.clock_requests += 1
+        elif isinstance(event, LinkException):
+            self.exceptions += 1
+        else:
+            self.bytes_out += _data_length(event)
+
+    @property
+    def receive_queue_depth(self):
+        """Return the total number of received events waiting for the layers above."""
+        return sum(getattr(link, 'receive_queue_depth', 0) for link in self.links)
+
+    @property
+    def send_queue_depth(self):
+        """Return the total number of events waiting to be sent by the layers below."""
+        return sum(getattr(link, 'send_queue_depth', 0) for link in self.links)
+
+    @property
+    def stats(self):
+        """Return the totals of the flattened stats dicts of the links."""
+        totals = collections.OrderedDict()
+        for link in self.links:
+            for (name, value) in _flatten_stats(getattr(link, 'stats', {})):
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def to_dict(self):
+        """Return the counters, queue depths, and stats as a dict."""
+        metrics = {counter: getattr(self, counter) for counter in self.COUNTERS}
+        metrics['receive_queue_depth'] = self.receive_queue_depth
+        metrics['send_queue_depth'] = self.send_queue_depth
+        metrics['stats'] = dict(self.stats)
+        return metrics
+
+
+class MetricsRegistry(object):
+    """Registry of LinkMetrics by pipeline name and link name.
+
+    Links are instrumented by wrapping their entry points (to_receive and send)
+    and their exit points (after_receive, after_send, directly_receive, and
+    directly_to_send) on the link instance. Instrument a pipeline's links after
+    the pipeline is made, so that the handlers patched in by its pipes are
+    wrapped rather than replacing the wrappers; see phylline.util.instrumentation
+    for how these wrappers compose with those of other instruments.
+    """
+
+    def __init__(self, prefix='phylline'):
+        """Initialize members."""
+        self.prefix = prefix
+        self.metrics = collections.OrderedDict()
+        self.pipes = collections.OrderedDict()
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+
+    def reset(self):
+        """Zero all counters."""
+        for link_metrics in self.metrics.values():
+            link_metrics.reset()
+
+    def get(self, pipeline_name, link_name):
+        """Return the LinkMetrics for a pipeline name and link name, making it if needed."""
+        key = (pipeline_name, link_name)
+        if key not in self.metrics:
+            self.metrics[key] = LinkMetrics()
+        return self.metrics[key]
+
+    # Instrumentation
+
+    def instrument(self, link, pipeline_name='', link_name=None):
+        """Count the events entering and leaving a link, and return its LinkMetrics.
+
+        link_name defaults to the link's name, or else its class name. Links
+        without some of the entry and exit points, such as StreamLinks, are only
+        counted at the ones they have.
+        """
+        link_metrics = self.get(pipeline_name, get_link_name(link, link_name))
+        link_metrics.links.append(link)
+        count_in = (lambda method: _counted_call(method, link_metrics.count_in))
+        count_out = (lambda method: _counted_call(method, link_metrics.count_out))
+        yield_out = (lambda method: _counted_yield(method, link_metrics.count_out))
+        wrap_methods(link, {
+            'to_receive': count_in, 'send': count_in,
+            'directly_receive': count_out, 'directly_to_send': count_out,
+            'after_receive': yield_out, 'after_send': yield_out
+        })
+        return link_metrics
+
+    def instrument_pipeline(self, pipeline):
+        """Instrument every layer of a pipeline, and collect the stats of its pipes."""
+        pipeline_name = pipeline.name if pipeline.name is not None else ''
+        for layer in pipeline.layers:
+            self.instrument(layer, pipeline_name)
+        self.pipes[pipeline_name] = self.pipes.get(pipeline_name, []) + list(pipeline.pipes)
+
+    # Rendering
+
+    def _pipe_stats(self, pipes):
+        for (index, pipe) in enumerate(pipes):
+            for (name, value) in _flatten_stats(getattr(pipe, 'stats', {})):
+                yield (index, name, value)
+            if hasattr(pipe, 'receive_buffered'):
+                yield (index, 'receive_buffered', pipe.receive_buffered)
+
+    def to_dict(self):
+        """Return the metrics as a dict of pipeline names to dicts of link names."""
+        metrics = {}
+        for ((pipeline_name, link_name), link_metrics) in self.metrics.items():
+            metrics.setdefault(pipeline_name, {})[link_name] = link_metrics.to_dict()
+        return metrics
+
+    def to_prometheus(self):
+        """Return the metrics as Prometheus exposition text."""
+        samples = collections.OrderedDict()  # (name, type, help) -> [(labels, value)]
+
+        def add(name, metric_type, help, labels, value):
+            key = ('{}_{}'.format(self.prefix, name), metric_type, help)
+            samples.setdefault(key, []).append((labels, value))
+
+        for ((pipeline_name, link_name), link_metrics) in self.metrics.items():
+            labels = (('pipeline', pipeline_name), ('link', link_name))
+            for counter in LinkMetrics.COUNTERS:
+                add(
+                    'link_{}_total'.format(counter), 'counter', PROMETHEUS_HELP[counter],
+                    labels, getattr(link_metrics, counter)
+                )
+            for depth in ('receive_queue_depth', 'send_queue_depth'):
+                add(
+                    'link_{}'.format(depth), 'gauge', PROMETHEUS_HELP[depth],
+                    labels, getattr(link_metrics, depth)
+                )
+            for (name, value) in link_metrics.stats.items():
+                add(
+                    'link_stat', 'gauge', 'Entries of the stats dict of the link.',
+                    labels + (('stat', name),), value
+                )
+        for (pipeline_name, pipes) in self.pipes.items():
+            for (index, name, value) in self._pipe_stats(pipes):
+                add(
+                    'pipe_stat', 'gauge', 'Entries of the stats dict of the pipe.',
+                    (('pipeline', pipeline_name), ('pipe', index), ('stat', name)), value
+                )
+
+        lines = []
+        for ((name, metric_type, help), values) in samples.items():
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} {}'.format(name, metric_type))
+            for (labels, value) in values:
+                lines.append('{}{{{}}} {}'.format(name, ','.join(
+                    '{}="{}"'.format(label, _escape_label(label_value))
+                    for (label, label_value) in labels
+                ), value))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Write the metrics as Prometheus exposition text to a file.
+
+        The file is replaced atomically, so that a reader never sees a partial file.
+        """
+        temp_path = '{}.tmp'.format(path)
+        with open(temp_path, 'w') as file:
+            file.write(self.to_prometheus())
+        os.replace(temp_path, path)
+
+    def snapshot(self):
+        """Render the metrics as Prometheus exposition text for serve_prometheus.
+
+        Call this from the thread running the instrumented pipelines, e.g. once per
+        clock update; the rendered text is also returned.
+        """
+        text = self.to_prometheus()
+        with self._snapshot_lock:
+            self._snapshot = text
+        return text
+
+    def serve_prometheus(self, host='127.0.0.1', port=9464):
+        """Serve the last metrics snapshot as Prometheus exposition text.
+
+        A snapshot is taken when serving starts, and requests are then answered from
+        background threads with the text of the most recent call to snapshot, so
+        that the counters are never read while the pipelines' thread updates them.
+        Returns the HTTP server, whose server_address gives the bound address
+        (e.g. if port is 0); call its shutdown and server_close methods to stop
+        serving.
+        """
+        registry = self
+        self.snapshot()
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                with registry._snapshot_lock:
+                    body = registry._snapshot.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = _ThreadingHTTPServer((host, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def _counted_call(method, count):
+    def counted(event):
+        count(event)
+        return method(event)
+    return counted
+
+
+def _counted_yield(method, count):
+    def counted(event):
+        count(event)
+        yield from method(event)
+    return counted
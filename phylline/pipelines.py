@@ -2,10 +2,13 @@
 
 # Builtins
 
+import collections
+
 # Packages
 
+from phylline.links.clocked import LinkClockRequest
 from phylline.links.links import GenericLinkAbove, GenericLinkBelow
-from phylline.pipes import AutomaticPipe, ManualPipe
+from phylline.pipes import AutomaticPipe, ManualPipe, Pipe, clock_update_due, reset_links
 from phylline.processors import proceed, wait
 from phylline.util.interfaces import SetterProperty
 from phylline.util.iterables import remove_none
@@ -55,6 +58,41 @@ class Pipeline(GenericLinkBelow, GenericLinkAbove):
         else:
             return '[{}]'.format(layers)
 
+    # Reuse
+
+    def reset(self):
+        """Return the pipeline and all its layers to their initial state.
+
+        Each layer is reset once, even though it is shared by two pipes, and the
+        pipes keep any handlers they patched onto the links.
+        """
+        reset_links(self.layers)
+        for pipe in self.pipes:
+            pipe.reset_pipe()
+        self.last_clock_update = None
+
+    # Latency
+
+    def record_latency(self, clock=None):
+        """Start recording event latencies in every layer which supports it."""
+        for layer in self.layers:
+            if hasattr(layer, 'record_latency'):
+                layer.record_latency(clock=clock)
+
+    def latency_report(self, percentiles=(50, 99, 99.9)):
+        """Return the latency reports of the layers which record latencies.
+
+        Reports are in order from bottom to top, and each is a dict with the layer's
+        string representation under 'layer' and the report of each of the layer's
+        latency histograms (see LogHistogram.report) under the histogram's name.
+        """
+        reports = []
+        for layer in self.layers:
+            report = getattr(layer, 'latency_report', lambda percentiles: None)(percentiles)
+            if report is not None:
+                reports.append({'layer': str(layer), **report})
+        return reports
+
     # Clocks
 
     @property
@@ -74,6 +112,13 @@ class Pipeline(GenericLinkBelow, GenericLinkAbove):
         for pipe in self.pipes:
             pipe.update_clock(time)
 
+    def advance_clock(self, time):
+        """Advance the clocks of all clocked links once each, without any processing."""
+        for layer in self.layers:
+            advance_clock = getattr(layer, 'advance_clock', None)
+            if advance_clock is not None:
+                advance_clock(time)
+
     def clock_update_requested(self, time):
         """Return whether a clock request has been requested by the given time."""
         return (
@@ -130,9 +175,9 @@ class Pipeline(GenericLinkBelow, GenericLinkAbove):
         """Implement StreamLinkBelow.to_read."""
         return self.pipes[0].to_read(event)
 
-    def to_write(self):
+    def to_write(self, max_bytes=None):
         """Implement StreamLinkBelow.to_write."""
-        return self.pipes[0].to_write()
+        return self.pipes[0].to_write(max_bytes)
 
     # Implement GenericLinkAbove
 
@@ -148,9 +193,9 @@ class Pipeline(GenericLinkBelow, GenericLinkAbove):
         """Implement EventLinkAbove.send."""
         return self.pipes[-1].send(event)
 
-    def read(self):
+    def read(self, max_bytes=None):
         """Implement StreamLinkAbove.read."""
-        return self.pipes[-1].read()
+        return self.pipes[-1].read(max_bytes)
 
     def write(self, event):
         """Implement StreamLinkAbove.write."""
@@ -201,31 +246,274 @@ class ManualPipeline(Pipeline):
 
     def update_clock_request(self, event):
         """Update the next clock request based on the event."""
-        for pipe in self.clocked_pipes:
+        for pipe in self.pipes_clocked:
             pipe.update_clock_request(event)
 
 
 class AutomaticPipeline(Pipeline):
-    """A automatically synchronized pipeline."""
-
-    def __init__(self, *layers, pipe_factory=AutomaticPipe, **kwargs):
+    """A automatically synchronized pipeline.
+
+    If receive_credits is not None, the highest pipe which passes events up uses
+    credit-based flow control for received events (see AutomaticPipe), and the
+    consumer of the pipeline grants credits with grant as it consumes events;
+    pipes which only pass stream buffers up, such as the pipe above a stream
+    socket, can't hold events for credits. While any pipe is paused, the pipeline
+    is paused, so the transport at the bottom should stop reading.
+    """
+
+    def __init__(
+        self, *layers, pipe_factory=AutomaticPipe, receive_credits=None,
+        receive_buffer_limit=1024, **kwargs
+    ):
         """Initialize the pipeline."""
         super().__init__(pipe_factory, *layers, **kwargs)
         self.clocked = len(self.pipes_clocked) > 0
+        self.credit_pipe = None
+        if receive_credits is not None:
+            event_pipes = [
+                pipe for pipe in self.pipes if getattr(pipe, 'receives_events', False)
+            ]
+            if not event_pipes:
+                raise ValueError('Receive credits need a pipe which passes events up!')
+            self.credit_pipe = event_pipes[-1]
+            self.credit_pipe.initial_receive_credits = receive_credits
+            self.credit_pipe.receive_credits = receive_credits
+            self.credit_pipe.receive_buffer_limit = receive_buffer_limit
+
+    # Flow control
+
+    @property
+    def paused(self):
+        """Return whether any pipe is paused, so that the bottom should stop reading."""
+        return any(getattr(pipe, 'paused', False) for pipe in self.pipes)
+
+    def grant(self, credits):
+        """Grant credits to the credit-gated pipe for passing received events up."""
+        if self.credit_pipe is not None:
+            self.credit_pipe.grant(credits)
 
     def update_clock(self, time):
-        """Update the clock of any ClockedLink and do any necessary processing."""
+        """Update the clock of any ClockedLink and do any necessary processing.
+
+        The clocks of all links are advanced once first, and then only the links
+        which are due for the clock update (see clock_update_due), checked as each
+        link is visited, do any processing, in the same order as if every link
+        were updated.
+        """
         self.last_clock_update = time
         if not self.clocked:
             return
+        self.advance_clock(time)
         for pipe in self.pipes_clocked:
-            pipe.update_clock_send(time)
+            pipe.update_clock_send(time, advance=False)
         for pipe in reversed(self.pipes_clocked):
-            pipe.update_clock_receive(time)
+            pipe.update_clock_receive(time, advance=False)
         # print('Updated pipeline clock to {}!'.format(time))
         return self.next_clock_request
 
 
+class PipelineGraph(object):
+    """A manually synchronized pipeline whose links form a directed acyclic graph.
+
+    The graph is given as (below, above) pairs of links, where each link may also
+    be a pipe or pipeline. A link with several links above it passes everything
+    it receives up to all of them, and a link with several links below it passes
+    everything it sends down to all of them, so one transport can carry several
+    logical channels, or one channel can be carried over several transports.
+
+    The sync and clock update orders are computed once, by topologically sorting
+    the graph. sync_up visits each link once, from the bottom of the graph to the
+    top, and sync_down visits each link once, from the top to the bottom. Links
+    at the bottom of the graph are in bottoms, and links at the top are in tops;
+    data enters and leaves the graph through them.
+    """
+
+    def __init__(self, *edges, name=None):
+        """Initialize the graph.
+
+        Raises ValueError if the graph has a cycle.
+        """
+        if not edges:
+            raise NotImplementedError('Empty pipeline graph is not supported!')
+        self.name = name
+        nodes = []
+        indices = {}
+        aboves = collections.defaultdict(list)
+        belows = collections.defaultdict(list)
+        for (below, above) in edges:
+            for node in (below, above):
+                if id(node) not in indices:
+                    indices[id(node)] = len(nodes)
+                    nodes.append(node)
+            aboves[indices[id(below)]].append(above)
+            belows[indices[id(above)]].append(below)
+
+        # Kahn's algorithm
+        in_degrees = [len(belows[index]) for index in range(len(nodes))]
+        ready = collections.deque(
+            index for (index, in_degree) in enumerate(in_degrees) if in_degree == 0
+        )
+        order = []
+        while ready:
+            index = ready.popleft()
+            order.append(index)
+            for above in aboves[index]:
+                above_index = indices[id(above)]
+                in_degrees[above_index] -= 1
+                if in_degrees[above_index] == 0:
+                    ready.append(above_index)
+        if len(order) < len(nodes):
+            raise ValueError('Pipeline graph has a cycle!')
+
+        self.nodes = [nodes[index] for index in order]
+        self.bottoms = [nodes[index] for index in order if not belows[index]]
+        self.tops = [nodes[index] for index in order if not aboves[index]]
+        # Each pipe is only used in one direction, to broadcast from one link
+        self._up_pipes = [
+            Pipe(nodes[index], aboves[index]) for index in order if aboves[index]
+        ]
+        self._down_pipes = [
+            Pipe(belows[index], nodes[index]) for index in reversed(order) if belows[index]
+        ]
+        self._pipes = self._up_pipes + self._down_pipes
+        self.nodes_clocked = [
+            node for node in self.nodes
+            if any(node in pipe.bottom_clocked or node in pipe.top_clocked for pipe in self._pipes)
+        ]
+        self.clocked = len(self.nodes_clocked) > 0
+        self.last_clock_update = None
+
+    def __repr__(self):
+        """Return a string representation of the graph.
+
+        Left-to-right order is a topological order from bottom to top.
+        """
+        nodes = '|'.join('{}'.format(node) for node in self.nodes)
+        if self.name is not None:
+            return '[{}: {}]'.format(self.name, nodes)
+        else:
+            return '[{}]'.format(nodes)
+
+    # Reuse
+
+    def reset(self):
+        """Return the graph and all its links to their initial state."""
+        reset_links(self.nodes)
+        for pipe in self._pipes:
+            pipe.reset_pipe()
+        self.last_clock_update = None
+
+    # Synchronization
+
+    def sync(self):
+        """Sync data from the bottom of the graph to the top, then backwards.
+
+        Returns the earliest clock update requested by any link in the graph.
+        """
+        self.sync_up()
+        self.sync_down()
+        return self.next_clock_request
+
+    def sync_up(self):
+        """Sync data from the bottom of the graph to the top.
+
+        Pipes and pipelines at the top of the graph are synced up last, so that
+        data passed up to them reaches their own tops.
+        """
+        for pipe in self._up_pipes:
+            node = pipe.bottom[0]
+            try:
+                node.sync_up()
+            except AttributeError:  # node is not a pipe or pipeline
+                pass
+            try:
+                for event in node.receive_all():
+                    if isinstance(event, LinkClockRequest):
+                        pipe.update_clock_request(event)
+                    else:
+                        pipe.receive_up(event)
+            except AttributeError:
+                pass
+            try:
+                buffer = node.read()
+                if buffer:
+                    pipe.read_up(buffer)
+            except AttributeError:
+                pass
+        for node in self.tops:
+            node_sync_up = getattr(node, 'sync_up', None)
+            if node_sync_up is not None:
+                node_sync_up()
+
+    def sync_down(self):
+        """Sync data from the top of the graph to the bottom.
+
+        Pipes and pipelines at the bottom of the graph are synced down last, so
+        that data passed down to them reaches their own bottoms.
+        """
+        for pipe in self._down_pipes:
+            node = pipe.top[0]
+            try:
+                node.sync_down()
+            except AttributeError:  # node is not a pipe or pipeline
+                pass
+            try:
+                for event in node.to_send_all():
+                    if isinstance(event, LinkClockRequest):
+                        pipe.update_clock_request(event)
+                    else:
+                        pipe.send_down(event)
+            except AttributeError:
+                pass
+            try:
+                buffer = node.to_write()
+                if buffer:
+                    pipe.write_down(buffer)
+            except AttributeError:
+                pass
+        for node in self.bottoms:
+            node_sync_down = getattr(node, 'sync_down', None)
+            if node_sync_down is not None:
+                node_sync_down()
+
+    # Clocks
+
+    @property
+    def next_clock_request(self):
+        """Return the next clock update requested by the graph."""
+        clock_requests = list(remove_none(pipe.next_clock_request for pipe in self._pipes))
+        if not clock_requests:
+            return None
+        return min(clock_requests)
+
+    def advance_clock(self, time):
+        """Advance the clocks of all clocked links, without any processing."""
+        for node in self.nodes_clocked:
+            try:
+                node.advance_clock(time)
+            except AttributeError:
+                pass
+
+    def update_clock(self, time):
+        """Update the clock of any ClockedLink and do any necessary processing.
+
+        The clocks of all links are advanced first, and then only the links which
+        are due for the clock update (see clock_update_due), checked as each link
+        is visited, do any processing, in order from the bottom of the graph to
+        the top. Then the graph is synced.
+
+        Returns the earliest clock update requested by any link in the graph.
+        """
+        self.last_clock_update = time
+        self.advance_clock(time)
+        for pipe in self._pipes:
+            pipe.expire_clock_request(time)
+        for node in self.nodes_clocked:
+            if clock_update_due(node, time):
+                node.update_clock(time)
+        return self.sync()
+
+
 class PipelineBottomCoupler(object):
     """A pipeline-to-pipeline coupler which connects two pipelines by their bottoms."""
 
@@ -239,28 +527,33 @@ class PipelineBottomCoupler(object):
             self.pipeline_one.after_write = self._write_one
         if hasattr(self.pipeline_one, 'after_send'):
             self.pipeline_one.after_send = self._send_one
+        if hasattr(self.pipeline_one, 'directly_to_send'):
+            self.pipeline_one.directly_to_send = self._directly_send_one
         if hasattr(self.pipeline_two, 'after_write'):
             self.pipeline_two.after_write = self._write_two
         if hasattr(self.pipeline_two, 'after_send'):
             self.pipeline_two.after_send = self._send_two
+        if hasattr(self.pipeline_two, 'directly_to_send'):
+            self.pipeline_two.directly_to_send = self._directly_send_two
 
     def __repr__(self):
         """Represent the coupler as a string."""
         return '╔{}\n╚{}'.format(self.pipeline_one, self.pipeline_two)
 
-    def update_clock(self, clock_time):
+    def update_clock(self, clock_time, max_bytes=None):
         """Update the pipeline's clock.
 
         If the pipeline is a manual pipeline, it will also sync the pipeline and write
-        any data at the bottom to the connection.
+        any data at the bottom to the connection, up to max_bytes bytes per pipeline
+        if max_bytes is not None.
         """
         self.pipeline_one.update_clock(clock_time)
         self.pipeline_two.update_clock(clock_time)
         if self.is_manual_one:
-            self.write_one()
+            self.write_one(max_bytes)
             self.send_one()
         if self.is_manual_two:
-            self.write_two()
+            self.write_two(max_bytes)
             self.send_two()
 
     def _write_one(self, buffer):
@@ -283,36 +576,61 @@ class PipelineBottomCoupler(object):
         self.pipeline_one.to_read(buffer)
         yield from wait()
 
-    def write_one(self):
+    def write_one(self, max_bytes=None):
         """Update the write side of the coupler.
 
         This is used for manual writing from the bottom of the pipeline if it's not
-        an automatic pipeline.
+        an automatic pipeline. If max_bytes is not None, at most max_bytes bytes
+        are passed across and the rest stay buffered for the next call.
         """
-        data = self.pipeline_one.to_write()
+        data = self.pipeline_one.to_write(max_bytes)
         if data:
             self.pipeline_two.to_read(data)
         return data
 
-    def write_two(self):
+    def write_two(self, max_bytes=None):
         """Update the write side of the coupler.
 
         This is used for manual writing from the bottom of the pipeline if it's not
-        an automatic pipeline.
+        an automatic pipeline. If max_bytes is not None, at most max_bytes bytes
+        are passed across and the rest stay buffered for the next call.
         """
-        data = self.pipeline_two.to_write()
+        data = self.pipeline_two.to_write(max_bytes)
         if data:
             self.pipeline_one.to_read(data)
         return data
 
+    def _directly_send_one(self, event):
+        """Send the event to the connection.
+
+        This is used to overwrite the directly_to_send of the bottom of the pipeline,
+        for events which the bottom emits out-of-band, e.g. on clock updates. Clock
+        requests from the bottom of the pipeline are not passed to the connection.
+        """
+        if isinstance(event, LinkClockRequest):
+            return
+        # print('Sending to pipeline two: {}'.format(event))
+        self.pipeline_two.to_receive(event)
+
+    def _directly_send_two(self, event):
+        """Send the event to the connection.
+
+        This is used to overwrite the directly_to_send of the bottom of the pipeline,
+        for events which the bottom emits out-of-band, e.g. on clock updates. Clock
+        requests from the bottom of the pipeline are not passed to the connection.
+        """
+        if isinstance(event, LinkClockRequest):
+            return
+        # print('Sending to pipeline one: {}'.format(event))
+        self.pipeline_one.to_receive(event)
+
     def _send_one(self, event):
         """Send the event to the connection.
 
         This is used to overwrite the after_send of the bottom of the pipeline
         if it's an automatic pipeline.
         """
-        # print('Sending to pipeline two: {}'.format(event))
-        self.pipeline_two.to_receive(event)
+        self._directly_send_one(event)
         yield from proceed()
 
     def _send_two(self, event):
@@ -321,8 +639,7 @@ class PipelineBottomCoupler(object):
         This is used to overwrite the after_send of the bottom of the pipeline
         if it's an automatic pipeline.
         """
-        # print('Sending to pipeline one: {}'.format(event))
-        self.pipeline_one.to_receive(event)
+        self._directly_send_two(event)
         yield from proceed()
 
     def send_one(self):
@@ -346,3 +663,48 @@ class PipelineBottomCoupler(object):
         if data:
             self.pipeline_one.to_receive(data)
         return data
+
+
+# Pools
+
+
+class PipelinePool(object):
+    """A pool of warm pipelines which are reset and reused instead of rebuilt.
+
+    Building a pipeline instantiates every link, starts every processor, and makes
+    every pipe. acquire hands out a pipeline from the pool, only calling factory to
+    build a new one when the pool is empty, and release resets a pipeline and
+    returns it to the pool, so that connection setup only costs a reset. Pipelines
+    whose links can't be fully reset (e.g. socket links) shouldn't be pooled.
+    """
+
+    def __init__(self, factory, size):
+        """Initialize the pool with size pipelines from factory.
+
+        factory should take no arguments and return a new pipeline, or anything
+        else with a reset method. At most size released pipelines are kept.
+        """
+        self.factory = factory
+        self.size = size
+        self._idle = collections.deque(factory() for _ in range(size))
+
+    def __len__(self):
+        """Return the number of idle pipelines in the pool."""
+        return len(self._idle)
+
+    def __repr__(self):
+        """Return a string representation of the pool."""
+        return '{}({} idle of {})'.format(self.__class__.__qualname__, len(self), self.size)
+
+    def acquire(self):
+        """Return an idle pipeline, or a new one if the pool is empty."""
+        if self._idle:
+            return self._idle.pop()
+        return self.factory()
+
+    def release(self, pipeline):
+        """Reset the pipeline and return it to the pool, unless the pool is full."""
+        if len(self._idle) >= self.size:
+            return
+        pipeline.reset()
+        self._idle.append(pipeline)
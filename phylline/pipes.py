@@ -1,13 +1,15 @@
 """Classes for building pipelines of layered links."""
 
 # Builtins
+import collections
 import itertools
 
 # Packages
 
 from phylline.links.clocked import ClockedLink, LinkClockRequest  # , LinkClockTime
+from phylline.links.events import LinkException
 from phylline.links.links import GenericLinkAbove, GenericLinkBelow
-from phylline.processors import proceed, wait
+from phylline.processors import PriorityLanes, proceed, wait
 from phylline.util.interfaces import SetterProperty
 from phylline.util.iterables import make_collection, remove_none
 
@@ -15,6 +17,44 @@ from phylline.util.iterables import make_collection, remove_none
 # Pipes
 
 
+def reset_links(links):
+    """Reset each distinct link which has a reset method, once."""
+    already_reset = set()
+    for link in links:
+        if id(link) in already_reset:
+            continue
+        already_reset.add(id(link))
+        reset = getattr(link, 'reset', None)
+        if reset is not None:
+            reset()
+
+
+def clock_update_due(link, time):
+    """Return whether updating the clock of a clocked link to the given time needs processing.
+
+    Clocked links without a clock_update_due method, such as nested pipelines,
+    are always due.
+    """
+    link_clock_update_due = getattr(link, 'clock_update_due', None)
+    if link_clock_update_due is None:
+        return True
+    return link_clock_update_due(time)
+
+
+def _has_to_send(link):
+    try:
+        return link.has_to_send()
+    except AttributeError:
+        return False
+
+
+def _has_receive(link):
+    try:
+        return link.has_receive()
+    except AttributeError:
+        return False
+
+
 class Pipe(GenericLinkBelow, GenericLinkAbove):
     """Link to join two layers of links together in a pipeline.
 
@@ -28,7 +68,7 @@ class Pipe(GenericLinkBelow, GenericLinkAbove):
     and arbitrary events!
     """
 
-    def __init__(self, bottom, top):
+    def __init__(self, bottom, top, scheduler_factory=None):
         """Initialize members.
 
         Instantiate the pipe before passing any data to bottom or top, or else
@@ -38,11 +78,27 @@ class Pipe(GenericLinkBelow, GenericLinkAbove):
         anything from receive() of any bottom link will be passed to to_read of
         every link in top, and anything from to_send of any top link will
         be passed to send of every link in bottom.
+
+        By default, to_send() and receive() return the next event from the first
+        link in bottom or top with an event available, so a busy first link can
+        starve the others. If scheduler_factory is not None, it is called with
+        the bottom links and with the top links, for each layer with multiple
+        links, to make the schedulers which choose the link to return the next
+        event from instead, such as a RoundRobinScheduler or a
+        WeightedFairScheduler from util.scheduling.
         """
         self.bottom = make_collection(bottom)
         self.top = make_collection(top)
         self.name = None
 
+        self.scheduler_factory = scheduler_factory
+        self._bottom_scheduler = None
+        self._top_scheduler = None
+        if scheduler_factory is not None and len(self.bottom) > 1:
+            self._bottom_scheduler = scheduler_factory(self.bottom)
+        if scheduler_factory is not None and len(self.top) > 1:
+            self._top_scheduler = scheduler_factory(self.top)
+
         self._next_clock_request = None
         self.last_clock_update = None
 
@@ -77,6 +133,24 @@ class Pipe(GenericLinkBelow, GenericLinkAbove):
             top = repr(self.top)
         return '[{} | {}]'.format(bottom, top)
 
+    # Reuse
+
+    def reset(self):
+        """Return the pipe and all its links to their initial state.
+
+        Links without a reset method are left as they are.
+        """
+        reset_links(itertools.chain(self.bottom, self.top))
+        self.reset_pipe()
+
+    def reset_pipe(self):
+        """Return the pipe itself to its initial state, without resetting its links."""
+        self._next_clock_request = None
+        self.last_clock_update = None
+        for scheduler in (self._bottom_scheduler, self._top_scheduler):
+            if scheduler is not None:
+                scheduler.reset()
+
     # Utilities for implementing Pipes
 
     def receive_up(self, event):
@@ -171,6 +245,12 @@ class Pipe(GenericLinkBelow, GenericLinkAbove):
 
     def to_send(self):
         """Implement EventLinkBelow.to_send."""
+        if self._bottom_scheduler is not None:
+            bottom = self._bottom_scheduler.select(_has_to_send)
+            if bottom is not None:
+                return bottom.to_send()
+            return None
+
         for bottom in self.bottom:
             try:
                 if bottom.has_to_send():
@@ -180,6 +260,9 @@ class Pipe(GenericLinkBelow, GenericLinkAbove):
 
     def has_to_send(self):
         """Implement EventLinkBelow.has_to_send."""
+        if self._bottom_scheduler is not None:
+            return self._bottom_scheduler.next_ready(_has_to_send) is not None
+
         for bottom in self.bottom:
             try:
                 if bottom.has_to_send():
@@ -196,15 +279,29 @@ class Pipe(GenericLinkBelow, GenericLinkAbove):
             except AttributeError:
                 pass
 
-    def to_write(self):
-        """Implement StreamLinkBelow.to_write."""
+    def to_write(self, max_bytes=None):
+        """Implement StreamLinkBelow.to_write.
+
+        If max_bytes is not None, bottom links are drained in order until
+        max_bytes bytes have been collected, and the rest stay buffered.
+        """
         all_to_write = b''
         for bottom in self.bottom:
+            if max_bytes is None:
+                remaining = None
+            else:
+                remaining = max_bytes - len(all_to_write)
+                if remaining <= 0:
+                    break
             try:
+                if remaining is None:
+                    to_write = bottom.to_write()
+                else:
+                    to_write = bottom.to_write(remaining)
                 if all_to_write == b'':
-                    all_to_write = bottom.to_write()
+                    all_to_write = to_write
                 else:
-                    all_to_write += bottom.to_write()
+                    all_to_write += to_write
             except AttributeError:
                 pass
         return all_to_write
@@ -213,6 +310,12 @@ class Pipe(GenericLinkBelow, GenericLinkAbove):
 
     def receive(self):
         """Implement EventLinkAbove.receive."""
+        if self._top_scheduler is not None:
+            top = self._top_scheduler.select(_has_receive)
+            if top is not None:
+                return top.receive()
+            return False
+
         for top in self.top:
             try:
                 if top.has_receive():
@@ -223,6 +326,9 @@ class Pipe(GenericLinkBelow, GenericLinkAbove):
 
     def has_receive(self):
         """Implement EventLinkAbove.has_receive."""
+        if self._top_scheduler is not None:
+            return self._top_scheduler.next_ready(_has_receive) is not None
+
         for top in self.top:
             try:
                 if top.has_receive():
@@ -239,15 +345,29 @@ class Pipe(GenericLinkBelow, GenericLinkAbove):
             except AttributeError:
                 pass
 
-    def read(self):
-        """Implement StreamLinkAbove.read."""
+    def read(self, max_bytes=None):
+        """Implement StreamLinkAbove.read.
+
+        If max_bytes is not None, top links are drained in order until max_bytes
+        bytes have been collected, and the rest stay buffered.
+        """
         all_read = None
         for top in self.top:
+            if max_bytes is None:
+                remaining = None
+            else:
+                remaining = max_bytes - (len(all_read) if all_read is not None else 0)
+                if remaining <= 0:
+                    break
             try:
+                if remaining is None:
+                    read = top.read()
+                else:
+                    read = top.read(remaining)
                 if all_read is None:
-                    all_read = top.read()
+                    all_read = read
                 else:
-                    all_read += top.read()
+                    all_read += read
             except AttributeError:
                 pass
         return all_read
@@ -275,14 +395,33 @@ class Pipe(GenericLinkBelow, GenericLinkAbove):
         # print('Next clock request for pipe {}: {}'.format(self, min(clock_requests)))
         return min(clock_requests)
 
-    def update_clock(self, time):
-        """Update the clock of any ClockedLink and do any necessary processing."""
-        for link in itertools.chain(self.bottom, self.top):
+    def advance_clock(self, time):
+        """Advance the clocks of all clocked links, without any processing."""
+        for link in itertools.chain(self.bottom_clocked, self.top_clocked):
             try:
-                link.update_clock(time)
+                link.advance_clock(time)
             except AttributeError:
                 pass
 
+    def update_clock(self, time, advance=True):
+        """Update the clock of any ClockedLink and do any necessary processing.
+
+        The clocks of all links are advanced first, unless advance is false
+        because the caller has already advanced them. Then only the links which
+        are due for the clock update (see clock_update_due), checked as each link
+        is visited, do any processing.
+        """
+        if advance:
+            self.advance_clock(time)
+        for link in itertools.chain(self.bottom_clocked, self.top_clocked):
+            if clock_update_due(link, time):
+                link.update_clock(time)
+
+    def expire_clock_request(self, time):
+        """Forget the recorded clock request if it has been reached by the given time."""
+        if self._next_clock_request is not None and time >= self._next_clock_request:
+            self._next_clock_request = None
+
     def update_clock_request(self, event):
         """Update the next clock request based on the event."""
         clock_requests = [self._next_clock_request, event]
@@ -302,8 +441,30 @@ class ManualPipe(Pipe):
 
     This one requires manual synchronization between the links, by calling the
     sync method.
+
+    By default, each sync passes on the events drained from each link in the
+    order in which they were drained. If priority_classifier is not None, the
+    events drained from each link are passed on in the order of PriorityLanes
+    with priority_lanes lanes and priority_weights weights instead, so that
+    urgent events are passed on before bulk data drained in the same sync.
     """
 
+    def __init__(
+        self, bottom, top, scheduler_factory=None, priority_classifier=None,
+        priority_lanes=2, priority_weights=None
+    ):
+        """Initialize members."""
+        super().__init__(bottom, top, scheduler_factory=scheduler_factory)
+        self._up_lanes = None
+        self._down_lanes = None
+        if priority_classifier is not None:
+            self._up_lanes = PriorityLanes(
+                priority_classifier, priority_lanes, priority_weights
+            )
+            self._down_lanes = PriorityLanes(
+                priority_classifier, priority_lanes, priority_weights
+            )
+
     # Synchronization
 
     def sync_bottom_links(self):
@@ -376,10 +537,14 @@ class ManualPipe(Pipe):
             for event in bottom.receive_all():
                 if isinstance(event, LinkClockRequest):
                     earliest_clock_request = min(earliest_clock_request, event)
+                elif self._up_lanes is not None:
+                    self._up_lanes.append(event)
                 else:
                     self.receive_up(event)
         except AttributeError:
             pass
+        while self._up_lanes:
+            self.receive_up(self._up_lanes.popleft())
         try:
             self.read_up(bottom.read())
         except AttributeError:
@@ -401,10 +566,14 @@ class ManualPipe(Pipe):
             for event in top.to_send_all():
                 if isinstance(event, LinkClockRequest):
                     earliest_clock_request = min(earliest_clock_request, event)
+                elif self._down_lanes is not None:
+                    self._down_lanes.append(event)
                 else:
                     self.send_down(event)
         except AttributeError:
             pass
+        while self._down_lanes:
+            self.send_down(self._down_lanes.popleft())
         try:
             self.write_down(top.to_write())
         except AttributeError:
@@ -414,12 +583,11 @@ class ManualPipe(Pipe):
 
     # Clocks
 
-    def update_clock(self, time):
+    def update_clock(self, time, advance=True):
         """Update the clock of any ClockedLink and do any necessary processing."""
-        if self.next_clock_request is not None and time >= self.next_clock_request:
-            self._next_clock_request = None
+        self.expire_clock_request(time)
         self.last_clock_update = time
-        super().update_clock(time)
+        super().update_clock(time, advance=advance)
         return self.sync()
 
 
@@ -434,17 +602,40 @@ class AutomaticPipe(Pipe):
     if you want to use this pipe, don't put any custom logic in there.
     Warning: after you make the pipe, you shouldn't modify the bottom or top
     members; instead, make a new pipe to add new connections.
+
+    By default, events are passed up as soon as they are received, without limit.
+    If receive_credits is not None, the pipe uses credit-based flow control for
+    received events instead: each event passed up costs one credit, and the layer
+    above grants more credits with grant as it consumes events. While the pipe has
+    no credits, received events are held in a buffer and the pipe is paused, so
+    that the transport at the bottom can stop reading until the layer above
+    catches up; events which were already on their way up when the pipe paused
+    are held too, without loss. Only once receive_buffer_limit events are held
+    are any further received events dropped, counted in the stats dict, and
+    replaced by a LinkException passed up. LinkException events and stream
+    buffers are always passed up immediately.
     """
 
-    def __init__(self, bottom, top):
+    def __init__(
+        self, bottom, top, scheduler_factory=None, receive_credits=None,
+        receive_buffer_limit=1024
+    ):
         """Initialize protocols.
 
         Instantiate this before sending any data to bottom or top, or else you will probably
         lose data!
         """
-        super().__init__(bottom, top)
+        super().__init__(bottom, top, scheduler_factory=scheduler_factory)
         self.connected_up = True
         self.connected_down = True
+        self.initial_receive_credits = receive_credits
+        self.receive_credits = receive_credits
+        self.receive_buffer_limit = receive_buffer_limit
+        self._receive_buffer = collections.deque()
+        self.stats = {'dropped': 0}
+        self.receives_events = self.bottom != self.top and any(
+            hasattr(bottom, 'after_receive') for bottom in self.bottom
+        ) and any(hasattr(top, 'to_receive') for top in self.top)
         if self.bottom != self.top:
             for bottom in self.bottom:
                 if hasattr(bottom, 'after_receive'):
@@ -461,6 +652,36 @@ class AutomaticPipe(Pipe):
                 if hasattr(top, 'directly_to_send'):
                     top.directly_to_send = self._directly_to_send
 
+    def reset_pipe(self):
+        """Return the pipe itself to its initial state, without resetting its links."""
+        super().reset_pipe()
+        self.connected_up = True
+        self.connected_down = True
+        self.receive_credits = self.initial_receive_credits
+        self._receive_buffer.clear()
+        self.stats['dropped'] = 0
+
+    # Flow control
+
+    @property
+    def paused(self):
+        """Return whether received events are held for credits, so reading should stop."""
+        return len(self._receive_buffer) > 0
+
+    @property
+    def receive_buffered(self):
+        """Return the number of received events waiting for credits."""
+        return len(self._receive_buffer)
+
+    def grant(self, credits):
+        """Grant credits for passing received events up, and pass up any buffered events."""
+        if self.receive_credits is None:
+            return
+        self.receive_credits += credits
+        while self._receive_buffer and self.receive_credits > 0:
+            self.receive_credits -= 1
+            self.receive_up(self._receive_buffer.popleft())
+
     def _directly_receive(self, event):
         """Pass the processed event up to the top layer."""
         if isinstance(event, LinkClockRequest):
@@ -468,8 +689,21 @@ class AutomaticPipe(Pipe):
             return
         if not self.connected_up:
             return
-        # print('AutomaticPipe passing event up: {}'.format(event))
-        self.receive_up(event)
+        if self.receive_credits is None or isinstance(event, LinkException):
+            # print('AutomaticPipe passing event up: {}'.format(event))
+            self.receive_up(event)
+            return
+        if self.receive_credits > 0 and not self._receive_buffer:
+            self.receive_credits -= 1
+            self.receive_up(event)
+        elif len(self._receive_buffer) < self.receive_buffer_limit:
+            self._receive_buffer.append(event)
+        else:
+            self.stats['dropped'] += 1
+            self.receive_up(LinkException(
+                BufferError('Receive buffer is full, so the event was dropped!'),
+                direction='up', instance=self, previous=event
+            ))
 
     def _after_receive(self, event):
         """Pass the processed event up to the top layer."""
@@ -511,47 +745,66 @@ class AutomaticPipe(Pipe):
 
     # Clocks
 
-    def update_clock(self, time):
-        """Update the clock of any ClockedLink and do any necessary processing."""
+    def update_clock(self, time, advance=True):
+        """Update the clock of any ClockedLink and do any necessary processing.
+
+        The clocks of all links are advanced once, unless advance is false because
+        the caller has already advanced them, before the send and receive updates.
+        """
         self.last_clock_update = time
         # print('Updating pipe clock to {}...'.format(time))
-        self.update_clock_send(time)
-        self.update_clock_receive(time)
+        if advance:
+            self.advance_clock(time)
+        self.update_clock_send(time, advance=False)
+        self.update_clock_receive(time, advance=False)
         # print('Updated pipe clock to {}!'.format(time))
         return self.next_clock_request
 
-    def update_clock_send(self, time):
+    def update_clock_send(self, time, advance=True):
         """Update the clocks of any ClockedLink and do any necessary processing, for send.
 
         Updates the bottom clocks first, because automatic piping needs the bottom
         send processor to have the updated time before it automatically gets
-        events from the top send processor.
+        events from the top send processor. The clocks of all links are advanced
+        before any processing, unless advance is false because the caller has
+        already advanced them. Only the links which are due for the clock update
+        (see clock_update_due), checked as each link is visited, do any processing.
         """
         if not self.clocked:
             return
-        if self.next_clock_request is not None and time >= self.next_clock_request:
-            self._next_clock_request = None
+        if advance:
+            self.advance_clock(time)
+        self.expire_clock_request(time)
         for link in itertools.chain(self.bottom_clocked, self.top_clocked):
+            if not clock_update_due(link, time):
+                continue
             try:
                 link.update_clock_send(time)
             except AttributeError:
                 link.update_clock(time)
         return self.next_clock_request
 
-    def update_clock_receive(self, time):
+    def update_clock_receive(self, time, advance=True):
         """Update the clocks of any ClockedLink and do any necessary processing, for receive.
 
         Updates the top clocks first, because automatic piping needs the top
         receive processor to have the updated time before it automatically gets
-        events from the bottom receive processor.
+        events from the bottom receive processor. The clocks of all links are
+        advanced before any processing, unless advance is false because the caller
+        has already advanced them. Only the links which are due for the clock
+        update (see clock_update_due), checked as each link is visited, do any
+        processing.
         """
         if not self.clocked:
             return
-        if self.next_clock_request is not None and time >= self.next_clock_request:
-            self._next_clock_request = None
+        if advance:
+            self.advance_clock(time)
+        self.expire_clock_request(time)
         for link in itertools.chain(self.top_clocked, self.bottom_clocked):
+            if not clock_update_due(link, time):
+                continue
             try:
-                link.update_clock_send(time)
+                link.update_clock_receive(time)
             except AttributeError:
                 link.update_clock(time)
         return self.next_clock_request
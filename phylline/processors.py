@@ -36,6 +36,139 @@ def proceed():
 
 # Event-based processors
 
+class PriorityLanes(object):
+    """A deque-like queue of events which is split into lanes by priority.
+
+    classifier is called with each appended event and returns the index of its
+    lane, from 0 (most urgent) to lanes - 1. Events within a lane stay in FIFO
+    order. If weights is None, popleft always takes from the most urgent
+    non-empty lane, so control events never wait behind bulk events. Otherwise,
+    weights gives the number of events each lane may take per turn in deficit
+    round-robin order, with fractional weights carried over, so that no lane can
+    be starved.
+
+    Supports the subset of the deque interface used by EventConsumer, so it can
+    be used as the input or output queue of an event processor.
+    """
+
+    def __init__(self, classifier, lanes=2, weights=None):
+        """Initialize members."""
+        if weights is not None and len(weights) != lanes:
+            raise ValueError('Expected {} weights but got {}!'.format(lanes, len(weights)))
+        if weights is not None and any(weight <= 0 for weight in weights):
+            raise ValueError('Weights must be positive: {}'.format(weights))
+        self.classifier = classifier
+        self.lanes = [deque() for _ in range(lanes)]
+        self.weights = weights
+        self._length = 0
+        self._start_turns()
+
+    def _start_turns(self):
+        self._lane = 0
+        self._deficits = [0] * len(self.lanes)
+        self._credit = self.weights[0] if self.weights is not None else 0
+
+    def __len__(self):
+        """Return the total number of events in all lanes."""
+        return self._length
+
+    def __iter__(self):
+        """Iterate over the events from the most urgent lane to the least urgent."""
+        for lane in self.lanes:
+            yield from lane
+
+    def __repr__(self):
+        """Return a string representation of the lanes."""
+        return '{}({})'.format(
+            self.__class__.__qualname__, [list(lane) for lane in self.lanes]
+        )
+
+    def append(self, event):
+        """Add an event to the end of its lane."""
+        self.lanes[self.classifier(event)].append(event)
+        self._length += 1
+
+    def popleft(self):
+        """Remove and return the next event to dequeue.
+
+        Raises IndexError if all lanes are empty.
+        """
+        if not self._length:
+            raise IndexError('pop from empty PriorityLanes')
+        self._length -= 1
+        if self.weights is None:
+            for lane in self.lanes:
+                if lane:
+                    return lane.popleft()
+        while True:
+            lane = self.lanes[self._lane]
+            if lane and self._credit >= 1:
+                self._credit -= 1
+                return lane.popleft()
+            # end of this lane's turn; an empty lane forfeits its carried-over weight
+            self._deficits[self._lane] = self._credit if lane else 0
+            self._lane = (self._lane + 1) % len(self.lanes)
+            self._credit = self._deficits[self._lane] + self.weights[self._lane]
+
+    def clear(self):
+        """Remove all events from all lanes."""
+        for lane in self.lanes:
+            lane.clear()
+        self._length = 0
+        self._start_turns()
+
+
+class LatencyQueue(object):
+    """A deque-like queue of events which records how long each event was queued.
+
+    Wraps another queue, such as a deque or PriorityLanes, and records the time
+    from when each event is appended until it is removed by popleft in the
+    histogram, timed by clock. Events which were already in the wrapped queue
+    are not recorded. Supports the subset of the deque interface used by
+    EventConsumer, so it can be used as the output queue of an event processor.
+    """
+
+    def __init__(self, histogram, clock, queue=None):
+        """Initialize members."""
+        self.histogram = histogram
+        self.clock = clock
+        self.queue = deque() if queue is None else queue
+        self._times = {}  # enqueue times by event id, so lanes may reorder events
+
+    def __len__(self):
+        """Return the number of queued events."""
+        return len(self.queue)
+
+    def __iter__(self):
+        """Iterate over the queued events in the order of the wrapped queue."""
+        return iter(self.queue)
+
+    def __repr__(self):
+        """Return a string representation of the queue."""
+        return '{}({!r})'.format(self.__class__.__qualname__, self.queue)
+
+    def append(self, event):
+        """Add an event to the end of the queue."""
+        self._times[id(event)] = self.clock.time
+        self.queue.append(event)
+
+    def popleft(self):
+        """Remove and return the next event to dequeue.
+
+        Raises IndexError if the queue is empty.
+        """
+        event = self.queue.popleft()
+        enqueue_time = self._times.pop(id(event), None)
+        if enqueue_time is not None:
+            self.histogram.record(self.clock.time - enqueue_time)
+        return event
+
+    def clear(self):
+        """Remove all events from the queue."""
+        self.queue.clear()
+        self._times.clear()
+
+
 class EventConsumer(ohneio.Consumer):
     """Generalized consumer which uses handles inputs and outputs on a deque.
 
@@ -47,11 +180,19 @@ class EventConsumer(ohneio.Consumer):
     Adapted from ohneio.
     """
 
-    def __init__(self, gen, input_factory=deque, output_factory=deque):
-        """Initialize members."""
-        self.gen = gen
+    def __init__(self, gen, input_factory=deque, output_factory=deque, restart=None):
+        """Initialize members.
+
+        restart should be a callable which returns a new generator equivalent to
+        gen in its initial state, if the processor is to support reset.
+        """
         self.input = input_factory()
         self.output = output_factory()
+        self.restart = restart
+        self._start(gen)
+
+    def _start(self, gen):
+        self.gen = gen
         self.state = next(gen)
         if not isinstance(self.state, ohneio._Action):
             raise RuntimeError(
@@ -60,6 +201,15 @@ class EventConsumer(ohneio.Consumer):
             )
         self.res = ohneio._no_result
 
+    def reset(self):
+        """Return the processor to its initial state, reusing its input and output queues."""
+        if self.restart is None:
+            raise NotImplementedError('This processor does not support reset!')
+        self.gen.close()
+        self.input.clear()
+        self.output.clear()
+        self._start(self.restart())
+
     def _process(self):
         if self.has_result:
             return
@@ -107,7 +257,10 @@ def event_processor(func, input=deque, output=deque):
 
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        return EventConsumer(func(*args, **kwargs), input_factory=input, output_factory=output)
+        return EventConsumer(
+            func(*args, **kwargs), input_factory=input, output_factory=output,
+            restart=functools.partial(func, *args, **kwargs)
+        )
 
     return wrapper
 
@@ -137,7 +290,92 @@ def send(event):
 
 # ohneio-style stream-based processors
 
-stream_processor = ohneio.protocol
+class StreamConsumer(ohneio.Consumer):
+    """ohneio consumer which can be reset to its initial state.
+
+    This never needs to be instantiated, since this is internally done by the
+    stream_processor decorator.
+    """
+
+    def __init__(self, gen, restart=None):
+        """Initialize members.
+
+        restart should be a callable which returns a new generator equivalent to
+        gen in its initial state, if the processor is to support reset.
+        """
+        super().__init__(gen)
+        self.restart = restart
+
+    def reset(self):
+        """Return the processor to its initial state, reusing its input and output buffers."""
+        if self.restart is None:
+            raise NotImplementedError('This processor does not support reset!')
+        self.gen.close()
+        for buffer in (self.input, self.output):
+            buffer.queue.clear()
+            buffer.position = 0
+        self.gen = self.restart()
+        self.state = next(self.gen)
+        self.res = ohneio._no_result
+
+
+class LatencyBuffer(ohneio.Buffer):
+    """An ohneio buffer which records how long each written chunk was buffered.
+
+    The time from when each chunk is written until its last byte is read is
+    recorded in the histogram, timed by clock. If buffer is not None, its
+    buffered bytes are taken over, without being recorded.
+    """
+
+    def __init__(self, histogram, clock, buffer=None):
+        """Initialize members."""
+        super().__init__()
+        self.histogram = histogram
+        self.clock = clock
+        if buffer is not None:
+            self.queue = buffer.queue
+            self.position = buffer.position
+        self._marks = deque()  # enqueue times and end offsets of written chunks
+        self._written = len(self)
+        self._read = 0
+
+    def write(self, chunk):
+        """Write a chunk to the end of the buffer."""
+        if not self.queue:  # all earlier chunks were read or discarded
+            self._marks.clear()
+            self._read = self._written
+        super().write(chunk)
+        self._written += len(chunk)
+        self._marks.append((self.clock.time, self._written))
+
+    def read(self, nbytes=0):
+        """Read and consume up to nbytes bytes, or all bytes if nbytes is 0."""
+        data = super().read(nbytes)
+        self._read += len(data)
+        if self._marks and self._marks[0][1] <= self._read:
+            now = self.clock.time
+            while self._marks and self._marks[0][1] <= self._read:
+                self.histogram.record(now - self._marks.popleft()[0])
+        return data
+
+
+def stream_processor(func):
+    """Wrap an ohneio protocol generator function as a decorator.
+
+    Under the hood this wraps the generator inside a StreamConsumer, like ohneio.protocol.
+    """
+    if not callable(func):
+        raise ValueError('A processor needs to be a callable')
+    if not inspect.isgeneratorfunction(func):
+        raise ValueError('A processor needs to be a generator function')
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return StreamConsumer(
+            func(*args, **kwargs), restart=functools.partial(func, *args, **kwargs)
+        )
+
+    return wrapper
 
 
 def can_read(num_bytes=1):
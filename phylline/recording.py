@@ -0,0 +1,133 @@
+"""Flight recording of the most recent events passing through a pipeline.
+
+A FlightRecorder keeps raw references to the last events which entered each
+instrumented layer, with a timestamp, the layer's name, and the direction, in a
+fixed-size ring of slots. Recording an event costs one slot write, and nothing is
+formatted until the recorder is dumped, either on demand or automatically when a
+LinkException passes through, so that recording barely changes the timing of the
+pipeline being debugged.
+"""
+
+# Builtins
+
+import time
+
+# Packages
+
+from phylline.links.events import LinkData, LinkEvent, LinkException
+from phylline.util.instrumentation import link_name, wrap_methods
+from phylline.util.logging import hex_bytes
+from phylline.util.timing import Clock
+
+
+def describe(data, truncate=10):
+    """Return a short string representation of an event or of data, without its causes."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return hex_bytes(bytes(data), truncate=truncate)
+    if isinstance(data, LinkData):
+        return '{}{}: {}'.format(
+            data.__class__.__qualname__,
+            ' with context({})'.format(data.context) if data.context else '',
+            describe(data.data, truncate=truncate)
+        )
+    if isinstance(data, LinkException):
+        return '{}: {!r}'.format(data.__class__.__qualname__, data.exception)
+    if isinstance(data, LinkEvent):
+        return '{}({})'.format(data.__class__.__qualname__, data.context)
+    return repr(data)
+
+
+class FlightRecorder(object):
+    """Ring buffer of the last size events which entered instrumented layers.
+
+    Events are timestamped by clock, which defaults to a real-time Clock on
+    time.perf_counter. If on_exception is not None, it is called with the dump of
+    the recorder when a LinkException first enters an instrumented layer, e.g. to
+    log the events which led up to the exception. The same exception passing up
+    through the other instrumented layers is not dumped again.
+
+    Only references to events are kept, so data which is modified after it was
+    recorded, such as a buffer returned to a BufferPool, is dumped as modified.
+    Events are recorded by wrappers of the layers' entry points, which compose
+    with other instruments' wrappers as described in phylline.util.instrumentation.
+    """
+
+    def __init__(self, size=1024, clock=None, on_exception=None, truncate=10):
+        """Initialize members."""
+        if size <= 0:
+            raise ValueError('Size must be positive: {}'.format(size))
+        self.size = size
+        if clock is None:
+            clock = Clock(source=time.perf_counter)
+        self.clock = clock
+        self.on_exception = on_exception
+        self.truncate = truncate
+        self._slots = [None] * size
+        self._recorded = 0
+        self._dumped_exception = None
+
+    def __len__(self):
+        """Return the number of events held by the recorder."""
+        return min(self._recorded, self.size)
+
+    def clear(self):
+        """Discard all recorded events."""
+        self._slots[:] = [None] * self.size
+        self._recorded = 0
+        self._dumped_exception = None
+
+    # Recording
+
+    def record(self, layer, direction, event):
+        """Record an event entering a layer in a direction."""
+        self._slots[self._recorded % self.size] = (self.clock.time, layer, direction, event)
+        self._recorded += 1
+
+    def _recorded_entry(self, entry, layer, direction):
+        def recorded_entry(event):
+            self.record(layer, direction, event)
+            if (
+                self.on_exception is not None and isinstance(event, LinkException)
+                and event.exception is not self._dumped_exception
+            ):
+                self._dumped_exception = event.exception
+                self.on_exception(self.dump())
+            return entry(event)
+        return recorded_entry
+
+    def instrument(self, link, name=None):
+        """Record the events and buffers entering a link from below and from above.
+
+        name defaults to the link's name, or else its class name.
+        """
+        name = link_name(link, name)
+        record_up = (lambda method: self._recorded_entry(method, name, 'up'))
+        record_down = (lambda method: self._recorded_entry(method, name, 'down'))
+        wrap_methods(link, {
+            'to_receive': record_up, 'to_read': record_up,
+            'send': record_down, 'write': record_down
+        })
+
+    def instrument_pipeline(self, pipeline):
+        """Record the events entering every layer of a pipeline."""
+        for layer in pipeline.layers:
+            self.instrument(layer)
+
+    # Dumping
+
+    def entries(self):
+        """Generate the recorded (time, layer, direction, event) tuples, oldest first."""
+        start = max(self._recorded - self.size, 0)
+        for i in range(start, self._recorded):
+            yield self._slots[i % self.size]
+
+    def render(self, entry):
+        """Return the string representation of a recorded entry."""
+        (timestamp, layer, direction, event) = entry
+        return '{} {} {}: {}'.format(
+            timestamp, layer, direction, describe(event, truncate=self.truncate)
+        )
+
+    def dump(self):
+        """Return the string representation of the recorded events, oldest first."""
+        return '\n'.join(self.render(entry) for entry in self.entries())
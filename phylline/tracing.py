@@ -0,0 +1,165 @@
+"""Sampled tracing of events as they pass through the layers of a pipeline.
+
+A Tracer decides at the ends of a pipeline whether each entering event is
+sampled, and stores a trace id in the context of each sampled event. Each
+instrumented link then records a span, with entry and exit timestamps, for every
+event entering it which carries a trace id or which was caused by an event
+carrying one; the trace id is copied into the event's context, so that it
+follows the event up or down the pipeline even though links make new events.
+Unsampled events are only checked for a trace id, and no link is slowed down at
+all unless it is instrumented. Spans can be exported as Chrome trace-event JSON,
+for viewing with chrome://tracing or Perfetto.
+"""
+
+# Builtins
+
+import collections
+import json
+import random
+import time
+
+# Packages
+
+from phylline.links.events import LinkData, LinkEvent
+from phylline.util.instrumentation import link_name, wrap_methods
+from phylline.util.timing import Clock
+
+
+TRACE_ID_KEY = 'trace_id'
+
+
+def get_trace_id(event):
+    """Return the trace id of the event or of the event which caused it, or None.
+
+    A trace id found on the previous event is also stored in the event's context.
+    """
+    if not isinstance(event, LinkEvent):
+        return None
+    trace_id = event.context.get(TRACE_ID_KEY)
+    if trace_id is None and isinstance(event.previous, LinkEvent):
+        trace_id = event.previous.context.get(TRACE_ID_KEY)
+        if trace_id is not None:
+            event.context[TRACE_ID_KEY] = trace_id
+    return trace_id
+
+
+class Tracer(object):
+    """Records spans for sampled events passing through instrumented links.
+
+    Each event entering a link at an end of the pipeline is sampled with
+    probability sample_rate, using a random number generator seeded by seed.
+    Spans are timestamped by clock, which defaults to a real-time Clock on
+    time.perf_counter, and the most recent max_spans spans are kept in spans as
+    (trace id, link name, direction, start time, end time) tuples.
+
+    A span lasts from when an event is passed to a link's to_receive or send
+    until that call returns, so it covers the link's processing of the event; in
+    an AutomaticPipeline, it also covers the processing by every layer the event
+    is passed on to, so spans of the same trace are nested. Time which an event
+    spends waiting in queues or in delays shows up as gaps between the spans of
+    its trace. Spans also cover any wrappers installed on a link before the
+    tracer's, per the composition order in phylline.util.instrumentation.
+    """
+
+    def __init__(self, sample_rate=1.0, max_spans=65536, clock=None, seed=None):
+        """Initialize members."""
+        if not 0 <= sample_rate <= 1:
+            raise ValueError('Sample rate must be between 0 and 1: {}'.format(sample_rate))
+        self.sample_rate = sample_rate
+        if clock is None:
+            clock = Clock(source=time.perf_counter)
+        self.clock = clock
+        self.seed = seed
+        self._random = random.Random(seed)
+        self.spans = collections.deque(maxlen=max_spans)
+        self._next_trace_id = 1
+
+    def reset(self):
+        """Discard all spans and restart trace ids and sampling."""
+        self.spans.clear()
+        self._next_trace_id = 1
+        self._random.seed(self.seed)
+
+    # Sampling
+
+    def sample(self, event, direction):
+        """Return the event, with a new trace id in its context if it is sampled.
+
+        Events which already have a trace id are returned unchanged. Data which
+        is not a LinkEvent is wrapped in a LinkData event if it is sampled.
+        """
+        if isinstance(event, LinkEvent) and TRACE_ID_KEY in event.context:
+            return event
+        if self.sample_rate < 1 and (
+            self.sample_rate == 0 or self._random.random() >= self.sample_rate
+        ):
+            return event
+        trace_id = self._next_trace_id
+        self._next_trace_id += 1
+        if not isinstance(event, LinkEvent):
+            return LinkData(event, direction=direction, context={TRACE_ID_KEY: trace_id})
+        event.context[TRACE_ID_KEY] = trace_id
+        return event
+
+    # Instrumentation
+
+    def _traced(self, entry, name, direction, sample):
+        def traced_entry(event):
+            if sample:
+                event = self.sample(event, direction)
+            trace_id = get_trace_id(event)
+            if trace_id is None:
+                return entry(event)
+            start = self.clock.time
+            result = entry(event)
+            self.spans.append((trace_id, name, direction, start, self.clock.time))
+            return result
+        return traced_entry
+
+    def instrument(self, link, name=None, sample_receive=False, sample_send=False):
+        """Record spans for events entering an EventLink from below and from above.
+
+        Links without to_receive or send, such as StreamLinks, are skipped in that
+        direction. name defaults to the link's name, or else its class name. If
+        sample_receive or sample_send is true, events entering the link from
+        below or from above, respectively, are sampled, for a link at an end of a
+        pipeline.
+        """
+        name = link_name(link, name)
+        wrap_methods(link, {
+            'to_receive': lambda entry: self._traced(entry, name, 'up', sample_receive),
+            'send': lambda entry: self._traced(entry, name, 'down', sample_send)
+        })
+
+    def instrument_pipeline(self, pipeline):
+        """Instrument every layer of a pipeline, sampling events at its bottom and top."""
+        layers = pipeline.layers
+        for (i, layer) in enumerate(layers):
+            self.instrument(layer, sample_receive=(i == 0), sample_send=(i == len(layers) - 1))
+
+    # Export
+
+    def _to_microseconds(self, time):
+        return self.clock.to_seconds(time) * 1e6
+
+    def to_chrome_trace(self):
+        """Return the spans as a Chrome trace-event JSON object.
+
+        Each trace is shown as its own thread, so that the path of an event
+        through the layers can be followed along one row.
+        """
+        return {
+            'traceEvents': [
+                {
+                    'name': name, 'cat': direction, 'ph': 'X', 'pid': 0, 'tid': trace_id,
+                    'ts': self._to_microseconds(start),
+                    'dur': self._to_microseconds(end - start)
+                }
+                for (trace_id, name, direction, start, end) in self.spans
+            ],
+            'displayTimeUnit': 'ms'
+        }
+
+    def dump_chrome_trace(self, file):
+        """Write the spans as Chrome trace-event JSON to a file object."""
+        json.dump(self.to_chrome_trace(), file)
@@ -0,0 +1,38 @@
+"""Support for reusing preallocated byte buffers."""
+
+# Builtins
+
+import collections
+
+# Packages
+
+
+class BufferPool(object):
+    """Pool of preallocated bytearrays of a fixed size.
+
+    Buffers are handed out by acquire and given back by release. If the pool runs
+    dry, acquire allocates a new buffer; at most size buffers are kept for reuse.
+    """
+
+    def __init__(self, buffer_size=65536, size=4):
+        """Initialize members."""
+        self.buffer_size = buffer_size
+        self.size = size
+        self._free = collections.deque(bytearray(buffer_size) for _ in range(size))
+
+    def __len__(self):
+        """Return the number of buffers available for reuse."""
+        return len(self._free)
+
+    def acquire(self):
+        """Return a buffer from the pool, allocating a new one if the pool is empty."""
+        try:
+            return self._free.pop()
+        except IndexError:
+            return bytearray(self.buffer_size)
+
+    def release(self, buffer):
+        """Return a buffer to the pool for reuse."""
+        if len(self._free) >= self.size or len(buffer) != self.buffer_size:
+            return
+        self._free.append(buffer)
@@ -0,0 +1,157 @@
+"""Fixed-memory histograms for recording latency distributions."""
+
+# Builtins
+
+import array
+import math
+import threading
+
+# Packages
+
+
+# The nested durations of the timed calls in progress on each thread, innermost last
+_timed_calls = threading.local()
+
+# The latency histograms recorded by links, in the latency dicts of links
+LATENCY_HISTOGRAMS = (
+    'receive_queueing', 'receive_processing', 'send_queueing', 'send_processing'
+)
+
+
+def percentile_label(percentile):
+    """Return the label for a percentile, e.g. p50, p99 or p999 for 99.9."""
+    return 'p{}'.format('{:g}'.format(percentile).replace('.', ''))
+
+
+class LogHistogram(object):
+    """Histogram of non-negative values with logarithmically sized buckets.
+
+    Like an HDR histogram, the histogram uses a fixed number of counters no
+    matter how many values are recorded, and every value between lowest and
+    highest is recorded with a relative error of at most
+    2 ** (1 / buckets_per_octave) - 1 (about 4.4% by default); values up to
+    lowest are counted in the first bucket, and values above highest in the last,
+    whose percentiles are reported as the maximum.
+    The exact count, total, minimum and maximum are also kept, and percentiles
+    are clamped to the recorded minimum and maximum.
+    """
+
+    def __init__(self, lowest=1e-7, highest=100.0, buckets_per_octave=16):
+        """Initialize members."""
+        if not 0 < lowest < highest:
+            raise ValueError('Expected 0 < lowest < highest but got {} and {}!'.format(
+                lowest, highest
+            ))
+        self.lowest = lowest
+        self.highest = highest
+        self.buckets_per_octave = buckets_per_octave
+        self._log_lowest = math.log2(lowest)
+        buckets = math.ceil((math.log2(highest) - self._log_lowest) * buckets_per_octave) + 1
+        self.counts = array.array('Q', bytes(8 * buckets))
+        self.reset()
+
+    def __repr__(self):
+        """Return a string representation of the histogram."""
+        return '{}(lowest={}, highest={}, buckets_per_octave={})'.format(
+            self.__class__.__qualname__, self.lowest, self.highest,
+            self.buckets_per_octave
+        )
+
+    def __len__(self):
+        """Return the number of recorded values."""
+        return self.count
+
+    def reset(self):
+        """Discard all recorded values."""
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value <= self.lowest:
+            return 0
+        index = math.ceil((math.log2(value) - self._log_lowest) * self.buckets_per_octave)
+        return min(index, len(self.counts) - 1)
+
+    def _upper_bound(self, index):
+        return self.lowest * 2 ** (index / self.buckets_per_octave)
+
+    def record(self, value, count=1):
+        """Record a value, count times."""
+        self.counts[self._index(value)] += count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add the values recorded by another histogram with the same buckets."""
+        if (
+            other.lowest != self.lowest or other.buckets_per_octave != self.buckets_per_octave
+            or len(other.counts) != len(self.counts)
+        ):
+            raise ValueError('Cannot merge {!r} into {!r}!'.format(other, self))
+        for (i, count) in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self):
+        """Return the mean of the recorded values, or None."""
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def percentile(self, percentile):
+        """Return an upper bound for the given percentile of the recorded values, or None."""
+        if not self.count:
+            return None
+        rank = max(math.ceil(percentile / 100 * self.count), 1)
+        cumulative = 0
+        for (index, count) in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                if index == len(self.counts) - 1:  # values above highest
+                    return self.max
+                return min(max(self._upper_bound(index), self.min), self.max)
+        return self.max
+
+    def report(self, percentiles=(50, 99, 99.9)):
+        """Return a dict of the count, mean, maximum, and the given percentiles."""
+        report = {'count': self.count, 'mean': self.mean, 'max': self.max}
+        for percentile in percentiles:
+            report[percentile_label(percentile)] = self.percentile(percentile)
+        return report
+
+
+def timed(method, histogram, clock):
+    """Return a wrapper of a method which records the duration of each call in a histogram.
+
+    Only the call's own time is recorded: the time spent in nested calls of other
+    timed methods, such as the processing by the layers above a link in an
+    AutomaticPipe, is subtracted.
+    """
+    def timed_method(*args, **kwargs):
+        nested = _timed_calls.__dict__.setdefault('nested', [])
+        nested.append(0)
+        start = clock.time
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            duration = clock.time - start
+            nested_duration = nested.pop()
+            if nested:
+                nested[-1] += duration
+        histogram.record(max(duration - nested_duration, 0))
+        return result
+    return timed_method
@@ -0,0 +1,41 @@
+"""Support for instrumenting links by wrapping their methods on the link instance.
+
+Tracers, metrics registries, flight recorders, and latency recording all wrap
+methods such as to_receive and send by replacing the bound method on the link
+instance with a wrapper of it. Wrappers compose in the order they are installed:
+each wrapper wraps whatever the attribute held when it was installed, so the
+wrapper installed last is outermost, and sees an event first on the way in and
+last on the way out. For example, if a link is instrumented by a MetricsRegistry
+and then by a FlightRecorder, each event entering the link is recorded before it
+is counted, and any time recorded by an outer wrapper includes the time taken by
+the inner wrappers.
+
+AutomaticPipes patch the after_* and directly_* handlers of their links when
+they are made, replacing any wrappers of those handlers, so pipelines should be
+instrumented after they are made.
+"""
+
+# Builtins
+
+# Packages
+
+
+def link_name(link, name=None):
+    """Return name if it's not None, or else the link's name, or else its class name."""
+    if name is None:
+        name = getattr(link, 'name', None)
+    if name is None:
+        name = link.__class__.__qualname__
+    return name
+
+
+def wrap_methods(link, wrappers):
+    """Replace methods of a link instance with wrappers of them.
+
+    wrappers maps method names to functions which take the link's current method
+    and return its replacement. Methods which the link doesn't have, such as the
+    to_receive and send methods of StreamLinks, are skipped.
+    """
+    for (method_name, wrapper) in wrappers.items():
+        if hasattr(link, method_name):
+            setattr(link, method_name, wrapper(getattr(link, method_name)))
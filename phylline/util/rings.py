@@ -0,0 +1,254 @@
+"""Single-producer/single-consumer byte rings for passing data between processes."""
+
+# Builtins
+
+import os
+import struct
+import sys
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+# Packages
+
+
+# The capacity, the write index and the read index are kept on separate cache lines
+# so that the producer and the consumer don't contend over the same line.
+_CAPACITY_OFFSET = 0
+_WRITE_INDEX_OFFSET = 64
+_READ_INDEX_OFFSET = 128
+_DATA_OFFSET = 192
+_INDEX = struct.Struct('=Q')
+
+# Names of the rings created by this process, or by the process it was forked from,
+# which share this process's resource tracker
+_created_names = set()
+
+
+class SharedMemoryRing(object):
+    """A byte ring buffer in shared memory for exactly one producer and one consumer.
+
+    The producer and consumer may be in different processes: one process creates
+    the ring, and the other attaches to it by name. The write index and read index
+    only ever increase, and each is only written by one side, so no locks are needed.
+    Data is copied into the ring before the write index is published, so the
+    consumer never sees partially written data, provided that the CPU makes stores
+    visible to other processes in program order. CPython issues no memory barriers
+    for stores into shared memory, so this holds on CPUs with total store order,
+    such as x86 and x86-64, but not on weakly ordered CPUs such as ARM, where the
+    ring is not supported.
+    """
+
+    def __init__(self, name=None, capacity=1 << 20, create=True):
+        """Initialize members.
+
+        If create is true, a new ring with the given capacity in bytes is created;
+        otherwise the existing ring with the given name is attached, and capacity is
+        ignored. Only the creating side destroys the ring, so an attaching side
+        removes the ring from its own resource tracker, which would otherwise
+        destroy it when the attaching process exits; a process started with the
+        'spawn' start method of multiprocessing shares its parent's resource
+        tracker, which then warns when the creating side destroys the ring.
+        """
+        if shared_memory is None:
+            raise RuntimeError('SharedMemoryRing requires multiprocessing.shared_memory!')
+        if create:
+            self.shared_memory = shared_memory.SharedMemory(
+                name=name, create=True, size=_DATA_OFFSET + capacity
+            )
+            _created_names.add(self.shared_memory.name)
+            _INDEX.pack_into(self.shared_memory.buf, _CAPACITY_OFFSET, capacity)
+            _INDEX.pack_into(self.shared_memory.buf, _WRITE_INDEX_OFFSET, 0)
+            _INDEX.pack_into(self.shared_memory.buf, _READ_INDEX_OFFSET, 0)
+        elif sys.version_info >= (3, 13):
+            self.shared_memory = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            self.shared_memory = shared_memory.SharedMemory(name=name)
+            if os.name == 'posix' and self.shared_memory.name not in _created_names:
+                resource_tracker.unregister(self.shared_memory._name, 'shared_memory')
+        self.created = create
+        self._buffer = self.shared_memory.buf
+        (self.capacity,) = _INDEX.unpack_from(self._buffer, _CAPACITY_OFFSET)
+        self._data = self._buffer[_DATA_OFFSET:_DATA_OFFSET + self.capacity]
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to an existing ring by its name."""
+        return cls(name=name, create=False)
+
+    def __repr__(self):
+        """Return a string representation of the ring."""
+        return '{}({}, {}/{} bytes)'.format(
+            self.__class__.__qualname__, self.name, self.readable, self.capacity
+        )
+
+    @property
+    def name(self):
+        """Return the name of the shared memory block, for attaching to the ring."""
+        return self.shared_memory.name
+
+    # Indices
+
+    @property
+    def _write_index(self):
+        return _INDEX.unpack_from(self._buffer, _WRITE_INDEX_OFFSET)[0]
+
+    @property
+    def _read_index(self):
+        return _INDEX.unpack_from(self._buffer, _READ_INDEX_OFFSET)[0]
+
+    @property
+    def readable(self):
+        """Return the number of bytes available for the consumer to read."""
+        return self._write_index - self._read_index
+
+    @property
+    def writable(self):
+        """Return the number of bytes of free space available for the producer."""
+        return self.capacity - self.readable
+
+    # Producer interface
+
+    def put(self, *buffers):
+        """Write all the buffers into the ring at once, if there is space for them.
+
+        Returns whether the buffers were written. Either all buffers become
+        visible to the consumer together, or none of them are written.
+        """
+        write_index = self._write_index
+        length = sum(len(buffer) for buffer in buffers)
+        if length > self.capacity - (write_index - self._read_index):
+            return False
+        for buffer in buffers:
+            self._copy_in(write_index, buffer)
+            write_index += len(buffer)
+        _INDEX.pack_into(self._buffer, _WRITE_INDEX_OFFSET, write_index)
+        return True
+
+    def write(self, buffer):
+        """Write as much of the buffer into the ring as there is space for.
+
+        Returns the number of bytes written.
+        """
+        write_index = self._write_index
+        length = min(len(buffer), self.capacity - (write_index - self._read_index))
+        if length == 0:
+            return 0
+        self._copy_in(write_index, memoryview(buffer)[:length])
+        _INDEX.pack_into(self._buffer, _WRITE_INDEX_OFFSET, write_index + length)
+        return length
+
+    def _copy_in(self, index, buffer):
+        start = index % self.capacity
+        first_length = min(len(buffer), self.capacity - start)
+        self._data[start:start + first_length] = buffer[:first_length]
+        if first_length < len(buffer):
+            self._data[:len(buffer) - first_length] = buffer[first_length:]
+
+    # Consumer interface
+
+    def read(self, max_bytes=None):
+        """Read and consume up to max_bytes bytes, or all readable bytes if None."""
+        read_index = self._read_index
+        length = self._write_index - read_index
+        if max_bytes is not None:
+            length = min(length, max_bytes)
+        if length == 0:
+            return b''
+        start = read_index % self.capacity
+        first_length = min(length, self.capacity - start)
+        data = bytes(self._data[start:start + first_length])
+        if first_length < length:
+            data += bytes(self._data[:length - first_length])
+        _INDEX.pack_into(self._buffer, _READ_INDEX_OFFSET, read_index + length)
+        return data
+
+    # Cleanup
+
+    def _release(self):
+        """Release the views of the shared memory block, so that it can be closed."""
+        if getattr(self, '_data', None) is None:
+            return False
+        self._data.release()
+        self._buffer = None
+        self._data = None
+        self.shared_memory.close()
+        return True
+
+    def close(self):
+        """Detach from the ring, and destroy it if this is the creating side.
+
+        Closing a ring more than once does nothing.
+        """
+        if self._release() and self.created:
+            self.shared_memory.unlink()
+            _created_names.discard(self.shared_memory.name)
+
+    def __enter__(self):
+        """Return the ring, for use as a context manager which closes it on exit."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the ring."""
+        self.close()
+
+    def __del__(self):
+        """Release the views of a ring which was never closed, without destroying it.
+
+        Otherwise the shared memory block would still be exported by the views
+        when it is collected, which raises BufferError.
+        """
+        self._release()
+
+
+class Wakeup(object):
+    """A file descriptor which can be waited on (e.g. with selectors) for notifications.
+
+    Uses an eventfd where available, and otherwise a pipe. The file descriptors are
+    close-on-exec, so a child process started by forking without exec (e.g. with
+    the 'fork' start method of multiprocessing) shares them, but a child process
+    started with exec (e.g. with the 'spawn' start method) does not.
+    """
+
+    def __init__(self):
+        """Initialize members."""
+        if hasattr(os, 'eventfd'):
+            self._read_fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            self._write_fd = self._read_fd
+        else:
+            (self._read_fd, self._write_fd) = os.pipe()
+            os.set_blocking(self._read_fd, False)
+            os.set_blocking(self._write_fd, False)
+
+    def fileno(self):
+        """Return the file descriptor which becomes readable on notification."""
+        return self._read_fd
+
+    def notify(self):
+        """Make the file descriptor readable."""
+        try:
+            if self._read_fd == self._write_fd:
+                os.eventfd_write(self._write_fd, 1)
+            else:
+                os.write(self._write_fd, b'\0')
+        except BlockingIOError:  # already readable
+            pass
+
+    def clear(self):
+        """Consume any notifications, so that the file descriptor is no longer readable."""
+        try:
+            if self._read_fd == self._write_fd:
+                os.eventfd_read(self._read_fd)
+            else:
+                while os.read(self._read_fd, 4096):
+                    pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        """Close the file descriptors."""
+        os.close(self._read_fd)
+        if self._write_fd != self._read_fd:
+            os.close(self._write_fd)
@@ -0,0 +1,124 @@
+"""Policies for choosing which of several links to serve next.
+
+A scheduler is made for a fixed list of links, and is asked for the next link
+with pending data by a predicate such as has_to_send or has_receive. Only the
+links in its ready queue, which are the links known to have had pending data,
+are checked by the predicate, except for a full rescan of all links whenever the
+ready queue runs dry or once every round of serves, so that each event costs O(1)
+amortized checks and a link which becomes ready waits for at most one round.
+"""
+
+# Builtins
+
+import collections
+
+# Packages
+
+
+class WeightedFairScheduler(object):
+    """Deficit round-robin scheduling over links with pending data.
+
+    Each link with pending data gets a turn in round-robin order, and in each
+    turn it may be served as many times as its weight, with any fractional part
+    of its weight carried over to its next turn; a link which runs out of pending
+    data forfeits its carried-over weight. Over a busy period, each link is thus
+    served in proportion to its weight, and no link waits longer than one round.
+    """
+
+    def __init__(self, links, weights=None):
+        """Initialize members.
+
+        weights should be a sequence of positive weights, one per link, or None
+        for equal weights.
+        """
+        self.links = list(links)
+        if weights is None:
+            weights = [1] * len(self.links)
+        weights = list(weights)
+        if len(weights) != len(self.links):
+            raise ValueError('Expected {} weights but got {}!'.format(
+                len(self.links), len(weights)
+            ))
+        if any(weight <= 0 for weight in weights):
+            raise ValueError('Weights must be positive: {}'.format(weights))
+        self.weights = weights
+        self._ready = collections.deque()
+        self._queued = [False] * len(self.links)
+        self._credits = [0] * len(self.links)
+        self._until_rescan = 0
+
+    def __repr__(self):
+        """Return a string representation of the scheduler."""
+        return '{}({}, weights={})'.format(
+            self.__class__.__qualname__, self.links, self.weights
+        )
+
+    def reset(self):
+        """Forget which links are ready and all carried-over weights."""
+        self._ready.clear()
+        self._queued[:] = [False] * len(self.links)
+        self._credits[:] = [0] * len(self.links)
+        self._until_rescan = 0
+
+    def _rescan(self, is_ready):
+        for (index, link) in enumerate(self.links):
+            if not self._queued[index] and is_ready(link):
+                self._queued[index] = True
+                self._ready.append(index)
+        self._until_rescan = len(self.links)
+
+    def next_ready(self, is_ready):
+        """Return the link to be served next, without serving it, or None.
+
+        is_ready is called with a link to check whether it has pending data.
+        """
+        if not self._ready or self._until_rescan <= 0:
+            self._rescan(is_ready)
+        while self._ready:
+            index = self._ready[0]
+            if not is_ready(self.links[index]):
+                self._ready.popleft()
+                self._queued[index] = False
+                self._credits[index] = 0
+                continue
+            if self._credits[index] < 1:  # start of a new turn
+                self._credits[index] += self.weights[index]
+                if self._credits[index] < 1:
+                    self._ready.rotate(-1)
+                    continue
+            return self.links[index]
+        return None
+
+    def served(self, link):
+        """Account for serving the link returned by next_ready."""
+        index = self._ready[0]
+        self._credits[index] -= 1
+        if self._credits[index] < 1:  # end of the turn
+            self._ready.rotate(-1)
+        self._until_rescan -= 1
+
+    def select(self, is_ready):
+        """Return the link to be served next and account for serving it, or None."""
+        link = self.next_ready(is_ready)
+        if link is not None:
+            self.served(link)
+        return link
+
+
+class RoundRobinScheduler(WeightedFairScheduler):
+    """Round-robin scheduling over links with pending data, one serve per turn."""
+
+    def __init__(self, links):
+        """Initialize members."""
+        super().__init__(links)
+
+    def __repr__(self):
+        """Return a string representation of the scheduler."""
+        return '{}({})'.format(self.__class__.__qualname__, self.links)
+
+
+def weighted_fair(weights):
+    """Return a scheduler factory for WeightedFairSchedulers with the given weights."""
+    def make_scheduler(links):
+        return WeightedFairScheduler(links, weights)
+    return make_scheduler
@@ -17,15 +17,43 @@ class Clock(object):
     To use the timer in externally clocked mode, call __init__/reset with the
     current clock time, and call update_clock every time the timer needs to be
     checked. Then everything will use the external clock times given by reset
+
+    In real-time mode, the time is read from source, which may be any function
+    returning the current time, such as time.monotonic or time.perf_counter;
+    a monotonic source keeps timers from firing when the wall clock jumps.
+    source_resolution is the length of one unit of source's result in seconds;
+    by default it is inferred to be a nanosecond for sources named like
+    time.monotonic_ns, and a second otherwise. If cached is true, the source is
+    only sampled by tick, so that an event loop can sample the time once per
+    iteration and every timer on the clock reads the same cached time.
+
+    If resolution is not None, the clock runs in integer mode: all clock times and
+    durations on the clock are integer numbers of ticks, each resolution seconds
+    long (e.g. 1e-9 for nanoseconds), and timers on the clock compare times
+    exactly instead of up to floating-point precision. Use to_ticks and to_seconds
+    to convert between ticks and seconds.
     """
 
-    def __init__(self, time=None):
+    def __init__(
+        self, time=None, source=time.time, source_resolution=None, cached=False,
+        resolution=None
+    ):
         """Initialize members."""
         self._time = time
+        self.resolution = resolution
+        self.source = source
+        if source_resolution is None:
+            source_resolution = (
+                1e-9 if getattr(source, '__name__', '').endswith('_ns') else 1
+            )
+        self.source_resolution = source_resolution
+        self.cached = cached
+        self._cached_time = None
 
     def reset(self, time=None):
         """Reset the clock."""
         self._time = time
+        self._cached_time = None
 
     def update(self, time=None):
         """Update the clock time.
@@ -40,12 +68,52 @@ class Clock(object):
             return
         self._time = time
 
+    @property
+    def integer(self):
+        """Whether the clock runs in integer mode."""
+        return self.resolution is not None
+
+    def to_ticks(self, seconds):
+        """Convert a duration in seconds to clock units, rounding in integer mode."""
+        if self.resolution is None:
+            return seconds
+        return round(seconds / self.resolution)
+
+    def to_seconds(self, ticks):
+        """Convert a duration in clock units to seconds."""
+        if self.resolution is None:
+            return ticks
+        return ticks * self.resolution
+
+    def _sample(self):
+        if self.resolution is not None:
+            if self.source_resolution == self.resolution:
+                return self.source()
+            return round(self.source() * self.source_resolution / self.resolution)
+        if self.source_resolution == 1:
+            return self.source()
+        return self.source() * self.source_resolution
+
+    def tick(self):
+        """Sample the time source for the cached time, and return the clock time.
+
+        Only needs to be called when the clock runs in cached real-time mode.
+        Otherwise, does nothing.
+        """
+        if self.realtime and self.cached:
+            self._cached_time = self._sample()
+        return self.time
+
     @property
     def time(self):
         """Clock time."""
-        if self.realtime:
-            return time.time()
-        return self._time
+        if not self.realtime:
+            return self._time
+        if not self.cached:
+            return self._sample()
+        if self._cached_time is None:
+            self._cached_time = self._sample()
+        return self._cached_time
 
     @property
     def realtime(self):
@@ -59,6 +127,7 @@ class TimeoutTimer(object):
     Note that the clock is checked against timeout up to floating-point precision,
     so if the elapsed time is nominally just before the timeout but actually within
     floating-point error of it, the timer will consider itself to have timed out.
+    If the clock is in integer mode, the timeout is in ticks and is checked exactly.
     """
 
     def __init__(self, timeout=0, clock=None):
@@ -104,31 +173,34 @@ class TimeoutTimer(object):
             return None
         return self.clock.time - self.start_time
 
+    def _elapsed_timed_out(self, elapsed):
+        if elapsed >= self.timeout:
+            return True
+        return not self.clock.integer and math.isclose(elapsed, self.timeout)
+
     @property
     def running(self):
         """Whether the timer is running to timeout."""
-        return (
-            self.enabled and (self.elapsed < self.timeout)
-            and not math.isclose(self.elapsed, self.timeout)
-        )
+        if not self.enabled:
+            return False
+        return not self._elapsed_timed_out(self.elapsed)
 
     @property
     def timed_out(self):
         """Whether timeout has occurred."""
-        return self.enabled and (
-            self.elapsed >= self.timeout
-            or math.isclose(self.elapsed, self.timeout)
-        )
+        if not self.enabled:
+            return False
+        return self._elapsed_timed_out(self.elapsed)
 
     @property
     def remaining(self):
         """Amount of time remaining before timeout."""
         if not self.enabled:
             return None
-        duration = self.timeout - self.elapsed
-        if self.timed_out:  # check timed_out after duration for real-time correctness
+        elapsed = self.elapsed  # read the clock only once for real-time correctness
+        if self._elapsed_timed_out(elapsed):
             return 0
-        return duration
+        return self.timeout - elapsed
 
     def __repr__(self):
         """Return a string representation of the timer."""
@@ -138,3 +210,90 @@ class TimeoutTimer(object):
             'from {}, '.format(self.start_time) if self.start_time is not None else '',
             'timeout={}'.format(self.timeout)
         )
+
+
+class TokenBucket(object):
+    """Token bucket which refills at a constant rate up to a capacity.
+
+    Tokens are refilled lazily from the clock whenever the bucket is used, so the
+    bucket never needs to be ticked. The bucket starts full. A reservation may
+    take the bucket into debt, which makes later reservations wait until the debt
+    has been repaid; this is how a FIFO shaper computes when each item may leave.
+    A capacity of 0 allows no bursts at all. If the clock is in integer mode, the
+    rate is per tick, and waiting times are rounded up to whole ticks.
+    """
+
+    def __init__(self, rate, capacity, clock=None):
+        """Initialize members.
+
+        rate is the number of tokens added per unit of clock time.
+        """
+        if rate <= 0:
+            raise ValueError('Token bucket rate must be positive!')
+        self.rate = rate
+        self.capacity = capacity
+        if clock is None:
+            clock = Clock()
+        self.clock = clock
+        self._tokens = capacity
+        self._refill_time = self.clock.time
+
+    def reset(self):
+        """Refill the bucket to capacity, as of the current clock time."""
+        self._tokens = self.capacity
+        self._refill_time = self.clock.time
+
+    def _refill(self):
+        now = self.clock.time
+        elapsed = now - self._refill_time
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._refill_time = now
+
+    def _wait_time(self, deficit):
+        wait_time = deficit / self.rate
+        if self.clock.integer:
+            return math.ceil(wait_time)
+        return wait_time
+
+    @property
+    def tokens(self):
+        """Number of tokens currently in the bucket; negative while in debt."""
+        self._refill()
+        return self._tokens
+
+    def time_until(self, amount=1):
+        """Amount of clock time until the bucket will hold the given number of tokens."""
+        self._refill()
+        if self._tokens >= amount:
+            return 0
+        return self._wait_time(amount - self._tokens)
+
+    def try_consume(self, amount=1):
+        """Take the given number of tokens if they are available.
+
+        Returns whether the tokens were taken.
+        """
+        self._refill()
+        if self._tokens < amount:
+            return False
+        self._tokens -= amount
+        return True
+
+    def reserve(self, amount=1):
+        """Take the given number of tokens, going into debt if necessary.
+
+        Returns the amount of clock time until the reservation is covered, i.e.
+        how long the reserved item must wait.
+        """
+        self._refill()
+        self._tokens -= amount
+        if self._tokens >= 0:
+            return 0
+        return self._wait_time(-self._tokens)
+
+    def __repr__(self):
+        """Return a string representation of the bucket."""
+        return '{}({}/{} at rate={})'.format(
+            self.__class__.__qualname__, self.tokens, self.capacity, self.rate
+        )
@@ -0,0 +1,159 @@
+"""Test the couplers module."""
+
+# Builtins
+
+import multiprocessing
+import selectors
+
+# Packages
+
+from phylline.couplers import SharedMemoryBottomCoupler
+from phylline.links.events import EventLink
+from phylline.links.links import ChunkedStreamLink
+from phylline.links.loopback import TopLoopbackLink
+from phylline.pipelines import AutomaticPipeline, ManualPipeline
+from phylline.util.rings import SharedMemoryRing, Wakeup
+
+import pytest
+
+from tests.unit.pipelines import make_pipeline_loopback
+
+
+def make_pipeline_short_loopback(pipeline_type):
+    """Make a short pipeline with a loopback at the top."""
+    return pipeline_type(ChunkedStreamLink(), EventLink(), TopLoopbackLink())
+
+
+def make_couplers(pipeline_one, pipeline_two, capacity=1024):
+    """Make a pair of couplers connected over a pair of rings."""
+    ring_one_to_two = SharedMemoryRing(capacity=capacity)
+    ring_two_to_one = SharedMemoryRing(capacity=capacity)
+    coupler_one = SharedMemoryBottomCoupler(pipeline_one, ring_one_to_two, ring_two_to_one)
+    coupler_two = SharedMemoryBottomCoupler(
+        pipeline_two,
+        SharedMemoryRing.attach(ring_two_to_one.name),
+        SharedMemoryRing.attach(ring_one_to_two.name)
+    )
+    return (coupler_one, coupler_two)
+
+
+@pytest.mark.parametrize('pipeline_type', [AutomaticPipeline, ManualPipeline])
+def test_shared_memory_bottom_coupler_stream(pipeline_type):
+    """Test for shared-memory bottom coupling on streams within one process."""
+    print('Testing byte buffer loopback with SharedMemoryBottomCoupler...')
+    pipeline_one = pipeline_type(ChunkedStreamLink(), EventLink())
+    pipeline_two = make_pipeline_loopback(pipeline_type)
+    (coupler_one, coupler_two) = make_couplers(pipeline_one, pipeline_two)
+    with pytest.raises(ValueError):
+        coupler_one.fileno()  # no wakeup
+    try:
+        payload = b'\1\2\3\4'
+        for _ in range(3):
+            pipeline_one.send(payload)
+            coupler_one.update_clock(0)
+            coupler_two.update_clock(0)
+            coupler_two.update_clock(0)
+            coupler_one.update_clock(0)
+            assert pipeline_one.has_receive()
+            result = pipeline_one.receive()
+            print('Loopback received: {}'.format(result))
+            assert result.data == payload
+            assert not pipeline_one.has_receive()
+    finally:
+        coupler_two.close()
+        coupler_one.close()
+
+
+def test_shared_memory_bottom_coupler_event():
+    """Test for shared-memory bottom coupling on events within one process."""
+    print('Testing event loopback with SharedMemoryBottomCoupler...')
+    pipeline_one = AutomaticPipeline(EventLink(), EventLink())
+    pipeline_two = AutomaticPipeline(EventLink(), TopLoopbackLink())
+    (coupler_one, coupler_two) = make_couplers(pipeline_one, pipeline_two)
+    try:
+        payload = b'\1\2\3\4'
+        pipeline_one.send(payload)
+        assert coupler_two.poll() == 1
+        assert coupler_one.poll() == 1
+        result = pipeline_one.receive()
+        assert result.data == payload
+    finally:
+        coupler_two.close()
+        coupler_one.close()
+
+
+def test_shared_memory_bottom_coupler_backpressure():
+    """Test that data which doesn't fit in the ring is retried later."""
+    print('Testing ring backpressure with SharedMemoryBottomCoupler...')
+    pipeline_one = AutomaticPipeline(ChunkedStreamLink(), EventLink())
+    pipeline_two = make_pipeline_short_loopback(AutomaticPipeline)
+    (coupler_one, coupler_two) = make_couplers(pipeline_one, pipeline_two, capacity=64)
+    try:
+        payloads = [bytes([i]) * 20 for i in range(1, 6)]
+        for payload in payloads:
+            pipeline_one.send(payload)
+        assert coupler_one.flush() > 0
+        received = []
+        while len(received) < len(payloads):
+            coupler_two.poll()
+            coupler_one.poll()
+            received.extend(event.data for event in pipeline_one.receive_all())
+        assert received == payloads
+    finally:
+        coupler_two.close()
+        coupler_one.close()
+
+
+def run_loopback_process(send_ring_name, receive_ring_name, wakeup, peer_wakeup, count):
+    """Echo count events back through a loopback pipeline in a child process."""
+    pipeline = make_pipeline_short_loopback(AutomaticPipeline)
+    coupler = SharedMemoryBottomCoupler(
+        pipeline, SharedMemoryRing.attach(send_ring_name),
+        SharedMemoryRing.attach(receive_ring_name), wakeup, peer_wakeup
+    )
+    selector = selectors.DefaultSelector()
+    selector.register(coupler, selectors.EVENT_READ)
+    received = 0
+    while received < count:
+        if selector.select(timeout=5):
+            received += coupler.poll()
+        else:
+            break
+    selector.close()
+    coupler.send_ring.close()
+    coupler.receive_ring.close()
+
+
+def test_shared_memory_bottom_coupler_processes():
+    """Test for shared-memory bottom coupling between two processes."""
+    print('Testing loopback across processes with SharedMemoryBottomCoupler...')
+    context = multiprocessing.get_context('fork')
+    ring_one_to_two = SharedMemoryRing()
+    ring_two_to_one = SharedMemoryRing()
+    wakeup_one = Wakeup()
+    wakeup_two = Wakeup()
+    pipeline = AutomaticPipeline(ChunkedStreamLink(), EventLink())
+    coupler = SharedMemoryBottomCoupler(
+        pipeline, ring_one_to_two, ring_two_to_one, wakeup_one, wakeup_two
+    )
+    payloads = [b'foo,', b'bar,', b'foobar!'] * 10
+    process = context.Process(target=run_loopback_process, args=(
+        ring_two_to_one.name, ring_one_to_two.name, wakeup_two, wakeup_one, len(payloads)
+    ))
+    process.start()
+    selector = selectors.DefaultSelector()
+    selector.register(coupler, selectors.EVENT_READ)
+    try:
+        for payload in payloads:
+            pipeline.send(payload)
+        received = []
+        while len(received) < len(payloads) and selector.select(timeout=5):
+            coupler.poll()
+            received.extend(event.data for event in pipeline.receive_all())
+        assert received == payloads
+    finally:
+        process.join(timeout=5)
+        selector.close()
+        coupler.close()
+        wakeup_one.close()
+        wakeup_two.close()
@@ -0,0 +1,171 @@
+"""Test the links.arq module."""
+
+# Builtins
+
+import random
+
+# Packages
+
+from phylline.links.arq import SelectiveRepeatLink
+from phylline.links.clocked import LinkClockRequest
+
+import pytest
+
+
+PAYLOADS = [bytes([i]) * (i % 7 + 1) for i in range(100)]
+
+
+def frames(events):
+    """Return the data of the data events, without clock requests."""
+    return [event.data for event in events if not isinstance(event, LinkClockRequest)]
+
+
+def payloads(arq_link):
+    """Return the payloads received by the link."""
+    return [event.data for event in arq_link.receive_all()]
+
+
+def test_selective_repeat_link():
+    """Exercise SelectiveRepeatLink's interface without loss."""
+    print('Testing Selective Repeat Link:')
+    sender = SelectiveRepeatLink(window=4)
+    receiver = SelectiveRepeatLink(window=4)
+    for payload in PAYLOADS[:6]:
+        sender.send(payload)
+    assert sender.in_flight == 4
+    assert sender.pending == 2
+    assert sender.next_clock_request == 1.0
+    data_frames = frames(sender.to_send_all())
+    assert len(data_frames) == 4
+    for frame in data_frames:
+        receiver.to_receive(frame)
+    assert payloads(receiver) == PAYLOADS[:4]
+    ack_frames = frames(receiver.to_send_all())
+    assert len(ack_frames) == 4
+    sender.to_receive(ack_frames[-1])  # a cumulative ack acknowledges all earlier frames
+    assert sender.in_flight == 2
+    assert sender.pending == 0
+    for frame in frames(sender.to_send_all()):
+        receiver.to_receive(frame)
+    assert payloads(receiver) == PAYLOADS[4:6]
+    for frame in frames(receiver.to_send_all()):
+        sender.to_receive(frame)
+    assert sender.in_flight == 0
+    assert sender.next_clock_request is None
+    sender.update_clock(10.0)
+    assert not sender.has_to_send()
+    assert sender.stats['retransmitted'] == 0
+
+
+def test_selective_repeat_link_retransmit():
+    """Exercise SelectiveRepeatLink's selective retransmission."""
+    print('Testing Selective Repeat Link with a lost frame:')
+    sender = SelectiveRepeatLink(window=4, retransmit_timeout=1.0)
+    receiver = SelectiveRepeatLink(window=4, retransmit_timeout=1.0)
+    for payload in PAYLOADS[:4]:
+        sender.send(payload)
+    data_frames = frames(sender.to_send_all())
+    for (i, frame) in enumerate(data_frames):
+        if i != 1:  # lose the second frame
+            receiver.to_receive(frame)
+    assert payloads(receiver) == PAYLOADS[:1]
+    for frame in frames(receiver.to_send_all()):
+        sender.to_receive(frame)
+    assert sender.in_flight == 3  # the frames after the lost frame are selectively acked
+
+    sender.update_clock(0.5)
+    assert frames(sender.to_send_all()) == []
+    sender.update_clock(1.0)
+    retransmitted = frames(sender.to_send_all())
+    assert retransmitted == [data_frames[1]]
+    assert sender.next_clock_request == 2.0
+    receiver.to_receive(retransmitted[0])
+    assert payloads(receiver) == PAYLOADS[1:4]
+    for frame in frames(receiver.to_send_all()):
+        sender.to_receive(frame)
+    assert sender.in_flight == 0
+    assert sender.stats['retransmitted'] == 1
+    assert receiver.stats['duplicates'] == 0
+
+    # Duplicates from a lost ack
+    receiver.to_receive(retransmitted[0])
+    assert payloads(receiver) == []
+    assert receiver.stats['duplicates'] == 1
+    assert len(frames(receiver.to_send_all())) == 1
+
+
+def test_selective_repeat_link_integer():
+    """Exercise SelectiveRepeatLink's retransmission deadlines with an integer clock."""
+    print('Testing Selective Repeat Link with an integer clock:')
+    sender = SelectiveRepeatLink(retransmit_timeout=2, clock_resolution=1e-9)
+    sender.send(PAYLOADS[0])
+    requested_time = sender.next_clock_request.requested_time
+    assert requested_time == 2
+    assert isinstance(requested_time, int)
+
+
+@pytest.mark.parametrize('initial_sequence', [0, (1 << 32) - 10])
+def test_selective_repeat_link_lossy(initial_sequence):
+    """Exercise SelectiveRepeatLink over a lossy, reordering channel."""
+    print('Testing Selective Repeat Link over a lossy channel:')
+    random_source = random.Random(0)
+    sender = SelectiveRepeatLink(window=8, initial_sequence=initial_sequence)
+    receiver = SelectiveRepeatLink(window=8, initial_sequence=initial_sequence)
+
+    def transfer(source, destination):
+        in_transit = frames(source.to_send_all())
+        random_source.shuffle(in_transit)
+        for frame in in_transit:
+            if random_source.random() < 0.3:
+                continue
+            destination.to_receive(frame)
+            if random_source.random() < 0.1:
+                destination.to_receive(frame)
+
+    for payload in PAYLOADS:
+        sender.send(payload)
+    received = []
+    clock_time = 0.0
+    while len(received) < len(PAYLOADS) and clock_time < 1000:
+        transfer(sender, receiver)
+        received.extend(payloads(receiver))
+        transfer(receiver, sender)
+        clock_time += 0.5
+        sender.update_clock(clock_time)
+        receiver.update_clock(clock_time)
+    assert received == PAYLOADS
+    assert sender.stats['retransmitted'] > 0
+    assert receiver.stats['duplicates'] > 0
+
+
+def test_selective_repeat_link_malformed():
+    """Exercise SelectiveRepeatLink's handling of malformed frames."""
+    print('Testing Selective Repeat Link with malformed frames:')
+    arq_link = SelectiveRepeatLink()
+    arq_link.to_receive(b'\x07')
+    arq_link.to_receive(b'\x00\x00')
+    assert not arq_link.has_receive()
+    assert arq_link.stats['malformed'] == 2
+    with pytest.raises(ValueError):
+        SelectiveRepeatLink(window=0)
+
+
+def test_selective_repeat_link_reset():
+    """Exercise SelectiveRepeatLink's reset to its initial state."""
+    print('Testing Selective Repeat Link reset:')
+    sender = SelectiveRepeatLink(window=2, initial_sequence=5)
+    receiver = SelectiveRepeatLink(window=2, initial_sequence=5)
+    for payload in PAYLOADS[:3]:
+        sender.send(payload)
+    sender.update_clock(1.0)
+    assert sender.stats['retransmitted'] == 2
+    sender.reset()
+    assert sender.in_flight == 0
+    assert sender.pending == 0
+    assert sender.next_clock_request is None
+    assert sender.stats['retransmitted'] == 0
+    assert not sender.has_to_send()
+    sender.send(PAYLOADS[0])
+    for frame in frames(sender.to_send_all()):
+        receiver.to_receive(frame)
+    assert payloads(receiver) == PAYLOADS[:1]
@@ -0,0 +1,91 @@
+"""Test the links.batching module."""
+
+# Builtins
+
+# Packages
+
+from phylline.links.batching import BatchingLink, LinkBatch, UnbatchingLink, is_batch
+from phylline.links.clocked import LinkClockRequest
+from phylline.links.events import EventLink, LinkException
+from phylline.pipelines import AutomaticPipeline
+
+from tests.unit.links.clocked import assert_clock_request_event_received
+from tests.unit.links.streams import HIGHER_EVENTS, LOWER_EVENTS
+
+
+def test_batching_link_size():
+    """Exercise BatchingLink's batching by count and byte size."""
+    print('Testing Batching Link with size limits:')
+    batching_link = BatchingLink(max_events=2)
+    for event in LOWER_EVENTS:
+        batching_link.to_receive(event)
+    received = list(batching_link.receive_all())
+    assert len(received) == 1
+    assert isinstance(received[0], LinkBatch)
+    assert received[0].data == LOWER_EVENTS[:2]
+    assert is_batch(received[0])
+    assert batching_link.pending == 1
+    batching_link.to_receive(LinkException(ValueError('foo')))
+    received = list(batching_link.receive_all())
+    assert received[0].data == LOWER_EVENTS[2:]
+    assert isinstance(received[1], LinkException)
+
+    batching_link = BatchingLink(max_events=100, max_bytes=8)
+    for event in LOWER_EVENTS:  # 4, 4 and 7 bytes long
+        batching_link.to_receive(event)
+    assert [event.data for event in batching_link.receive_all()] == [LOWER_EVENTS[:2]]
+    batching_link.flush()
+    assert [event.data for event in batching_link.receive_all()] == [LOWER_EVENTS[2:]]
+    assert batching_link.pending == 0
+
+    batching_link.send(LinkBatch(HIGHER_EVENTS))
+    batching_link.send('foo')
+    assert [event.data for event in batching_link.to_send_all()] == HIGHER_EVENTS + ['foo']
+
+
+def test_batching_link_max_wait():
+    """Exercise BatchingLink's batching by maximum waiting time."""
+    print('Testing Batching Link with a maximum waiting time:')
+    batching_link = BatchingLink(max_events=100, max_wait=0.5)
+    batching_link.update_clock(1.0)
+    assert batching_link.next_clock_request is None
+    batching_link.to_receive(LOWER_EVENTS[0])
+    assert_clock_request_event_received(batching_link, 1.5)
+    assert batching_link.next_clock_request == 1.5
+    batching_link.update_clock(1.25)
+    batching_link.to_receive(LOWER_EVENTS[1])
+    assert not batching_link.has_receive()
+    batching_link.update_clock(1.5)
+    received = list(batching_link.receive_all())
+    assert [event.data for event in received] == [LOWER_EVENTS[:2]]
+    assert batching_link.next_clock_request is None
+    batching_link.to_receive(LOWER_EVENTS[2])
+    assert_clock_request_event_received(batching_link, 2.0)
+    batching_link.reset()
+    assert batching_link.pending == 0
+    assert batching_link.next_clock_request is None
+
+    batching_link = BatchingLink(max_wait=5, clock_resolution=1e-9)
+    batching_link.to_receive(LOWER_EVENTS[0])
+    requested_time = batching_link.next_clock_request.requested_time
+    assert requested_time == 5
+    assert isinstance(requested_time, int)
+
+
+def test_unbatching_link():
+    """Exercise BatchingLink and UnbatchingLink in a pipeline."""
+    print('Testing Unbatching Link:')
+    batching_link = BatchingLink(max_events=3)
+    unbatching_link = UnbatchingLink()
+    pipeline = AutomaticPipeline(
+        batching_link, EventLink(), EventLink(), unbatching_link
+    )
+    for event in LOWER_EVENTS:
+        pipeline.to_receive(event)
+    received = list(pipeline.receive_all())
+    assert [event.data for event in received] == LOWER_EVENTS
+    assert all(not is_batch(event) for event in received)
+    assert is_batch(received[0].previous)
+    unbatching_link.to_receive('foo')
+    assert [event.data for event in unbatching_link.receive_all()] == ['foo']
+    assert not any(isinstance(event, LinkClockRequest) for event in received)
@@ -2,11 +2,25 @@
 
 # Builtins
 
+import functools
+
 # Packages
 
-from phylline.links.clocked import DelayedEventLink, LinkClockRequest
+from phylline.links.clocked import BatchEventDelayer, EventDelayer, HeapEventDelayer
+from phylline.links.clocked import jittered_delay, serialization_delay
+from phylline.links.clocked import CoalescingStreamLink, DelayedEventLink, LinkClockRequest
+from phylline.links.events import LinkData
+from phylline.util.timing import Clock
+
+import pytest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-from tests.unit.links.streams import HIGHER_EVENTS, LOWER_EVENTS
+from tests.unit.links.streams import HIGHER_BUFFERS, HIGHER_EVENTS, HIGHER_STREAM
+from tests.unit.links.streams import LOWER_BUFFERS, LOWER_EVENTS
 
 
 def assert_clock_request_event_received(delayed_event_link, time):
@@ -27,10 +41,21 @@ def assert_clock_request_event_to_send(delayed_event_link, time):
     assert to_send_events[0].requested_time == time
 
 
-def test_delayed_event_link():
+DELAYER_FACTORIES = [
+    EventDelayer,
+    BatchEventDelayer,
+    pytest.param(
+        functools.partial(BatchEventDelayer, backend='numpy', compact_threshold=4),
+        marks=pytest.mark.skipif(numpy is None, reason='NumPy is not installed')
+    )
+]
+
+
+@pytest.mark.parametrize('delayer_factory', DELAYER_FACTORIES)
+def test_delayed_event_link(delayer_factory):
     """Exercise DelayedEventLink's timing interface."""
     print('Testing Delayed Event Link:')
-    delayed_event_link = DelayedEventLink()
+    delayed_event_link = DelayedEventLink(delayer_factory=delayer_factory)
     # Receiving times by clock updates with LinkClockTime events
     print('On-time clock test:')
     delayed_event_link.update_clock(0)
@@ -110,3 +135,199 @@ def test_delayed_event_link():
     for (i, event) in enumerate(to_send_events):
         print('Event Link sent to queue: {}'.format(event))
         assert event.data == HIGHER_EVENTS[i + 1]
+
+
+@pytest.mark.parametrize('backend', [
+    'array',
+    pytest.param('numpy', marks=pytest.mark.skipif(numpy is None, reason='NumPy is not installed'))
+])
+def test_batch_event_delayer(backend):
+    """Exercise BatchEventDelayer's bulk flushing."""
+    print('Testing Batch Event Delayer with backend {}:'.format(backend))
+    clock = Clock(time=0.0)
+    with pytest.raises(ValueError):
+        BatchEventDelayer('receive', clock, 0.1, backend=backend, compact_threshold=0)
+    delayer = BatchEventDelayer('receive', clock, 0.1, backend=backend, compact_threshold=8)
+    assert not delayer
+    for i in range(100):
+        clock.update(i * 0.01)
+        delayer.enqueue_event(LinkData(i))
+    assert len(delayer) == 100
+    assert delayer.next_timeout_time == 0.1
+    assert delayer.next_in_flight_event['event'].data == 0
+    clock.update(0.0)
+    assert list(delayer.flush_events()) == []
+    for (flush_time, expected_count) in [(0.155, 6), (0.505, 35), (0.505, 0), (2.0, 59)]:
+        clock.update(flush_time)
+        flushed = list(delayer.flush_events())
+        assert len(flushed) == expected_count
+        for event in flushed:
+            assert event.context['actual_receive_time'] == flush_time
+            assert event.context['intended_receive_time'] <= flush_time + 1e-9
+    assert not delayer
+    clock.update(3.0)
+    delayer.enqueue_event(LinkData('foo'))
+    assert delayer.next_timeout_time == 3.1
+    clock.update(3.1)
+    assert [event.data for event in delayer.flush_events()] == ['foo']
+
+
+@pytest.mark.parametrize('reorder', [False, True])
+def test_heap_event_delayer(reorder):
+    """Exercise HeapEventDelayer's per-event delays."""
+    print('Testing Heap Event Delayer with reorder {}:'.format(reorder))
+    clock = Clock(time=0.0)
+    delayer = HeapEventDelayer('send', clock, lambda event: len(event.data), reorder=reorder)
+    assert not delayer
+    for data in [b'foobar', b'foo', b'bar!']:
+        delayer.enqueue_event(LinkData(data))
+    delayer.enqueue_event(LinkData(b'foo,bar'), delay=0.5)
+    assert len(delayer) == 4
+    if reorder:
+        assert delayer.next_timeout_time == 0.5
+        expected = [(0.4, []), (3.0, [b'foo,bar', b'foo']), (6.0, [b'bar!', b'foobar'])]
+    else:
+        assert delayer.next_timeout_time == 6.0
+        expected = [(3.0, []), (5.9, []), (6.0, [b'foobar', b'foo', b'bar!', b'foo,bar'])]
+    assert delayer.next_in_flight_event['timeout_time'] == delayer.next_timeout_time
+    for (flush_time, expected_data) in expected:
+        clock.update(flush_time)
+        flushed = list(delayer.flush_events())
+        assert [event.data for event in flushed] == expected_data
+        for event in flushed:
+            assert event.context['actual_send_time'] == flush_time
+    assert not delayer
+    delayer.enqueue_event(LinkData(b'foo'))
+    assert delayer.next_timeout_time == 9.0
+
+
+def test_delay_functions():
+    """Exercise the delay functions for DelayedEventLink."""
+    print('Testing delay functions:')
+    delay = jittered_delay(1.0, 0.5, seed=0)
+    delays = [delay(LinkData(b'foo')) for _ in range(100)]
+    assert all(1.0 <= delay <= 1.5 for delay in delays)
+    assert len(set(delays)) > 1
+    other_delay = jittered_delay(1.0, 0.5, seed=0)
+    assert [other_delay(LinkData(b'foo')) for _ in range(100)] == delays
+    delay = serialization_delay(10, delay=1.0)
+    assert delay(LinkData(b'foobar!!!!')) == 2.0
+    assert delay(LinkData(None)) == 1.0
+
+
+def test_delayed_event_link_variable_delay():
+    """Exercise DelayedEventLink with per-event delays."""
+    print('Testing Delayed Event Link with per-event delays:')
+    delayed_event_link = DelayedEventLink(
+        receive_delay=serialization_delay(1, delay=1.0), send_delay=0.5
+    )
+    for event in LOWER_EVENTS:
+        delayed_event_link.to_receive(event)
+    delayed_event_link.update_clock(0)
+    assert_clock_request_event_received(delayed_event_link, 5.0)
+    delayed_event_link.update_clock(4.0)
+    assert not delayed_event_link.has_receive()
+    delayed_event_link.update_clock(5.0)
+    for event in LOWER_EVENTS[:2]:
+        assert delayed_event_link.receive().data == event
+    assert_clock_request_event_received(delayed_event_link, 8.0)
+    delayed_event_link.update_clock(8.0)
+    assert delayed_event_link.receive().data == LOWER_EVENTS[2]
+    assert not delayed_event_link.has_receive()
+
+
+def test_delayed_event_link_out_of_band():
+    """Exercise DelayedEventLink's clock updates which bypass its processors."""
+    print('Testing Delayed Event Link with out-of-band clock updates:')
+    delayed_event_link = DelayedEventLink()
+    for event in LOWER_EVENTS:
+        delayed_event_link.to_receive(event)
+    assert_clock_request_event_received(delayed_event_link, 1.0)
+    for event in HIGHER_EVENTS:
+        delayed_event_link.send(event)
+    assert not delayed_event_link.has_to_send()  # the clock request was already made
+
+    def fail(event):
+        raise AssertionError('Processor was resumed by a clock update: {}'.format(event))
+
+    delayed_event_link.to_receive = fail
+    delayed_event_link.send = fail
+    delayed_event_link.update_clock(0.5)
+    assert not delayed_event_link.has_receive()
+    assert not delayed_event_link.has_to_send()
+    delayed_event_link.update_clock_receive(1.0)
+    assert [event.data for event in delayed_event_link.receive_all()] == LOWER_EVENTS
+    assert not delayed_event_link.has_to_send()
+    delayed_event_link.update_clock_send(1.0)
+    assert [event.data for event in delayed_event_link.to_send_all()] == HIGHER_EVENTS
+    delayed_event_link.update_clock(2.0)
+    assert not delayed_event_link.has_receive()
+    assert not delayed_event_link.has_to_send()
+
+
+@pytest.mark.parametrize('delayer_factory', DELAYER_FACTORIES + [HeapEventDelayer])
+def test_delayed_event_link_integer(delayer_factory):
+    """Exercise DelayedEventLink's timing interface with an integer clock."""
+    print('Testing Delayed Event Link with an integer clock:')
+    start = 10 ** 15  # about 11.6 days of nanoseconds
+    delayed_event_link = DelayedEventLink(
+        clock_start=start, receive_delay=2, send_delay=2,
+        delayer_factory=delayer_factory, clock_resolution=1e-9
+    )
+    delayed_event_link.to_receive(LOWER_EVENTS[0])
+    assert_clock_request_event_received(delayed_event_link, start + 2)
+    delayed_event_link.update_clock(start + 1)
+    delayed_event_link.to_receive(LOWER_EVENTS[1])
+    assert not delayed_event_link.has_receive()
+    delayed_event_link.update_clock(start + 2)
+    assert delayed_event_link.receive().data == LOWER_EVENTS[0]
+    # A request one tick later is distinct from the previous request
+    assert_clock_request_event_received(delayed_event_link, start + 3)
+    delayed_event_link.update_clock(start + 3)
+    assert delayed_event_link.receive().data == LOWER_EVENTS[1]
+    assert not delayed_event_link.has_receive()
+    # The clock starts at an integer time by default
+    delayed_event_link = DelayedEventLink(delayer_factory=delayer_factory, clock_resolution=1e-9)
+    assert isinstance(delayed_event_link.clock.time, int)
+    assert DelayedEventLink().clock.time == 0.0
+
+
+def test_coalescing_stream_link():
+    """Exercise CoalescingStreamLink's size and time thresholds."""
+    print('Testing Coalescing Stream Link:')
+    coalescing_link = CoalescingStreamLink(flush_size=15, max_delay=1.0)
+    # Time threshold
+    coalescing_link.update_clock(0)
+    assert coalescing_link.next_clock_request is None
+    coalescing_link.write(HIGHER_BUFFERS[0])
+    assert coalescing_link.to_write() == b''
+    assert coalescing_link.next_clock_request.requested_time == 1.0
+    coalescing_link.update_clock(0.5)
+    coalescing_link.write(HIGHER_BUFFERS[1])
+    assert coalescing_link.to_write() == b''
+    assert coalescing_link.next_clock_request.requested_time == 1.0
+    coalescing_link.update_clock(0.99)
+    assert coalescing_link.to_write() == b''
+    coalescing_link.update_clock(1.0)
+    assert coalescing_link.to_write() == HIGHER_STREAM
+    assert coalescing_link.next_clock_request is None
+    assert coalescing_link.pending == 0
+
+    # Size threshold
+    for buffer in LOWER_BUFFERS[:2]:
+        coalescing_link.write(buffer)
+    assert coalescing_link.to_write() == b''
+    coalescing_link.write(LOWER_BUFFERS[2])
+    assert coalescing_link.to_write() == b'foo,bar,foobar!'
+    assert coalescing_link.next_clock_request is None
+
+    # Explicit flush
+    coalescing_link.write(HIGHER_BUFFERS[0])
+    coalescing_link.flush()
+    assert coalescing_link.to_write() == HIGHER_BUFFERS[0]
+    assert coalescing_link.next_clock_request is None
+
+    # Reads pass through
+    for buffer in LOWER_BUFFERS:
+        coalescing_link.to_read(buffer)
+    assert coalescing_link.read() == b'foo,bar,foobar!'
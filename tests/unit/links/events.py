@@ -4,7 +4,7 @@
 
 # Packages
 
-from phylline.links.events import EventLink
+from phylline.links.events import EventLink, LinkException, control_first
 
 from tests.unit.links.streams import HIGHER_EVENTS, LOWER_EVENTS
 
@@ -25,3 +25,45 @@ def test_event_link():
     for (i, event) in enumerate(event_link.to_send_all()):
         print('Event Link sent to queue: {}'.format(event))
         assert event.data == HIGHER_EVENTS[i]
+
+
+def test_event_link_bounded():
+    """Exercise EventLink's bounded partial drains."""
+    print('Testing Event Link with bounded drains:')
+    event_link = EventLink()
+    for event in LOWER_EVENTS:
+        event_link.to_receive(event)
+    received = list(event_link.receive_all(max_events=2))
+    assert [event.data for event in received] == LOWER_EVENTS[:2]
+    assert event_link.has_receive()
+    received = list(event_link.receive_all(max_events=2))
+    assert [event.data for event in received] == LOWER_EVENTS[2:]
+    assert not event_link.has_receive()
+    for event in HIGHER_EVENTS:
+        event_link.send(event)
+    to_send = list(event_link.to_send_all(max_events=1))
+    assert [event.data for event in to_send] == HIGHER_EVENTS[:1]
+    to_send = list(event_link.to_send_all())
+    assert [event.data for event in to_send] == HIGHER_EVENTS[1:]
+
+
+def test_event_link_priority():
+    """Exercise EventLink's priority lanes."""
+    print('Testing Event Link with priority lanes:')
+    event_link = EventLink(
+        priority_classifier=control_first, receiver_event_passthrough=True
+    )
+    for event in LOWER_EVENTS:
+        event_link.to_receive(event)
+    event_link.to_receive(LinkException(ValueError('foo')))
+    received = list(event_link.receive_all())
+    assert isinstance(received[0], LinkException)
+    assert received[1:] == LOWER_EVENTS
+
+    event_link = EventLink(priority_classifier=lambda event: 0 if event.data == 'ack' else 1)
+    for event in HIGHER_EVENTS + ['ack']:
+        event_link.send(event)
+    assert [event.data for event in event_link.to_send_all()] == ['ack'] + HIGHER_EVENTS
+    event_link.send('ack')
+    event_link.reset()
+    assert not event_link.has_to_send()
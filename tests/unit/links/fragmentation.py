@@ -0,0 +1,118 @@
+"""Test the links.fragmentation module."""
+
+# Builtins
+
+# Packages
+
+from phylline.links.clocked import LinkClockRequest
+from phylline.links.events import LinkData, LinkException
+from phylline.links.fragmentation import FRAGMENT_HEADER, FragmentationLink
+from phylline.util.buffers import BufferPool
+
+import pytest
+
+from tests.unit.links.clocked import assert_clock_request_event_received
+
+
+PAYLOAD = bytes(range(256)) * 4
+
+
+def fragment(payload, mtu=64):
+    """Return the fragments sent by a FragmentationLink for the payload."""
+    fragmentation_link = FragmentationLink(mtu=mtu)
+    fragmentation_link.send(payload)
+    return [event.data for event in fragmentation_link.to_send_all()]
+
+
+def test_fragmentation_link():
+    """Exercise FragmentationLink's interface."""
+    print('Testing Fragmentation Link:')
+    with pytest.raises(ValueError):
+        FragmentationLink(mtu=FRAGMENT_HEADER.size)
+    with pytest.raises(ValueError):
+        FragmentationLink(max_message_size=1024, buffer_pool=BufferPool(buffer_size=512))
+
+    fragments = fragment(PAYLOAD)
+    assert len(fragments) == 20  # 52 bytes of payload per fragment
+    assert all(len(fragment) <= 64 for fragment in fragments)
+    assert fragment(b'foo') == [FRAGMENT_HEADER.pack(0, 3, 0) + b'foo']
+
+    fragmentation_link = FragmentationLink(mtu=64)
+    for data in reversed(fragments):
+        assert not fragmentation_link.has_receive()
+        fragmentation_link.to_receive(data)
+        for event in fragmentation_link.receive_all():
+            if not isinstance(event, LinkClockRequest):
+                assert event.data == PAYLOAD
+    assert fragmentation_link.stats['reassembled'] == 1
+    assert fragmentation_link.reassembling == 0
+    fragmentation_link.to_receive(fragments[0])  # a late duplicate of a completed payload
+    assert fragmentation_link.stats['duplicates'] == 1
+    assert fragmentation_link.reassembling == 0
+
+    fragmentation_link = FragmentationLink(mtu=64, completed_history=0)
+    fragmentation_link.to_receive(fragments[0])
+    fragmentation_link.to_receive(fragments[0])
+    fragmentation_link.to_receive(b'foo')
+    fragmentation_link.to_receive(FRAGMENT_HEADER.pack(1, 2, 0) + b'foo')
+    assert fragmentation_link.stats['duplicates'] == 1
+    assert fragmentation_link.stats['malformed'] == 2
+    for data in fragments[1:]:
+        fragmentation_link.to_receive(data)
+    received = [
+        event for event in fragmentation_link.receive_all()
+        if not isinstance(event, LinkClockRequest)
+    ]
+    assert [event.data for event in received] == [PAYLOAD]
+
+    fragmentation_link = FragmentationLink(mtu=64, max_message_size=16)
+    fragmentation_link.send(b'Hello, world! Hello, world!')
+    assert not fragmentation_link.has_to_send()
+    received = list(fragmentation_link.receive_all())
+    assert len(received) == 1
+    assert isinstance(received[0], LinkException)
+
+
+def test_fragmentation_link_reassembly_limits():
+    """Exercise FragmentationLink's reassembly timeout and concurrency cap."""
+    print('Testing Fragmentation Link reassembly limits:')
+    fragmentation_link = FragmentationLink(mtu=64, max_reassemblies=2, reassembly_timeout=1.0)
+    fragments = fragment(PAYLOAD)
+    fragmentation_link.to_receive(fragments[0])
+    assert_clock_request_event_received(fragmentation_link, 1.0)
+    assert fragmentation_link.next_clock_request == 1.0
+    fragmentation_link.update_clock(0.5)
+    fragmentation_link.to_receive(fragments[1])
+    assert not fragmentation_link.has_receive()
+    fragmentation_link.update_clock(1.0)
+    assert fragmentation_link.reassembling == 0
+    assert fragmentation_link.stats['timed_out'] == 1
+    assert fragmentation_link.next_clock_request is None
+    assert len(fragmentation_link.buffer_pool) == 2
+
+    for message_id in range(3):
+        fragmentation_link.to_receive(
+            FRAGMENT_HEADER.pack(message_id, 6, 0) + b'foo'
+        )
+    assert fragmentation_link.reassembling == 2
+    assert fragmentation_link.stats['evicted'] == 1
+    fragmentation_link.to_receive(FRAGMENT_HEADER.pack(0, 6, 3) + b'bar')
+    fragmentation_link.to_receive(FRAGMENT_HEADER.pack(2, 6, 3) + b'bar')
+    received = [
+        event for event in fragmentation_link.receive_all()
+        if isinstance(event, LinkData)
+    ]
+    assert [event.data for event in received] == [b'foobar']
+
+    fragmentation_link.reset()
+    assert fragmentation_link.reassembling == 0
+    assert fragmentation_link.stats['evicted'] == 0
+    assert len(fragmentation_link.buffer_pool) == 2
+
+    fragmentation_link = FragmentationLink(
+        mtu=64, reassembly_timeout=2, clock_resolution=1e-9
+    )
+    fragmentation_link.to_receive(fragments[0])
+    requested_time = fragmentation_link.next_clock_request.requested_time
+    assert requested_time == 2
+    assert isinstance(requested_time, int)
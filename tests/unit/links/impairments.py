@@ -0,0 +1,94 @@
+"""Test the links.impairments module."""
+
+# Builtins
+
+# Packages
+
+from phylline.links.clocked import LinkClockRequest
+from phylline.links.impairments import Impairment, ImpairmentLink
+
+from tests.unit.links.streams import HIGHER_EVENTS, LOWER_EVENTS
+
+
+def test_impairment_link_unimpaired():
+    """Exercise ImpairmentLink's passthrough without impairments."""
+    print('Testing Impairment Link without impairments:')
+    impairment_link = ImpairmentLink()
+    for event in LOWER_EVENTS:
+        impairment_link.to_receive(event)
+    assert [event.data for event in impairment_link.receive_all()] == LOWER_EVENTS
+    for event in HIGHER_EVENTS:
+        impairment_link.send(event)
+    assert [event.data for event in impairment_link.to_send_all()] == HIGHER_EVENTS
+
+
+def test_impairment_link_loss_duplication():
+    """Exercise ImpairmentLink's loss and duplication."""
+    print('Testing Impairment Link with loss and duplication:')
+    impairment_link = ImpairmentLink(
+        receive_impairment=Impairment(loss=1.0),
+        send_impairment=Impairment(duplication=1.0)
+    )
+    for event in LOWER_EVENTS:
+        impairment_link.to_receive(event)
+    assert not impairment_link.has_receive()
+    assert impairment_link.stats['up']['dropped'] == len(LOWER_EVENTS)
+    for event in HIGHER_EVENTS:
+        impairment_link.send(event)
+    assert [event.data for event in impairment_link.to_send_all()] == [
+        event for event in HIGHER_EVENTS for _ in range(2)
+    ]
+    assert impairment_link.stats['down']['duplicated'] == len(HIGHER_EVENTS)
+
+
+def test_impairment_link_bandwidth():
+    """Exercise ImpairmentLink's bandwidth limit and clock requests."""
+    print('Testing Impairment Link with a bandwidth limit:')
+    impairment_link = ImpairmentLink(
+        send_impairment=Impairment(delay=0.5, bandwidth=4.0)
+    )
+    for event in LOWER_EVENTS:  # 4, 4 and 7 bytes long
+        impairment_link.send(event)
+    to_send = list(impairment_link.to_send_all())
+    assert len(to_send) == 1
+    assert isinstance(to_send[0], LinkClockRequest)
+    assert to_send[0].requested_time == 1.5
+    for (clock_time, expected_data, next_request) in [
+        (1.0, [], None), (1.5, LOWER_EVENTS[:1], 2.5),
+        (2.5, LOWER_EVENTS[1:2], 4.25), (4.25, LOWER_EVENTS[2:], None)
+    ]:
+        impairment_link.update_clock(clock_time)
+        to_send = list(impairment_link.to_send_all())
+        assert [event.data for event in to_send if hasattr(event, 'data')] == expected_data
+        clock_requests = [
+            event.requested_time for event in to_send
+            if isinstance(event, LinkClockRequest)
+        ]
+        assert clock_requests == ([next_request] if next_request is not None else [])
+
+
+def test_impairment_link_seeded():
+    """Exercise ImpairmentLink's reproducible random impairments."""
+    print('Testing Impairment Link with seeded random impairments:')
+    impairment = Impairment(
+        loss=0.2, duplication=0.1, reordering=0.3, reorder_delay=1.0,
+        delay=0.1, jitter=0.05, seed=42
+    )
+    results = []
+    for _ in range(2):
+        impairment_link = ImpairmentLink(receive_impairment=impairment)
+        for i in range(200):
+            impairment_link.update_clock(i * 0.01)
+            impairment_link.to_receive(i)
+        impairment_link.update_clock(10.0)
+        results.append([
+            event.data for event in impairment_link.receive_all()
+            if not isinstance(event, LinkClockRequest)
+        ])
+        stats = impairment_link.stats['up']
+        assert 0 < stats['dropped'] < 200
+        assert 0 < stats['duplicated'] < 200
+        assert 0 < stats['reordered'] < 200
+        assert len(results[-1]) == 200 - stats['dropped'] + stats['duplicated']
+    assert results[0] == results[1]
+    assert results[0] != sorted(results[0])
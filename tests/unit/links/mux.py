@@ -0,0 +1,111 @@
+"""Test the links.mux module."""
+
+# Builtins
+
+# Packages
+
+from phylline.links.events import EventLink, LinkData, LinkException
+from phylline.links.mux import DemuxLink, MuxLink
+from phylline.pipes import AutomaticPipe, ManualPipe
+
+import pytest
+
+
+def header_channel(data_event):
+    """Return the channel from the first byte of the data."""
+    return data_event.data[0]
+
+
+def add_header(data, channel):
+    """Prepend a channel header to the data."""
+    return bytes([channel]) + data
+
+
+def strip_header(data, channel):
+    """Remove the channel header from the data."""
+    return data[1:]
+
+
+def test_mux_link_context():
+    """Exercise DemuxLink and MuxLink's interface with channels in contexts."""
+    print('Testing Demux Link with channels in contexts:')
+    demux_link = DemuxLink()
+    mux_links = {channel: MuxLink(demux_link, channel) for channel in ['a', 'b']}
+    demux_link.to_receive(LinkData(b'foo', context={'channel': 'a'}))
+    demux_link.to_receive(LinkData(b'bar', context={'channel': 'b'}))
+    demux_link.to_receive(LinkData(b'baz', context={'channel': 'a'}))
+    demux_link.to_receive(LinkData(b'qux', context={'channel': 'c'}))
+    assert [event.data for event in mux_links['a'].receive_all()] == [b'foo', b'baz']
+    assert [event.data for event in mux_links['b'].receive_all()] == [b'bar']
+    assert [event.data for event in demux_link.receive_all()] == [b'qux']
+    assert demux_link.stats['unroutable'] == 1
+
+    mux_links['b'].send(b'Hello,')
+    mux_links['a'].send(b'world!')
+    assert not mux_links['a'].has_to_send()
+    sent = list(demux_link.to_send_all())
+    assert [event.data for event in sent] == [b'Hello,', b'world!']
+    assert [event.context['channel'] for event in sent] == ['b', 'a']
+
+    demux_link.to_receive(LinkException(ValueError('foo')))
+    for mux_link in mux_links.values():
+        received = list(mux_link.receive_all())
+        assert len(received) == 1
+        assert isinstance(received[0], LinkException)
+
+    with pytest.raises(ValueError):
+        MuxLink(demux_link, 'a')
+    mux_links['a'].close()
+    demux_link.to_receive(LinkData(b'foo', context={'channel': 'a'}))
+    assert not mux_links['a'].has_receive()
+    assert demux_link.stats['unroutable'] == 2
+
+
+def test_mux_link_header():
+    """Exercise DemuxLink and MuxLink's interface with channel headers."""
+    print('Testing Demux Link with channel headers:')
+    demux_link = DemuxLink(key=header_channel, tag=add_header, untag=strip_header)
+    channel_links = {channel: EventLink() for channel in range(64)}
+    pipes = [
+        AutomaticPipe(MuxLink(demux_link, channel), channel_link)
+        for (channel, channel_link) in channel_links.items()
+    ]
+    for channel in [3, 63, 3]:
+        demux_link.to_receive(bytes([channel]) + b'foo')
+    assert [event.data for event in channel_links[3].receive_all()] == [b'foo', b'foo']
+    assert [event.data for event in channel_links[63].receive_all()] == [b'foo']
+    for channel_link in channel_links.values():
+        assert not channel_link.has_receive()
+
+    channel_links[5].send(b'bar')
+    assert [event.data for event in demux_link.to_send_all()] == [b'\x05bar']
+    assert len(pipes) == 64
+
+
+def test_mux_link_manual_pipe():
+    """Exercise DemuxLink and MuxLink in manually synchronized pipes."""
+    print('Testing Demux Link in Manual Pipes:')
+    transport_link = EventLink()
+    demux_link = DemuxLink(key=header_channel, tag=add_header, untag=strip_header)
+    lower_pipe = ManualPipe(transport_link, demux_link)
+    channel_links = [EventLink() for _ in range(2)]
+    channel_pipes = [
+        ManualPipe(MuxLink(demux_link, channel), channel_link)
+        for (channel, channel_link) in enumerate(channel_links)
+    ]
+    transport_link.to_receive(b'\x01foo')
+    transport_link.to_receive(b'\x00bar')
+    lower_pipe.sync()
+    for pipe in channel_pipes:
+        pipe.sync()
+    assert [event.data for event in channel_links[0].receive_all()] == [b'bar']
+    assert [event.data for event in channel_links[1].receive_all()] == [b'foo']
+
+    channel_links[1].send(b'Hello,')
+    channel_links[0].send(b'world!')
+    for pipe in channel_pipes:
+        pipe.sync()
+    lower_pipe.sync()
+    assert [event.data for event in transport_link.to_send_all()] == [
+        b'\x00world!', b'\x01Hello,'
+    ]
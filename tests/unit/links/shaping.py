@@ -0,0 +1,112 @@
+"""Test the links.shaping module."""
+
+# Builtins
+
+# Packages
+
+from phylline.links.clocked import LinkClockRequest
+from phylline.links.events import LinkException
+from phylline.links.shaping import RateLimit, RateLimitedLink
+
+from tests.unit.links.streams import HIGHER_EVENTS, LOWER_EVENTS
+
+
+def split_clock_requests(events):
+    """Split events into the data of the data events and the times of the clock requests."""
+    events = list(events)
+    return (
+        [event.data for event in events if not isinstance(event, LinkClockRequest)],
+        [event.requested_time for event in events if isinstance(event, LinkClockRequest)]
+    )
+
+
+def test_rate_limited_link_unlimited():
+    """Exercise RateLimitedLink's passthrough without rate limits."""
+    print('Testing Rate Limited Link without rate limits:')
+    rate_limited_link = RateLimitedLink()
+    for event in LOWER_EVENTS:
+        rate_limited_link.to_receive(event)
+    assert [event.data for event in rate_limited_link.receive_all()] == LOWER_EVENTS
+    for event in HIGHER_EVENTS:
+        rate_limited_link.send(event)
+    assert [event.data for event in rate_limited_link.to_send_all()] == HIGHER_EVENTS
+
+
+def test_rate_limited_link_events():
+    """Exercise RateLimitedLink's events budget."""
+    print('Testing Rate Limited Link with an events budget:')
+    rate_limited_link = RateLimitedLink(
+        send_limit=RateLimit(events_rate=2.0, event_burst=2)
+    )
+    for event in LOWER_EVENTS:
+        rate_limited_link.send(event)
+    assert split_clock_requests(rate_limited_link.to_send_all()) == (LOWER_EVENTS[:2], [0.5])
+    assert rate_limited_link.queued('down') == 1
+    rate_limited_link.update_clock(0.4)
+    assert split_clock_requests(rate_limited_link.to_send_all()) == ([], [])
+    rate_limited_link.update_clock(0.5)
+    assert split_clock_requests(rate_limited_link.to_send_all()) == (LOWER_EVENTS[2:], [])
+    assert rate_limited_link.queued('down') == 0
+    assert split_clock_requests(rate_limited_link.receive_all()) == ([], [])
+
+
+def test_rate_limited_link_bytes():
+    """Exercise RateLimitedLink's bytes budget."""
+    print('Testing Rate Limited Link with a bytes budget:')
+    rate_limited_link = RateLimitedLink(
+        receive_limit=RateLimit(bytes_rate=4.0, byte_burst=6)
+    )
+    for event in LOWER_EVENTS:  # 4, 4 and 7 bytes long
+        rate_limited_link.to_receive(event)
+    # 6 - 4 = 2 bytes left, and 2 more bytes are needed after 0.5
+    assert split_clock_requests(rate_limited_link.receive_all()) == (LOWER_EVENTS[:1], [0.5])
+    rate_limited_link.update_clock(0.5)
+    # 7 bytes exceeds the burst, so wait for a full budget of 6 bytes after 1.5 more
+    assert split_clock_requests(rate_limited_link.receive_all()) == (LOWER_EVENTS[1:2], [2.0])
+    rate_limited_link.update_clock(2.0)
+    assert split_clock_requests(rate_limited_link.receive_all()) == (LOWER_EVENTS[2:], [])
+
+
+def test_rate_limited_link_integer():
+    """Exercise RateLimitedLink's budgets with an integer clock."""
+    print('Testing Rate Limited Link with an integer clock:')
+    rate_limited_link = RateLimitedLink(
+        send_limit=RateLimit(events_rate=0.4, event_burst=1), clock_resolution=1e-9
+    )
+    assert rate_limited_link.clock.time == 0
+    for event in LOWER_EVENTS[:2]:
+        rate_limited_link.send(event)
+    (sent, requested_times) = split_clock_requests(rate_limited_link.to_send_all())
+    assert sent == LOWER_EVENTS[:1]
+    assert requested_times == [3]  # 2.5 ticks, rounded up
+    assert isinstance(requested_times[0], int)
+    rate_limited_link.update_clock(2)
+    assert split_clock_requests(rate_limited_link.to_send_all()) == ([], [])
+    rate_limited_link.update_clock(3)
+    assert split_clock_requests(rate_limited_link.to_send_all()) == (LOWER_EVENTS[1:2], [])
+
+
+def test_rate_limited_link_overflow():
+    """Exercise RateLimitedLink's bounded queues."""
+    print('Testing Rate Limited Link with queue overflow:')
+    rate_limited_link = RateLimitedLink(
+        receive_limit=RateLimit(events_rate=1.0, queue_size=1),
+        send_limit=RateLimit(events_rate=1.0, queue_size=1)
+    )
+    for event in LOWER_EVENTS:
+        rate_limited_link.to_receive(event)
+    received = list(rate_limited_link.receive_all())
+    assert received[0].data == LOWER_EVENTS[0]
+    assert isinstance(received[1], LinkClockRequest)
+    assert isinstance(received[2], LinkException)
+    assert isinstance(received[2].exception, BufferError)
+    assert rate_limited_link.stats['up']['dropped'] == 1
+    for event in LOWER_EVENTS:
+        rate_limited_link.send(event)
+    assert [event.data for event in rate_limited_link.to_send_all()] == LOWER_EVENTS[:1]
+    received = list(rate_limited_link.receive_all())
+    assert len(received) == 1
+    assert isinstance(received[0], LinkException)
+    assert rate_limited_link.stats['down']['dropped'] == 1
+    rate_limited_link.update_clock(1.0)
+    assert [event.data for event in rate_limited_link.to_send_all()] == LOWER_EVENTS[1:2]
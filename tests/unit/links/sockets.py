@@ -0,0 +1,187 @@
+"""Test the links.sockets module."""
+
+# Builtins
+
+import socket
+
+# Packages
+
+from phylline.links.events import EventLink, LinkData
+from phylline.links.links import ChunkedStreamLink
+from phylline.links.sockets import DatagramSocketLink, StreamSocketLink
+from phylline.pipelines import AutomaticPipeline
+from phylline.util.buffers import BufferPool
+
+import pytest
+
+from tests.unit.links.links import HIGHER_CHUNKED_STREAM, LOWER_CHUNKED_STREAM
+from tests.unit.links.streams import HIGHER_BUFFERS, LOWER_BUFFERS
+
+
+def make_tcp_pair():
+    """Make a pair of connected TCP sockets on the loopback interface."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    client = socket.create_connection(listener.getsockname())
+    (server, _) = listener.accept()
+    listener.close()
+    return (client, server)
+
+
+def make_unix_pair():
+    """Make a pair of connected Unix-domain stream sockets."""
+    return socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+
+
+@pytest.mark.parametrize('socket_pair_factory', [make_tcp_pair, make_unix_pair])
+def test_stream_socket_link(socket_pair_factory):
+    """Exercise StreamSocketLink's interface."""
+    print('Testing Stream Socket Link with {}:'.format(socket_pair_factory.__name__))
+    (local, remote) = socket_pair_factory()
+    remote.settimeout(1.0)
+    stream_socket_link = StreamSocketLink(local, buffer_pool=BufferPool(buffer_size=4))
+    try:
+        # Read
+        remote.sendall(b'foo,bar,foobar!')
+        received = b''
+        while len(received) < len(b'foo,bar,foobar!'):
+            stream_socket_link.read_socket()
+            received += stream_socket_link.read()
+        assert received == b'foo,bar,foobar!'
+        assert len(stream_socket_link.buffer_pool) == 4
+
+        # Write
+        for buffer in HIGHER_BUFFERS:
+            stream_socket_link.write(buffer)
+        assert stream_socket_link.has_write_socket()
+        assert stream_socket_link.write_socket() == len(b'Hello,world!')
+        assert not stream_socket_link.has_write_socket()
+        assert remote.recv(1024) == b'Hello,world!'
+
+        # EOF
+        remote.close()
+        assert stream_socket_link.read_socket() == 0
+        assert stream_socket_link.eof
+    finally:
+        stream_socket_link.close()
+        remote.close()
+
+
+def test_stream_socket_link_partial_writes():
+    """Exercise StreamSocketLink's retention of partially written bytes."""
+    print('Testing Stream Socket Link with partial writes:')
+    (local, remote) = make_unix_pair()
+    remote.settimeout(1.0)
+    stream_socket_link = StreamSocketLink(local)
+    payload = bytes(range(256)) * 8192
+    try:
+        for i in range(0, len(payload), 1000):
+            stream_socket_link.write(payload[i:i + 1000])
+        received = bytearray()
+        sent = stream_socket_link.write_socket()
+        assert sent < len(payload)
+        assert stream_socket_link.pending_write_bytes == len(payload) - sent
+        while len(received) < len(payload):
+            received.extend(remote.recv(65536))
+            stream_socket_link.write_socket()
+        assert not stream_socket_link.has_write_socket()
+        assert received == payload
+    finally:
+        stream_socket_link.close()
+        remote.close()
+
+
+def test_stream_socket_link_pipeline():
+    """Exercise StreamSocketLink at the bottom of an AutomaticPipeline."""
+    print('Testing Stream Socket Link in an Automatic Pipeline:')
+    (local, remote) = make_unix_pair()
+    remote.settimeout(1.0)
+    pipeline = AutomaticPipeline(StreamSocketLink(local), ChunkedStreamLink())
+    try:
+        remote.sendall(LOWER_CHUNKED_STREAM)
+        received = []
+        while len(received) < len(LOWER_BUFFERS):
+            pipeline.bottom.read_socket()
+            received.extend(event.data for event in pipeline.receive_all())
+        assert received == LOWER_BUFFERS
+        for buffer in HIGHER_BUFFERS:
+            pipeline.send(buffer)
+        pipeline.bottom.write_socket()
+        assert remote.recv(1024) == HIGHER_CHUNKED_STREAM
+    finally:
+        pipeline.bottom.close()
+        remote.close()
+
+
+def test_stream_socket_link_paused():
+    """Exercise StreamSocketLink's pausing by an AutomaticPipeline's flow control."""
+    print('Testing Stream Socket Link paused by an Automatic Pipeline:')
+    (local, remote) = make_unix_pair()
+    remote.settimeout(1.0)
+    pipeline = AutomaticPipeline(
+        StreamSocketLink(local, paused=lambda: pipeline.paused), ChunkedStreamLink(),
+        EventLink(), receive_credits=0, receive_buffer_limit=1
+    )
+    chunk_length = LOWER_CHUNKED_STREAM.index(b'\0', 1) + 1  # the first chunk
+    try:
+        remote.sendall(LOWER_CHUNKED_STREAM[:chunk_length])
+        for _ in range(100):
+            pipeline.bottom.read_socket()
+            if pipeline.paused:
+                break
+        assert pipeline.bottom.paused
+        remote.sendall(LOWER_CHUNKED_STREAM[chunk_length:])
+        assert pipeline.bottom.read_socket() == 0  # the rest stays in the socket
+        assert not list(pipeline.receive_all())
+
+        pipeline.grant(len(LOWER_BUFFERS))
+        assert not pipeline.bottom.paused
+        received = [event.data for event in pipeline.receive_all()]
+        for _ in range(100):
+            if len(received) == len(LOWER_BUFFERS):
+                break
+            pipeline.bottom.read_socket()
+            received.extend(event.data for event in pipeline.receive_all())
+        assert received == LOWER_BUFFERS
+        assert pipeline.credit_pipe.stats['dropped'] == 0
+
+        pipeline.bottom.paused = True
+        remote.sendall(LOWER_CHUNKED_STREAM)
+        assert pipeline.bottom.read_socket() == 0
+    finally:
+        pipeline.bottom.close()
+        remote.close()
+
+
+def test_datagram_socket_link():
+    """Exercise DatagramSocketLink's interface."""
+    print('Testing Datagram Socket Link:')
+    local = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    local.bind(('127.0.0.1', 0))
+    remote = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    remote.bind(('127.0.0.1', 0))
+    remote.settimeout(1.0)
+    datagram_socket_link = DatagramSocketLink(local)
+    try:
+        for buffer in LOWER_BUFFERS:
+            remote.sendto(buffer, local.getsockname())
+        received = []
+        while len(received) < len(LOWER_BUFFERS):
+            datagram_socket_link.read_socket()
+            received.extend(datagram_socket_link.receive_all())
+        assert [event.data for event in received] == LOWER_BUFFERS
+        assert received[0].context['address'] == remote.getsockname()
+
+        for buffer in HIGHER_BUFFERS:
+            datagram_socket_link.send(
+                LinkData(buffer, context={'address': remote.getsockname()})
+            )
+        assert datagram_socket_link.has_write_socket()
+        assert datagram_socket_link.write_socket() == len(HIGHER_BUFFERS)
+        assert not datagram_socket_link.has_write_socket()
+        for buffer in HIGHER_BUFFERS:
+            assert remote.recv(1024) == buffer
+    finally:
+        datagram_socket_link.close()
+        remote.close()
@@ -5,6 +5,7 @@
 # Packages
 
 from phylline.links.streams import StreamLink
+from phylline.util.timing import Clock
 
 
 LOWER_EVENTS = ['foo,', 'bar,', 'foobar!']
@@ -27,3 +28,51 @@ def test_stream_link():
         stream_link.write(buffer)
     result = stream_link.to_write()
     assert result == HIGHER_STREAM
+
+
+def test_stream_link_bounded():
+    """Exercise StreamLink's bounded partial drains."""
+    print('Testing Stream Link with bounded drains:')
+    stream_link = StreamLink()
+    for buffer in LOWER_BUFFERS:
+        stream_link.to_read(buffer)
+    assert stream_link.read(max_bytes=0) == b''
+    assert stream_link.read(max_bytes=6) == b'foo,ba'
+    assert stream_link.read(max_bytes=100) == b'r,foobar!'
+    for buffer in HIGHER_BUFFERS:
+        stream_link.write(buffer)
+    assert stream_link.to_write(max_bytes=0) == b''
+    assert stream_link.to_write(max_bytes=4) == b'Hell'
+    assert stream_link.to_write(max_bytes=4) == b'o,wo'
+    assert stream_link.to_write() == b'rld!'
+
+
+def test_stream_link_latency():
+    """Exercise StreamLink's latency recording."""
+    print('Testing Stream Link latency recording:')
+    clock = Clock(time=0.0)
+    stream_link = StreamLink()
+    assert stream_link.latency_report() is None
+    stream_link.to_read(LOWER_BUFFERS[0])  # buffered before recording, so not recorded
+    stream_link.record_latency(clock=clock)
+    for (time, buffer) in zip([1.0, 2.0], LOWER_BUFFERS[1:]):
+        clock.update(time)
+        stream_link.to_read(buffer)
+    clock.update(3.0)
+    assert stream_link.read(max_bytes=6) == b'foo,ba'
+    assert len(stream_link.latency['receive_queueing']) == 0
+    clock.update(4.0)
+    assert stream_link.read() == b'r,foobar!'
+    histogram = stream_link.latency['receive_queueing']
+    assert (histogram.min, histogram.max) == (2.0, 3.0)
+    assert len(stream_link.latency['receive_processing']) == 2
+
+    stream_link.reset()  # discarded buffers are not recorded
+    stream_link.write(HIGHER_BUFFERS[0])
+    stream_link.reset()
+    stream_link.write(HIGHER_BUFFERS[1])
+    clock.update(5.0)
+    assert stream_link.to_write() == HIGHER_BUFFERS[1]
+    report = stream_link.latency_report(percentiles=(50,))
+    assert report['send_queueing']['count'] == 1
+    assert report['send_queueing']['p50'] == 1.0
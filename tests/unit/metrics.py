@@ -0,0 +1,94 @@
+"""Test the metrics module."""
+
+# Builtins
+
+import urllib.request
+
+# Packages
+
+from phylline.links.clocked import DelayedEventLink
+from phylline.links.events import EventLink, LinkException
+from phylline.metrics import MetricsRegistry
+from phylline.pipelines import AutomaticPipeline, ManualPipeline
+
+from tests.unit.links.streams import HIGHER_EVENTS, LOWER_EVENTS
+
+
+def test_metrics_manual_pipeline():
+    """Exercise MetricsRegistry's interface with a ManualPipeline."""
+    print('Testing Metrics Registry with a Manual Pipeline:')
+    registry = MetricsRegistry()
+    pipeline = ManualPipeline(
+        EventLink(name='bottom'), DelayedEventLink(receive_delay=1.0), EventLink(name='top'),
+        name='manual'
+    )
+    registry.instrument_pipeline(pipeline)
+    for event in LOWER_EVENTS:  # 4, 4 and 7 bytes long
+        pipeline.to_receive(event)
+    pipeline.to_receive(LinkException(ValueError('foo')))
+    metrics = registry.to_dict()['manual']
+    assert metrics['bottom']['events_in'] == 4
+    assert metrics['bottom']['bytes_in'] == 15
+    assert metrics['bottom']['events_out'] == 4
+    assert metrics['bottom']['exceptions'] == 1
+    assert metrics['bottom']['receive_queue_depth'] == 4
+
+    pipeline.sync()
+    metrics = registry.to_dict()['manual']
+    assert metrics['bottom']['receive_queue_depth'] == 0
+    assert metrics['DelayedEventLink']['events_in'] == 4
+    assert metrics['DelayedEventLink']['clock_requests'] == 1
+    assert metrics['top']['events_in'] == 0
+    pipeline.update_clock(1.0)
+    assert [event.data for event in pipeline.receive_all()] == LOWER_EVENTS
+    metrics = registry.to_dict()['manual']
+    assert metrics['DelayedEventLink']['events_out'] == 4
+    assert metrics['top']['events_out'] == 3
+    assert metrics['top']['bytes_out'] == 15
+
+    registry.reset()
+    assert registry.get('manual', 'top').events_out == 0
+
+
+def test_metrics_prometheus(tmp_path):
+    """Exercise MetricsRegistry's Prometheus exposition text."""
+    print('Testing Metrics Registry Prometheus export:')
+    registry = MetricsRegistry()
+    pipeline = AutomaticPipeline(
+        EventLink(name='bottom'), EventLink(name='top'), name='auto', receive_credits=0
+    )
+    registry.instrument_pipeline(pipeline)
+    pipeline.send(HIGHER_EVENTS[0])
+    pipeline.to_receive(LOWER_EVENTS[0])
+    metrics = registry.to_dict()['auto']
+    assert metrics['top']['events_in'] == 1
+    assert metrics['bottom']['events_out'] == 2
+    assert metrics['top']['events_out'] == 1
+
+    text = registry.to_prometheus()
+    assert '# TYPE phylline_link_events_in_total counter' in text
+    assert 'phylline_link_events_in_total{pipeline="auto",link="bottom"} 2' in text
+    assert 'phylline_link_send_queue_depth{pipeline="auto",link="bottom"} 1' in text
+    assert 'phylline_pipe_stat{pipeline="auto",pipe="0",stat="receive_buffered"} 1' in text
+    assert text.endswith('\n')
+
+    path = tmp_path / 'phylline.prom'
+    registry.write_prometheus(str(path))
+    assert path.read_text() == text
+
+    server = registry.serve_prometheus(port=0)
+    try:
+        url = 'http://{}:{}/metrics'.format(*server.server_address)
+        with urllib.request.urlopen(url) as response:
+            assert response.read().decode('utf-8') == text
+        pipeline.send(HIGHER_EVENTS[1])
+        with urllib.request.urlopen(url) as response:
+            assert response.read().decode('utf-8') == text
+        updated_text = registry.snapshot()
+        assert updated_text != text
+        assert 'phylline_link_events_in_total{pipeline="auto",link="top"} 2' in updated_text
+        with urllib.request.urlopen(url) as response:
+            assert response.read().decode('utf-8') == updated_text
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -4,13 +4,17 @@
 
 # Packages
 
-from phylline.links.clocked import DelayedEventLink
+from phylline.links.clocked import ClockedLink, CoalescingStreamLink, DelayedEventLink
+from phylline.links.clocked import LinkClockRequest, LinkClockTime
 from phylline.links.events import EventLink
 from phylline.links.links import ChunkedStreamLink
 from phylline.links.loopback import TopLoopbackLink
 from phylline.links.streams import StreamLink
 from phylline.pipelines import AutomaticPipeline, ManualPipeline, PipelineBottomCoupler
+from phylline.pipelines import PipelineGraph, PipelinePool
 from phylline.pipes import AutomaticPipe
+from phylline.processors import event_processor, receive
+from phylline.util.timing import Clock
 
 import pytest
 
@@ -230,6 +234,323 @@ def test_automatic_pipeline_clocked():
     assert result == HIGHER_CHUNKED_STREAM
 
 
+@pytest.mark.parametrize('pipeline_type', [AutomaticPipeline, ManualPipeline])
+def test_pipeline_reset(pipeline_type):
+    """Exercise Pipeline's reset to its initial state."""
+    print('Testing {} reset:'.format(pipeline_type.__qualname__))
+    pipeline = make_pipeline_delayed(pipeline_type)
+    write_bottom_chunked_buffers(pipeline.bottom)
+    write_top_events(pipeline.top)
+    if pipeline_type is ManualPipeline:
+        pipeline.sync()
+    pipeline.update_clock(0.5)
+    assert pipeline.next_clock_request is not None
+    pipeline.bottom.to_read(b'\0incomplete')
+
+    pipeline.reset()
+    assert pipeline.next_clock_request is None
+    assert pipeline.layers[2].clock.time == 0.0
+    assert not pipeline.top.has_receive()
+    assert not pipeline.bottom.to_write()
+
+    write_bottom_chunked_buffers(pipeline.bottom)
+    if pipeline_type is ManualPipeline:
+        pipeline.sync()
+    pipeline.update_clock(1.0)
+    assert_bottom_events(pipeline.top)
+
+
+def test_pipeline_pool():
+    """Exercise PipelinePool's interface."""
+    print('Testing Pipeline Pool:')
+    built = []
+
+    def factory():
+        pipeline = make_pipeline_short(AutomaticPipeline)
+        built.append(pipeline)
+        return pipeline
+
+    pool = PipelinePool(factory, 2)
+    assert len(pool) == 2
+    pipelines = [pool.acquire() for _ in range(3)]
+    assert len(built) == 3
+    assert len(pool) == 0
+    write_bottom_chunked_buffers(pipelines[0].bottom)
+    for pipeline in pipelines:
+        pool.release(pipeline)
+    assert len(pool) == 2
+    pipeline = pool.acquire()
+    assert pipeline is pipelines[1]
+    pipeline = pool.acquire()
+    assert pipeline is pipelines[0]
+    assert not pipeline.top.has_receive()
+    write_bottom_chunked_buffers(pipeline.bottom)
+    assert_bottom_events(pipeline.top)
+    assert len(built) == 3
+
+
+def test_automatic_pipeline_credits():
+    """Exercise AutomaticPipeline's credit-based flow control."""
+    print('Testing Automatic Pipeline with credit-based flow control:')
+    pipeline = AutomaticPipeline(
+        EventLink(), EventLink(), EventLink(), receive_credits=2, receive_buffer_limit=8
+    )
+    for i in range(3):
+        pipeline.bottom.to_receive(i)
+    assert [event.data for event in pipeline.receive_all()] == [0, 1]
+    assert pipeline.paused
+    pipeline.grant(2)
+    assert not pipeline.paused
+    assert [event.data for event in pipeline.receive_all()] == [2]
+
+    # Events which arrive while paused are held, not lost
+    received = []
+    for i in range(3, 10):
+        pipeline.bottom.to_receive(i)
+        received.extend(event.data for event in pipeline.receive_all())
+    assert received == [3]
+    assert pipeline.paused
+    assert pipeline.credit_pipe.receive_buffered == 6
+    while pipeline.paused:
+        pipeline.grant(1)
+        received.extend(event.data for event in pipeline.receive_all())
+    assert received == list(range(3, 10))
+    assert pipeline.credit_pipe.stats['dropped'] == 0
+
+    with pytest.raises(ValueError):
+        AutomaticPipeline(StreamLink(), StreamLink(), receive_credits=1)
+
+
+def count_clock_processing(link, counts):
+    """Count the calls of the link's clock processing hooks."""
+    for hook in ('on_clock_receive', 'on_clock_send'):
+        def counted(hook=hook, method=getattr(link, hook)):
+            counts[hook] += 1
+            method()
+        setattr(link, hook, counted)
+
+
+@pytest.mark.parametrize('pipeline_type', [AutomaticPipeline, ManualPipeline])
+def test_pipeline_due_only_clock(pipeline_type):
+    """Exercise a pipeline's processing of only the links whose clock updates are due."""
+    print('Testing {} with due-only clock updates:'.format(pipeline_type.__name__))
+    fast_link = DelayedEventLink(receive_delay=1.0, send_delay=1.0)
+    slow_link = DelayedEventLink(receive_delay=2.0, send_delay=2.0)
+    pipeline = pipeline_type(fast_link, EventLink(), slow_link, EventLink())
+    fast_counts = {'on_clock_receive': 0, 'on_clock_send': 0}
+    slow_counts = {'on_clock_receive': 0, 'on_clock_send': 0}
+    count_clock_processing(fast_link, fast_counts)
+    count_clock_processing(slow_link, slow_counts)
+
+    pipeline.send(b'\1\2\3\4')
+    if pipeline_type is ManualPipeline:
+        pipeline.sync()
+    assert pipeline.next_clock_request == 2.0
+    for clock_time in [0.5, 1.0, 1.5]:
+        assert pipeline.update_clock(clock_time) == 2.0
+        assert fast_link.clock.time == clock_time
+        assert slow_link.clock.time == clock_time
+    assert fast_counts == {'on_clock_receive': 0, 'on_clock_send': 0}
+    assert slow_counts == {'on_clock_receive': 0, 'on_clock_send': 0}
+    assert pipeline.update_clock(2.0) == 3.0
+    assert fast_counts == {'on_clock_receive': 0, 'on_clock_send': 0}
+    assert slow_counts['on_clock_send'] > 0
+    assert pipeline.update_clock(2.5) == 3.0
+    to_send = [
+        event.data for event in pipeline.to_send_all()
+        if not isinstance(event, LinkClockRequest)
+    ]
+    assert to_send == []
+    assert pipeline.update_clock(3.0) is None
+    assert fast_counts['on_clock_send'] > 0
+    to_send = [
+        event.data for event in pipeline.to_send_all()
+        if not isinstance(event, LinkClockRequest)
+    ]
+    assert to_send == [b'\1\2\3\4']
+
+
+def test_pipeline_graph_fan_out():
+    """Exercise PipelineGraph's interface with links sharing a transport."""
+    print('Testing Pipeline Graph with fan-out:')
+    transport = ChunkedStreamLink()
+    channel_one = EventLink()
+    channel_two = EventLink()
+    graph = PipelineGraph((transport, channel_one), (transport, channel_two))
+    print(graph)
+    assert graph.bottoms == [transport]
+    assert graph.tops == [channel_one, channel_two]
+    assert not graph.clocked
+    write_bottom_chunked_buffers(transport)
+    assert graph.sync() is None
+    assert_bottom_events(channel_one)
+    assert_bottom_events(channel_two)
+    write_top_events(channel_two)
+    graph.sync()
+    assert transport.to_write() == HIGHER_CHUNKED_STREAM
+
+
+def test_pipeline_graph_diamond():
+    """Exercise PipelineGraph's sync order with a diamond of nested pipelines."""
+    print('Testing Pipeline Graph with a diamond:')
+    bottom = EventLink()
+    left = make_pipeline_events(ManualPipeline)
+    right = make_pipeline_events(ManualPipeline)
+    top = EventLink()
+    # Edges are given out of order, to be sorted topologically
+    graph = PipelineGraph((left, top), (bottom, left), (right, top), (bottom, right))
+    assert graph.nodes[0] is bottom
+    assert graph.nodes[-1] is top
+    sync_counts = {'sync_up': 0, 'sync_down': 0}
+    for pipeline in (left, right):
+        for method_name in sync_counts:
+            def counted(method_name=method_name, method=getattr(pipeline, method_name)):
+                sync_counts[method_name] += 1
+                method()
+            setattr(pipeline, method_name, counted)
+
+    bottom.to_receive(b'\1\2\3\4')
+    graph.sync()
+    assert [event.data for event in top.receive_all()] == [b'\1\2\3\4'] * 2
+    top.send(b'\5\6')
+    graph.sync()
+    assert [event.data for event in bottom.to_send_all()] == [b'\5\6'] * 2
+    assert sync_counts == {'sync_up': 4, 'sync_down': 4}  # once per pipeline per sync
+
+
+def test_pipeline_graph_nested_ends():
+    """Exercise PipelineGraph's syncing of nested pipelines at its top and bottom."""
+    print('Testing Pipeline Graph with nested pipelines at its ends:')
+    bottom = make_pipeline_events(ManualPipeline)
+    top = make_pipeline_events(ManualPipeline)
+    graph = PipelineGraph((EventLink(), top))
+    graph.bottoms[0].to_receive(b'\1\2\3\4')
+    graph.sync()
+    assert [event.data for event in top.receive_all()] == [b'\1\2\3\4']
+
+    graph = PipelineGraph((bottom, EventLink()))
+    graph.tops[0].send(b'\5\6')
+    graph.sync()
+    assert [event.data for event in bottom.to_send_all()] == [b'\5\6']
+
+
+def test_pipeline_graph_cycle():
+    """Exercise PipelineGraph's rejection of cycles."""
+    print('Testing Pipeline Graph with a cycle:')
+    links = [EventLink(), EventLink(), EventLink()]
+    with pytest.raises(ValueError):
+        PipelineGraph((links[0], links[1]), (links[1], links[2]), (links[2], links[1]))
+    with pytest.raises(NotImplementedError):
+        PipelineGraph()
+
+
+def test_pipeline_graph_clocked():
+    """Exercise PipelineGraph's clock functionality."""
+    print('Testing Pipeline Graph with clocked links:')
+    transport = EventLink()
+    delayed_link = DelayedEventLink()
+    channel_one = EventLink()
+    channel_two = EventLink()
+    graph = PipelineGraph(
+        (transport, delayed_link), (delayed_link, channel_one), (delayed_link, channel_two)
+    )
+    assert graph.clocked
+    assert graph.update_clock(0) is None
+    transport.to_receive(b'\1\2\3\4')
+    assert graph.sync() == 1.0
+    assert graph.update_clock(0.5) == 1.0
+    assert not channel_one.has_receive()
+    assert graph.update_clock(1.0) is None
+    assert [event.data for event in channel_one.receive_all()] == [b'\1\2\3\4']
+    assert [event.data for event in channel_two.receive_all()] == [b'\1\2\3\4']
+
+
+class InBandClockedLink(ClockedLink, EventLink):
+    """A ClockedLink which keeps the default in-band clock hooks."""
+
+    def __init__(self):
+        """Initialize members."""
+        super().__init__()
+        self.clock_times = []
+
+    @event_processor
+    def receiver_processor(self):
+        """Event receiver processor, which consumes clock times."""
+        while True:
+            event = yield from receive()
+            if isinstance(event, LinkClockTime):
+                self.clock_times.append(event.clock_time)
+            else:
+                yield from self.after_receive(event)
+
+    @event_processor
+    def sender_processor(self):
+        """Event sender processor, which consumes clock times."""
+        while True:
+            event = yield from receive()
+            if isinstance(event, LinkClockTime):
+                self.clock_times.append(event.clock_time)
+            else:
+                yield from self.after_send(event)
+
+
+def count_clock_advances(link, counts):
+    """Count the calls of the link's advance_clock method."""
+    def counted(time, method=link.advance_clock):
+        counts['advance_clock'] += 1
+        method(time)
+    link.advance_clock = counted
+
+
+@pytest.mark.parametrize('pipeline_type', [AutomaticPipeline, ManualPipeline])
+def test_pipeline_always_due_clock(pipeline_type):
+    """Exercise a pipeline's processing of links which are due on every clock update."""
+    print('Testing {} with always-due clocked links:'.format(pipeline_type.__name__))
+    in_band_link = InBandClockedLink()
+    delayed_link = DelayedEventLink(receive_delay=1.0, send_delay=1.0)
+    pipeline = pipeline_type(EventLink(), in_band_link, delayed_link, EventLink())
+    in_band_counts = {'on_clock_receive': 0, 'on_clock_send': 0, 'advance_clock': 0}
+    delayed_counts = {'on_clock_receive': 0, 'on_clock_send': 0, 'advance_clock': 0}
+    count_clock_processing(in_band_link, in_band_counts)
+    count_clock_processing(delayed_link, delayed_counts)
+    count_clock_advances(in_band_link, in_band_counts)
+    count_clock_advances(delayed_link, delayed_counts)
+    assert in_band_link.next_clock_request is None
+    assert in_band_link.clock_update_due(0.5)
+    assert not delayed_link.clock_update_due(0.5)
+
+    pipeline.update_clock(0.5)
+    assert in_band_counts['on_clock_receive'] > 0
+    assert in_band_counts['on_clock_send'] > 0
+    assert set(in_band_link.clock_times) == {0.5}
+    assert delayed_counts['on_clock_receive'] == 0
+    assert delayed_counts['on_clock_send'] == 0
+    if pipeline_type is AutomaticPipeline:
+        # Idle links shared between adjacent pipes are advanced only once
+        assert delayed_counts['advance_clock'] == 1
+
+
+def test_automatic_pipeline_coalescing():
+    """Exercise write coalescing at the bottom of an AutomaticPipeline."""
+    print('Testing Automatic Pipeline with write coalescing:')
+    pipeline = AutomaticPipeline(
+        CoalescingStreamLink(max_delay=0.5),
+        ChunkedStreamLink(),
+        EventLink()
+    )
+    print(pipeline)
+
+    assert pipeline.update_clock(0) is None
+    write_top_events(pipeline.top)
+    assert pipeline.next_clock_request == 0.5
+    assert not pipeline.to_write()
+    assert pipeline.update_clock(0.25) == 0.5
+    assert not pipeline.to_write()
+    assert pipeline.update_clock(0.5) is None
+    result = pipeline.to_write()
+    assert result == HIGHER_CHUNKED_STREAM
+
+
 def make_pipeline_loopback(pipeline_factory):
     """Make a long pipeline with a loopback at the top."""
     manual_pipeline = pipeline_factory(
@@ -307,3 +628,75 @@ def test_loopback_pipeline_bottom_coupler_event():
     assert_loopback_below(pipeline_one.top, payload)
     assert_loopback_below(pipeline_one, payload)
     assert_loopback_below(coupler.pipeline_one, payload)
+
+
+def test_pipeline_bottom_coupler_clocked():
+    """Test for pipeline bottom coupling of events delayed at the bottom."""
+    print('Testing delayed events with PipelineBottomCoupler...')
+    pipeline_one = AutomaticPipeline(DelayedEventLink(), EventLink())
+    pipeline_two = AutomaticPipeline(EventLink(), EventLink())
+    coupler = PipelineBottomCoupler(pipeline_one, pipeline_two)
+    pipeline_one.send(b'\1\2\3\4')
+    coupler.update_clock(0.5)
+    assert not pipeline_two.has_receive()
+    coupler.update_clock(1.0)
+    assert [event.data for event in pipeline_two.receive_all()] == [b'\1\2\3\4']
+
+
+def test_manual_pipeline_bounded():
+    """Exercise ManualPipeline's bounded partial drains."""
+    print('Testing Manual Pipeline with bounded drains:')
+    pipeline = make_pipeline_long(ManualPipeline)
+    write_top_events(pipeline)
+    pipeline.sync()
+    result = pipeline.to_write(max_bytes=5)
+    assert result == HIGHER_CHUNKED_STREAM[:5]
+    result += pipeline.to_write(max_bytes=100)
+    assert result == HIGHER_CHUNKED_STREAM
+
+    write_bottom_chunked_buffers(pipeline)
+    pipeline.sync()
+    assert pipeline.read(max_bytes=0) is None  # the top link is not a stream
+    assert pipeline.read() is None
+    assert len(list(pipeline.receive_all(max_events=2))) == 2
+    assert len(list(pipeline.receive_all(max_events=2))) == 1
+    assert not pipeline.has_receive()
+
+
+def test_pipeline_latency():
+    """Exercise Pipeline's latency recording and reports."""
+    print('Testing Pipeline latency reports:')
+    clock = Clock(time=0.0)
+    pipeline = ManualPipeline(EventLink(), TopLoopbackLink(), ChunkedStreamLink())
+    assert pipeline.latency_report() == []
+    pipeline = ManualPipeline(EventLink(name='bottom'), EventLink(name='top'))
+    pipeline.record_latency(clock=clock)
+    pipeline.to_receive('foo')
+    clock.update(1.0)
+    pipeline.sync()
+    clock.update(1.5)
+    assert [event.data for event in pipeline.receive_all()] == ['foo']
+    report = pipeline.latency_report()
+    assert [layer_report['layer'] for layer_report in report] == [
+        '⇌□ EventLink(bottom) □⇌', '⇌□ EventLink(top) □⇌'
+    ]
+    assert report[0]['receive_queueing']['p50'] == 1.0
+    assert report[1]['receive_queueing']['p999'] == 0.5
+    assert report[1]['receive_processing']['count'] == 1
+    assert report[1]['send_queueing']['count'] == 0
+
+    # Each layer of an AutomaticPipeline records only its own processing time
+    slow_top = EventLink(name='top')
+
+    def slow_to_receive(event, to_receive=slow_top.to_receive):
+        clock.update(clock.time + 1.0)
+        to_receive(event)
+
+    slow_top.to_receive = slow_to_receive
+    pipeline = AutomaticPipeline(EventLink(name='bottom'), slow_top)
+    pipeline.record_latency(clock=clock)
+    pipeline.to_receive('foo')
+    assert [event.data for event in pipeline.receive_all()] == ['foo']
+    report = pipeline.latency_report()
+    assert report[0]['receive_processing']['max'] == 0
+    assert report[1]['receive_processing']['max'] == 1.0
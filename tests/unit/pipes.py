@@ -5,9 +5,11 @@
 # Packages
 
 from phylline.links.clocked import DelayedEventLink
-from phylline.links.events import EventLink
+from phylline.links.events import EventLink, LinkException
 from phylline.links.links import ChunkedStreamLink
+from phylline.links.streams import StreamLink
 from phylline.pipes import AutomaticPipe, ManualPipe
+from phylline.util.scheduling import RoundRobinScheduler, weighted_fair
 
 from tests.unit.links.clocked import assert_clock_request_event_received
 from tests.unit.links.links import HIGHER_CHUNKED_STREAM, LOWER_CHUNKED_BUFFERS
@@ -61,6 +63,71 @@ def test_manual_pipe():
     assert result == HIGHER_CHUNKED_STREAM
 
 
+def test_manual_pipe_bounded():
+    """Exercise ManualPipe's bounded partial drains."""
+    print('Testing Piped Event Links with bounded drains:')
+    pipe = ManualPipe(ChunkedStreamLink(), EventLink())
+    write_top_events(pipe)
+    pipe.sync()
+    result = pipe.to_write(max_bytes=5)
+    assert result == HIGHER_CHUNKED_STREAM[:5]
+    result += pipe.to_write(max_bytes=5)
+    assert result == HIGHER_CHUNKED_STREAM[:10]
+    result += pipe.to_write()
+    assert result == HIGHER_CHUNKED_STREAM
+
+    write_bottom_chunked_buffers(pipe)
+    pipe.sync()
+    received = list(pipe.receive_all(max_events=1))
+    assert [event.data for event in received] == LOWER_BUFFERS[:1]
+    assert_bottom_events_from(pipe, 1)
+
+    pipe = ManualPipe(StreamLink(), StreamLink())
+    assert pipe.read() == b''  # nothing has been synced up yet
+    pipe.to_read(b'foo,bar')
+    pipe.sync()
+    assert pipe.read(max_bytes=0) is None  # a zero budget reads nothing
+    assert pipe.read(max_bytes=4) == b'foo,'
+    assert pipe.read() == b'bar'
+
+
+def test_pipe_scheduled():
+    """Exercise Pipe's fair scheduling across multiple links."""
+    print('Testing Pipes with scheduled multiple links:')
+    bulk_link = EventLink()
+    control_link = EventLink()
+    pipe = ManualPipe(
+        [bulk_link, control_link], EventLink(), scheduler_factory=RoundRobinScheduler
+    )
+    for i in range(4):
+        bulk_link.send('bulk{}'.format(i))
+    control_link.send('control')
+    assert [event.data for event in pipe.to_send_all()] == [
+        'bulk0', 'control', 'bulk1', 'bulk2', 'bulk3'
+    ]
+    assert not pipe.has_to_send()
+
+    bulk_link = EventLink()
+    control_link = EventLink()
+    pipe = ManualPipe(
+        EventLink(), [bulk_link, control_link], scheduler_factory=weighted_fair([2, 1])
+    )
+    for i in range(4):
+        bulk_link.to_receive('bulk{}'.format(i))
+        control_link.to_receive('control{}'.format(i))
+    assert [event.data for event in pipe.receive_all(max_events=6)] == [
+        'bulk0', 'bulk1', 'control0', 'bulk2', 'bulk3', 'control1'
+    ]
+    assert [event.data for event in pipe.receive_all()] == ['control2', 'control3']
+
+
+def assert_bottom_events_from(event_link_above, start):
+    """Receive the remaining bottom buffers as events from the link with EventLinkAbove."""
+    assert event_link_above.has_receive()
+    for (i, event) in enumerate(event_link_above.receive_all()):
+        assert event.data == LOWER_BUFFERS[start + i]
+
+
 def test_manual_singular():
     """Exercise ManualPipe's single-link handling."""
     print('Testing Piped Singular Event Link with Manual Synchronization:')
@@ -222,6 +289,20 @@ def test_automatic_pipe_clocked():
     assert result == HIGHER_CHUNKED_STREAM
 
 
+def test_automatic_pipe_clocked_directions():
+    """Exercise AutomaticPipe's separate clock updates for receive and send."""
+    print('Testing Piped Clocked Event Links with separate clock directions:')
+    pipe = AutomaticPipe(ChunkedStreamLink(), DelayedEventLink())
+    write_bottom_chunked_buffers(pipe)
+    assert_clock_request_event_received(pipe, 1.0)
+    write_top_events(pipe)
+    assert pipe.update_clock_send(1.0) == 1.0  # the received events are still due
+    assert not pipe.has_receive()
+    assert pipe.to_write() == HIGHER_CHUNKED_STREAM
+    assert pipe.update_clock_receive(1.0) is None
+    assert_bottom_events(pipe)
+
+
 def test_automatic_pipe_composition():
     """Exercise AutomaticPipe nested composition."""
     print('Testing Nesting of Piped Event Links with Automatic Synchronization:')
@@ -247,3 +328,49 @@ def test_automatic_pipe_composition():
     result = outer_pipe.to_write()
     print('Chunked Stream Link wrote to stream: {}'.format(result))
     assert result == HIGHER_CHUNKED_STREAM
+
+
+def test_automatic_pipe_credits():
+    """Exercise AutomaticPipe's credit-based flow control."""
+    print('Testing Automatic Pipe with credit-based flow control:')
+    bottom = EventLink()
+    top = EventLink()
+    pipe = AutomaticPipe(bottom, top, receive_credits=1, receive_buffer_limit=2)
+    for i in range(4):
+        bottom.to_receive(i)
+    received = list(top.receive_all())
+    assert received[0].data == 0
+    assert isinstance(received[1], LinkException)  # the fourth event overflowed
+    assert pipe.stats['dropped'] == 1
+    assert pipe.receive_buffered == 2
+    assert pipe.paused
+
+    pipe.grant(1)
+    assert pipe.paused  # one event is still held
+    assert [event.data for event in top.receive_all()] == [1]
+    pipe.grant(5)
+    assert not pipe.paused
+    assert [event.data for event in top.receive_all()] == [2]
+    bottom.to_receive(4)
+    assert [event.data for event in top.receive_all()] == [4]
+    assert pipe.receive_credits == 3
+
+    pipe.reset_pipe()
+    assert pipe.receive_credits == 1
+    assert pipe.stats['dropped'] == 0
+
+
+def test_manual_pipe_priority():
+    """Exercise ManualPipe's priority lanes for drained events."""
+    print('Testing Manual Pipe with priority lanes:')
+    bottom = EventLink()
+    top = EventLink()
+    pipe = ManualPipe(
+        bottom, top, priority_classifier=lambda event: 0 if event.data == 'ack' else 1
+    )
+    for event in ['bulk0', 'bulk1', 'ack']:
+        bottom.to_receive(event)
+        top.send(event)
+    pipe.sync()
+    assert [event.data for event in top.receive_all()] == ['ack', 'bulk0', 'bulk1']
+    assert [event.data for event in bottom.to_send_all()] == ['ack', 'bulk0', 'bulk1']
@@ -4,7 +4,7 @@
 
 # Packages
 
-from phylline.processors import event_processor, receive, send
+from phylline.processors import PriorityLanes, event_processor, receive, send
 from phylline.processors import proceed, wait
 from phylline.processors import read, read_until, stream_processor, write
 
@@ -116,6 +116,65 @@ def test_event_processor_return():
     assert processor.get_result() == 10
 
 
+def test_event_processor_reset():
+    """Test whether the event_processor can be reset to its initial state."""
+    processor = incrementer_return()
+    processor.send(1)
+    assert processor.get_result() == 10
+    processor.directly_to_read(5)
+    processor.reset()
+    assert not processor.has_read()
+    processor.send(2)
+    assert processor.read() == 3
+    assert processor.get_result() == 20
+
+
+# Priority lanes
+
+
+def parity(number):
+    """Classify even numbers as urgent and odd numbers as bulk."""
+    return number % 2
+
+
+def test_priority_lanes():
+    """Test whether PriorityLanes dequeues by strict priority."""
+    lanes = PriorityLanes(parity)
+    for i in [1, 3, 2, 5, 4]:
+        lanes.append(i)
+    assert len(lanes) == 5
+    assert list(lanes) == [2, 4, 1, 3, 5]
+    assert [lanes.popleft() for _ in range(5)] == [2, 4, 1, 3, 5]
+    assert not lanes
+    with pytest.raises(IndexError):
+        lanes.popleft()
+
+
+def test_priority_lanes_weighted():
+    """Test whether PriorityLanes dequeues by weighted round robin."""
+    lanes = PriorityLanes(parity, weights=[1, 2])
+    for i in range(12):
+        lanes.append(i)
+    assert [lanes.popleft() for _ in range(9)] == [0, 1, 3, 2, 5, 7, 4, 9, 11]
+    assert [lanes.popleft() for _ in range(3)] == [6, 8, 10]
+    lanes.append(1)
+    lanes.clear()
+    assert len(lanes) == 0
+    with pytest.raises(ValueError):
+        PriorityLanes(parity, weights=[1])
+
+
+def test_event_processor_priority_lanes():
+    """Test whether the event_processor works correctly with PriorityLanes as its output."""
+    last_received = [None]
+    processor = incrementer(last_received=last_received)
+    processor.output = PriorityLanes(parity)
+    for i in range(4):
+        processor.send(i)
+    assert [processor.read() for _ in range(4)] == [2, 4, 1, 3]
+    assert not processor.has_read()
+
+
 # Invalid event processors
 
 
@@ -186,3 +245,13 @@ def test_stream_processor():
     processor = passthrough()
     processor.send(b'\1\2\3\4')
     assert processor.read() == b'\1\2\3\4'
+
+
+def test_stream_processor_reset():
+    """Test whether the stream_processor can be reset to its initial state."""
+    processor = chunker()
+    processor.send(b'\1\2\0\3\4')
+    processor.reset()
+    assert processor.read() == b''
+    processor.send(b'\5\0')
+    assert processor.read() == b'\5'
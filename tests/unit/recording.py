@@ -0,0 +1,90 @@
+"""Test the recording module."""
+
+# Builtins
+
+# Packages
+
+from phylline.links.events import EventLink, LinkData, LinkException
+from phylline.links.links import ChunkedStreamLink
+from phylline.pipelines import AutomaticPipeline
+from phylline.recording import FlightRecorder, describe
+from phylline.util.timing import Clock
+
+import pytest
+
+from tests.unit.links.streams import HIGHER_BUFFERS, HIGHER_EVENTS, LOWER_EVENTS
+
+
+def test_describe():
+    """Exercise the describe function."""
+    print('Testing describe:')
+    assert describe(b'\x01\x02') == '0x01 0x02'
+    assert describe(bytearray(12), truncate=1) == '0x00 ...(11 more bytes)'
+    assert describe(LinkData(b'\x01', context={'foo': 1}, previous=LinkData(b'\x02'))) == (
+        "LinkData with context({'foo': 1}): 0x01"
+    )
+    assert describe(LinkException(ValueError('foo'))) == "LinkException: ValueError('foo')"
+    assert describe('foo') == "'foo'"
+
+
+def test_flight_recorder():
+    """Exercise FlightRecorder's interface."""
+    print('Testing Flight Recorder:')
+    with pytest.raises(ValueError):
+        FlightRecorder(size=0)
+
+    clock = Clock(time=0.0)
+    recorder = FlightRecorder(size=4, clock=clock)
+    for (time, event) in enumerate(LOWER_EVENTS + HIGHER_EVENTS):
+        clock.update(float(time))
+        recorder.record('link', 'up', event)
+    assert len(recorder) == 4
+    assert [entry[0] for entry in recorder.entries()] == [1.0, 2.0, 3.0, 4.0]
+    assert [entry[3] for entry in recorder.entries()] == LOWER_EVENTS[1:] + HIGHER_EVENTS
+    assert recorder.dump().splitlines()[0] == "1.0 link up: 'bar,'"
+    recorder.clear()
+    assert len(recorder) == 0
+    assert recorder.dump() == ''
+
+
+def test_flight_recorder_pipeline():
+    """Exercise FlightRecorder's instrumentation of a pipeline."""
+    print('Testing Flight Recorder with a pipeline:')
+    dumps = []
+    recorder = FlightRecorder(clock=Clock(time=0.0), on_exception=dumps.append)
+    pipeline = AutomaticPipeline(ChunkedStreamLink(), EventLink(name='top'))
+    recorder.instrument_pipeline(pipeline)
+    pipeline.send(HIGHER_BUFFERS[0])
+    assert pipeline.to_write()
+    assert [entry[1:3] for entry in recorder.entries()] == [
+        ('top', 'down'), ('ChunkedStreamLink', 'down')
+    ]
+    assert not dumps
+
+    pipeline.top.to_receive(LinkException(ValueError('foo')))
+    assert isinstance(list(pipeline.receive_all())[0], LinkException)
+    assert len(dumps) == 1
+    assert dumps[0].splitlines()[-1] == "0.0 top up: LinkException: ValueError('foo')"
+
+
+def test_flight_recorder_exception_dumped_once():
+    """Exercise FlightRecorder's single dump of an exception passing through many layers."""
+    print('Testing Flight Recorder with an exception through a multi-layer pipeline:')
+    dumps = []
+    recorder = FlightRecorder(clock=Clock(time=0.0), on_exception=dumps.append)
+    pipeline = AutomaticPipeline(
+        EventLink(name='bottom'), EventLink(name='middle'), EventLink(name='top')
+    )
+    recorder.instrument_pipeline(pipeline)
+    pipeline.bottom.to_receive(LinkException(ValueError('foo')))
+    assert isinstance(list(pipeline.receive_all())[0], LinkException)
+    assert [entry[1:3] for entry in recorder.entries()] == [
+        ('bottom', 'up'), ('middle', 'up'), ('top', 'up')
+    ]
+    assert len(dumps) == 1
+    assert dumps[0] == "0.0 bottom up: LinkException: ValueError('foo')"
+
+    pipeline.bottom.to_receive(LinkException(ValueError('bar')))
+    assert isinstance(list(pipeline.receive_all())[0], LinkException)
+    assert len(dumps) == 2
+    assert dumps[1].splitlines()[-1] == "0.0 bottom up: LinkException: ValueError('bar')"
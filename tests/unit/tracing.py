@@ -0,0 +1,102 @@
+"""Test the tracing module."""
+
+# Builtins
+
+import io
+import json
+
+# Packages
+
+from phylline.links.events import EventLink, LinkData
+from phylline.pipelines import AutomaticPipeline, ManualPipeline
+from phylline.tracing import TRACE_ID_KEY, Tracer, get_trace_id
+from phylline.util.timing import Clock
+
+import pytest
+
+from tests.unit.links.streams import HIGHER_EVENTS, LOWER_EVENTS
+
+
+def make_pipeline(pipeline_type):
+    """Make a pipeline of named EventLinks."""
+    return pipeline_type(*[EventLink(name=name) for name in ['bottom', 'middle', 'top']])
+
+
+def test_tracer_sampling():
+    """Exercise Tracer's sampling interface."""
+    print('Testing Tracer sampling:')
+    with pytest.raises(ValueError):
+        Tracer(sample_rate=1.5)
+
+    tracer = Tracer()
+    event = tracer.sample(LOWER_EVENTS[0], 'up')
+    assert isinstance(event, LinkData)
+    assert event.data == LOWER_EVENTS[0]
+    assert get_trace_id(event) == 1
+    assert tracer.sample(event, 'up') is event
+    assert get_trace_id(LinkData('foo', previous=event)) == 1
+    assert get_trace_id(LOWER_EVENTS[0]) is None
+
+    tracer = Tracer(sample_rate=0)
+    assert tracer.sample(LOWER_EVENTS[0], 'up') == LOWER_EVENTS[0]
+
+    tracer = Tracer(sample_rate=0.5, seed=0)
+    sampled = [
+        isinstance(tracer.sample(i, 'up'), LinkData) for i in range(1000)
+    ]
+    assert 400 < sum(sampled) < 600
+    tracer.reset()
+    assert [
+        isinstance(tracer.sample(i, 'up'), LinkData) for i in range(1000)
+    ] == sampled
+
+
+def test_tracer_automatic_pipeline():
+    """Exercise Tracer's instrumentation of an AutomaticPipeline."""
+    print('Testing Tracer with an Automatic Pipeline:')
+    tracer = Tracer(clock=Clock(time=0.0))
+    pipeline = make_pipeline(AutomaticPipeline)
+    tracer.instrument_pipeline(pipeline)
+    for event in LOWER_EVENTS:
+        pipeline.to_receive(event)
+    received = list(pipeline.receive_all())
+    assert [event.data for event in received] == LOWER_EVENTS
+    assert [get_trace_id(event) for event in received] == [1, 2, 3]
+    # Spans are recorded as they end, so the layers of each trace are nested
+    assert [span[:3] for span in tracer.spans][:3] == [
+        (1, 'top', 'up'), (1, 'middle', 'up'), (1, 'bottom', 'up')
+    ]
+    assert len(tracer.spans) == 9
+
+    pipeline.send(HIGHER_EVENTS[0])
+    assert [event.data for event in pipeline.to_send_all()] == HIGHER_EVENTS[:1]
+    assert [span[:3] for span in tracer.spans][9:] == [
+        (4, 'bottom', 'down'), (4, 'middle', 'down'), (4, 'top', 'down')
+    ]
+
+    file = io.StringIO()
+    tracer.dump_chrome_trace(file)
+    trace = json.loads(file.getvalue())
+    assert len(trace['traceEvents']) == 12
+    assert trace['traceEvents'][0] == {
+        'name': 'top', 'cat': 'up', 'ph': 'X', 'pid': 0, 'tid': 1, 'ts': 0.0, 'dur': 0.0
+    }
+
+
+def test_tracer_manual_pipeline():
+    """Exercise Tracer's instrumentation of a ManualPipeline."""
+    print('Testing Tracer with a Manual Pipeline:')
+    tracer = Tracer(sample_rate=0, clock=Clock(time=0.0))
+    pipeline = make_pipeline(ManualPipeline)
+    tracer.instrument_pipeline(pipeline)
+    for event in LOWER_EVENTS:
+        pipeline.to_receive(event)
+    pipeline.sync()
+    assert [event.data for event in pipeline.receive_all()] == LOWER_EVENTS
+    assert not tracer.spans
+
+    pipeline.to_receive(LinkData(LOWER_EVENTS[0], context={TRACE_ID_KEY: 42}))
+    pipeline.sync()
+    assert [span[:3] for span in tracer.spans] == [
+        (42, 'bottom', 'up'), (42, 'middle', 'up'), (42, 'top', 'up')
+    ]
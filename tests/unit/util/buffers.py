@@ -0,0 +1,27 @@
+"""Test the util.buffers module."""
+
+# Builtins
+
+# Packages
+
+from phylline.util.buffers import BufferPool
+
+
+def test_buffer_pool():
+    """Test buffer pool reuse."""
+    pool = BufferPool(buffer_size=16, size=2)
+    assert len(pool) == 2
+    first = pool.acquire()
+    second = pool.acquire()
+    assert len(first) == 16
+    assert first is not second
+    assert len(pool) == 0
+    third = pool.acquire()  # allocated on demand
+    assert len(third) == 16
+    pool.release(first)
+    pool.release(second)
+    pool.release(third)  # pool is already full
+    assert len(pool) == 2
+    assert pool.acquire() is second
+    pool.release(bytearray(8))  # wrong size
+    assert len(pool) == 1
@@ -0,0 +1,83 @@
+"""Test the util.histograms module."""
+
+# Builtins
+
+import math
+
+# Packages
+
+from phylline.util.histograms import LogHistogram, percentile_label, timed
+from phylline.util.timing import Clock
+
+import pytest
+
+
+def test_log_histogram():
+    """Exercise LogHistogram's interface."""
+    print('Testing Log Histogram:')
+    with pytest.raises(ValueError):
+        LogHistogram(lowest=1.0, highest=1.0)
+
+    histogram = LogHistogram(lowest=1e-6, highest=10.0)
+    assert histogram.percentile(50) is None
+    assert histogram.report()['p50'] is None
+    for i in range(1, 1001):
+        histogram.record(i * 1e-3)
+    assert len(histogram) == 1000
+    assert math.isclose(histogram.mean, 0.5005)
+    max_error = 2 ** (1 / histogram.buckets_per_octave) - 1
+    for (percentile, exact) in [(50, 0.5), (99, 0.99), (99.9, 0.999)]:
+        estimate = histogram.percentile(percentile)
+        assert exact <= estimate <= exact * (1 + max_error)
+    assert histogram.percentile(100) == 1.0
+    assert 1e-3 <= histogram.percentile(0) <= 1e-3 * (1 + max_error)
+
+    histogram.record(0.0)
+    histogram.record(1000.0, count=10)  # clamped into the last bucket
+    report = histogram.report()
+    assert report['count'] == 1011
+    assert report['max'] == 1000.0
+    assert report['p999'] == 1000.0
+
+    other = LogHistogram(lowest=1e-6, highest=10.0)
+    other.record(2e-3, count=989)
+    histogram.merge(other)
+    assert len(histogram) == 2000
+    assert 2e-3 <= histogram.percentile(25) <= 2e-3 * (1 + max_error)
+    with pytest.raises(ValueError):
+        histogram.merge(LogHistogram())
+    histogram.reset()
+    assert len(histogram) == 0
+    assert histogram.max is None
+    assert not any(histogram.counts)
+
+
+def test_histogram_utilities():
+    """Exercise the histogram utility functions."""
+    print('Testing histogram utilities:')
+    assert percentile_label(50) == 'p50'
+    assert percentile_label(99.9) == 'p999'
+    assert percentile_label(99.99) == 'p9999'
+
+    clock = Clock(time=0.0)
+    histogram = LogHistogram()
+
+    def step(duration):
+        clock.update(clock.time + duration)
+        return duration
+
+    timed_step = timed(step, histogram, clock)
+    assert timed_step(0.5) == 0.5
+    assert histogram.max == 0.5
+
+    # Nested timed calls are excluded from the outer call's own time
+    outer_histogram = LogHistogram()
+
+    def outer_step(duration):
+        clock.update(clock.time + duration)
+        return timed_step(2.0)
+
+    timed_outer_step = timed(outer_step, outer_histogram, clock)
+    assert timed_outer_step(0.25) == 2.0
+    assert outer_histogram.max == 0.25
+    assert histogram.max == 2.0
@@ -0,0 +1,40 @@
+"""Test the util.instrumentation module."""
+
+# Builtins
+
+# Packages
+
+from phylline.links.events import EventLink
+from phylline.links.links import ChunkedStreamLink
+from phylline.util.instrumentation import link_name, wrap_methods
+
+
+def test_link_name():
+    """Exercise link_name's defaults."""
+    print('Testing link name:')
+    assert link_name(EventLink(name='top')) == 'top'
+    assert link_name(EventLink(name='top'), 'other') == 'other'
+    assert link_name(EventLink()) == 'EventLink'
+    assert link_name(ChunkedStreamLink()) == 'ChunkedStreamLink'
+
+
+def test_wrap_methods():
+    """Exercise wrap_methods's composition of wrappers."""
+    print('Testing wrap methods:')
+    calls = []
+
+    def wrapper(label):
+        def wrap(method):
+            def wrapped(event):
+                calls.append(label)
+                return method(event)
+            return wrapped
+        return wrap
+
+    link = EventLink()
+    wrap_methods(link, {'send': wrapper('inner'), 'write': wrapper('missing')})
+    wrap_methods(link, {'send': wrapper('outer')})
+    assert not hasattr(link, 'write')
+    link.send(b'foo')
+    assert calls == ['outer', 'inner']
+    assert link.has_to_send()
@@ -0,0 +1,83 @@
+"""Test the util.rings module."""
+
+# Builtins
+
+import gc
+import selectors
+import subprocess
+import sys
+import time
+
+# Packages
+
+from phylline.util.rings import SharedMemoryRing, Wakeup
+
+import pytest
+
+
+def test_shared_memory_ring():
+    """Test ring reads and writes, including wrap-around."""
+    ring = SharedMemoryRing(capacity=16)
+    attached = SharedMemoryRing.attach(ring.name)
+    try:
+        assert attached.capacity == 16
+        assert ring.readable == 0
+        assert ring.writable == 16
+        assert ring.write(b'foo,bar,') == 8
+        assert attached.readable == 8
+        assert attached.read(4) == b'foo,'
+        assert ring.put(b'foobar!', b'Hi,')
+        assert not ring.put(b'world!')  # all-or-nothing
+        assert ring.write(b'world!') == 2
+        assert ring.writable == 0
+        assert attached.read() == b'bar,foobar!Hi,wo'
+        assert attached.read() == b''
+        assert ring.write(b'rld!') == 4
+        assert attached.read() == b'rld!'
+    finally:
+        attached.close()
+        ring.close()
+
+
+@pytest.mark.filterwarnings('error::pytest.PytestUnraisableExceptionWarning')
+def test_shared_memory_ring_cleanup():
+    """Test closing rings with a context manager, and collecting unclosed rings."""
+    with SharedMemoryRing(capacity=16) as ring:
+        attached = SharedMemoryRing.attach(ring.name)
+        assert attached.write(b'foo') == 3
+        del attached  # never closed
+        gc.collect()
+        assert ring.read() == b'foo'
+    assert ring._data is None
+    ring.close()  # closing again does nothing
+
+
+def test_shared_memory_ring_attach_process():
+    """Test that an unrelated process which attaches to a ring doesn't destroy it on exit."""
+    with SharedMemoryRing(capacity=16) as ring:
+        subprocess.run([
+            sys.executable, '-c',
+            'from phylline.util.rings import SharedMemoryRing\n'
+            'with SharedMemoryRing.attach({!r}) as ring:\n'
+            '    ring.write(b"foo")'.format(ring.name)
+        ], check=True, timeout=10)
+        time.sleep(0.5)  # give the other process's resource tracker time to clean up
+        with SharedMemoryRing.attach(ring.name) as attached:
+            assert attached.read() == b'foo'
+
+
+def test_wakeup():
+    """Test wakeup notifications."""
+    wakeup = Wakeup()
+    selector = selectors.DefaultSelector()
+    selector.register(wakeup, selectors.EVENT_READ)
+    try:
+        assert not selector.select(timeout=0)
+        wakeup.notify()
+        wakeup.notify()
+        assert selector.select(timeout=0)
+        wakeup.clear()
+        assert not selector.select(timeout=0)
+    finally:
+        selector.close()
+        wakeup.close()
@@ -0,0 +1,55 @@
+"""Test the util.scheduling module."""
+
+# Builtins
+
+import collections
+
+# Packages
+
+from phylline.util.scheduling import RoundRobinScheduler, WeightedFairScheduler
+
+import pytest
+
+
+def drain(scheduler, queues, count):
+    """Serve count events from the queues, and return the names of the served queues."""
+    served = []
+    for _ in range(count):
+        name = scheduler.select(lambda name: bool(queues[name]))
+        if name is None:
+            break
+        queues[name].popleft()
+        served.append(name)
+    return served
+
+
+def test_round_robin_scheduler():
+    """Test round-robin scheduling."""
+    queues = {'bulk': collections.deque(range(10)), 'control': collections.deque(range(2))}
+    scheduler = RoundRobinScheduler(['bulk', 'control'])
+    assert drain(scheduler, queues, 6) == ['bulk', 'control', 'bulk', 'control', 'bulk', 'bulk']
+    queues['control'].append(0)  # becomes ready without notifying the scheduler
+    assert drain(scheduler, queues, 4) == ['bulk', 'control', 'bulk', 'bulk']
+    assert drain(scheduler, queues, 10) == ['bulk'] * 3
+    assert scheduler.next_ready(lambda name: bool(queues[name])) is None
+
+
+def test_weighted_fair_scheduler():
+    """Test weighted fair scheduling."""
+    queues = {
+        'bulk': collections.deque(range(100)), 'control': collections.deque(range(100))
+    }
+    scheduler = WeightedFairScheduler(['bulk', 'control'], [3, 1])
+    served = drain(scheduler, queues, 40)
+    assert served[:8] == ['bulk'] * 3 + ['control'] + ['bulk'] * 3 + ['control']
+    assert served.count('bulk') == 30
+    queues = {
+        'bulk': collections.deque(range(100)), 'control': collections.deque(range(100))
+    }
+    scheduler = WeightedFairScheduler(['bulk', 'control'], [1, 0.5])
+    served = drain(scheduler, queues, 30)
+    assert served.count('bulk') == 20
+    with pytest.raises(ValueError):
+        WeightedFairScheduler(['bulk', 'control'], [1])
+    with pytest.raises(ValueError):
+        WeightedFairScheduler(['bulk', 'control'], [1, 0])
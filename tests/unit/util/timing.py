@@ -7,7 +7,9 @@ import time
 
 # Packages
 
-from phylline.util.timing import Clock, TimeoutTimer
+from phylline.util.timing import Clock, TimeoutTimer, TokenBucket
+
+import pytest
 
 
 def test_clock_realtime():
@@ -50,6 +52,58 @@ def test_clock_external():
     assert clock.time > 0
 
 
+def test_clock_source():
+    """Test real-time clock functionality with custom time sources."""
+    samples = iter([1000000000, 1500000000, 2250000000])
+
+    def fake_monotonic_ns():
+        return next(samples)
+
+    clock = Clock(source=fake_monotonic_ns)
+    assert clock.source_resolution == 1e-9
+    assert clock.time == 1.0
+    assert clock.time == 1.5
+    timer = TimeoutTimer(timeout=1.0, clock=clock)
+    timer.start()
+    assert timer.start_time == 2.25
+
+    clock = Clock(source=time.monotonic)
+    assert clock.source_resolution == 1
+    old_time = clock.time
+    assert old_time <= time.monotonic()
+    clock = Clock(source=time.monotonic_ns)
+    assert abs(clock.time - time.monotonic()) < 0.1
+
+
+def test_clock_cached():
+    """Test tick-cached real-time clock functionality."""
+    samples = []
+
+    def source():
+        samples.append(len(samples))
+        return float(samples[-1])
+
+    clock = Clock(source=source, cached=True)
+    assert clock.realtime
+    assert clock.time == 0.0
+    assert clock.time == 0.0
+    timer = TimeoutTimer(timeout=2.0, clock=clock)
+    timer.start()
+    assert timer.running
+    assert timer.remaining == 2.0
+    assert len(samples) == 1
+    assert clock.tick() == 1.0
+    assert timer.elapsed == 1.0
+    assert clock.tick() == 2.0
+    assert timer.timed_out
+    assert len(samples) == 3
+    clock.reset(time=5.0)
+    assert clock.tick() == 5.0
+    assert len(samples) == 3
+    clock.reset()
+    assert clock.time == 3.0
+
+
 def assert_timer_stopped(timer):
     """Check whether the timer is stopped."""
     assert not timer.enabled
@@ -180,3 +234,67 @@ def test_timer_external():
     timer.clock.update(1.4)
     assert_timer_finished(timer)
     assert_timer_finished(timer_slow)
+
+
+def test_token_bucket():
+    """Exercise TokenBucket's interface."""
+    print('Testing Token Bucket:')
+    clock = Clock(time=0.0)
+    bucket = TokenBucket(rate=10, capacity=5, clock=clock)
+    assert bucket.tokens == 5
+    assert bucket.try_consume(3)
+    assert not bucket.try_consume(3)
+    assert bucket.time_until(3) == pytest.approx(0.1)
+    clock.update(0.1)
+    assert bucket.try_consume(3)
+    assert bucket.tokens == 0
+    clock.update(10.0)
+    assert bucket.tokens == 5  # refills only up to capacity
+
+    # Reservations in debt
+    assert bucket.reserve(5) == 0
+    assert bucket.reserve(5) == pytest.approx(0.5)
+    assert bucket.reserve(1) == pytest.approx(0.6)
+    assert bucket.tokens == -6
+    assert not bucket.try_consume(1)
+    clock.update(10.7)
+    assert bucket.tokens == pytest.approx(1)
+
+    # No bursts
+    bucket = TokenBucket(rate=100, capacity=0, clock=clock)
+    assert bucket.reserve(10) == pytest.approx(0.1)
+    assert bucket.reserve(10) == pytest.approx(0.2)
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, capacity=1)
+
+    # Whole ticks
+    clock = Clock(time=0, resolution=1e-9)
+    bucket = TokenBucket(rate=0.4, capacity=1, clock=clock)
+    assert bucket.reserve(1) == 0
+    assert bucket.time_until(1) == 3  # 2.5 ticks, rounded up
+    assert bucket.reserve(1) == 3
+    assert isinstance(bucket.reserve(1), int)
+
+
+def test_clock_integer():
+    """Test integer-mode clock and timer functionality."""
+    clock = Clock(time=10 ** 15, resolution=1e-9)
+    assert clock.integer
+    assert clock.to_ticks(0.5) == 500000000
+    assert clock.to_seconds(250) == pytest.approx(250e-9)
+    timer = TimeoutTimer(timeout=1, clock=clock)
+    timer.start()
+    assert timer.timeout_time == 10 ** 15 + 1
+    assert timer.running  # math.isclose would consider the timer timed out
+    assert timer.remaining == 1
+    clock.update(10 ** 15 + 1)
+    assert timer.timed_out
+    assert timer.remaining == 0
+
+    clock = Clock(source=time.monotonic_ns, resolution=1e-9)
+    assert isinstance(clock.time, int)
+    clock = Clock(source=time.monotonic, resolution=1e-3)
+    assert isinstance(clock.time, int)
+    assert abs(clock.to_seconds(clock.time) - time.monotonic()) < 0.1
+    assert not Clock().integer
+    assert Clock().to_ticks(0.5) == 0.5